@@ -9,13 +9,21 @@ import asyncio
 import logging
 import time
 import heapq
-from typing import Dict, Any, List, Optional, Callable, Tuple
+import itertools
+from typing import Dict, Any, List, Optional, Callable, Tuple, Awaitable, Union, AsyncIterator, Iterable
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 import json
 import os
 
+from .autotune import ConcurrencyAutotuner
+from .bandwidth import BandwidthLimiter
+from .defaults import CACHE_DIR
+from .policies import SchedulingPolicy, create_policy
+from .politeness import HostGate, HostQueues, host_of
+from .scheduler_store import SchedulerStore, encode_options
+
 logger = logging.getLogger(__name__)
 
 class Priority(Enum):
@@ -26,6 +34,19 @@ class Priority(Enum):
     LOW = 4
     BACKGROUND = 5
 
+    @classmethod
+    def from_value(cls, value: Union["Priority", int, str, None]) -> "Priority":
+        """Priority from an enum member, level number or name (NORMAL otherwise)"""
+        if isinstance(value, cls):
+            return value
+        try:
+            if isinstance(value, str) and not value.isdigit():
+                return cls[value.upper()]
+            # Levels past the lowest one (the CLI takes 1-10) count as background
+            return cls(min(max(int(value), cls.URGENT.value), cls.BACKGROUND.value))
+        except (KeyError, TypeError, ValueError):
+            return cls.NORMAL
+
 class DownloadStatus(Enum):
     """Download status states"""
     PENDING = "pending"
@@ -35,6 +56,9 @@ class DownloadStatus(Enum):
     PAUSED = "paused"
     CANCELLED = "cancelled"
 
+# States a download does not leave (FAILED only once its retries are used up)
+FINISHED_STATES = (DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED)
+
 @dataclass
 class ScheduledDownload:
     """Scheduled download task"""
@@ -53,6 +77,17 @@ class ScheduledDownload:
     estimated_size: Optional[int] = None  # bytes
     downloaded_size: int = 0
     progress: float = 0.0
+    result: Optional[str] = None  # path of the finished file
+    extractor: Optional[str] = None  # yt-dlp extractor, when known up front
+    deadline: Optional[datetime] = None  # wanted-by time, for the edf policy
+    host: str = ""  # politeness key, derived from the URL
+    submitted_at: Optional[datetime] = None  # when first queued; retries keep it for priority aging
+    
+    def __post_init__(self):
+        if not self.host:
+            self.host = host_of(self.url)
+        if self.submitted_at is None:
+            self.submitted_at = self.scheduled_time or self.created_at
     
     def __lt__(self, other):
         """For heap sorting by priority and scheduled time"""
@@ -66,11 +101,20 @@ class ScheduledDownload:
 class BandwidthManager:
     """Manages bandwidth allocation across downloads"""
     
-    def __init__(self, max_bandwidth_mbps: float = 100.0):
+    def __init__(self, max_bandwidth_mbps: float = 100.0, parent: Optional[BandwidthLimiter] = None):
         self.max_bandwidth = max_bandwidth_mbps * 1024 * 1024  # Convert to bytes/sec
         self.allocated_bandwidth = {}  # download_id -> allocated_bytes_per_sec
         self.usage_history = []
         self.lock = asyncio.Lock()
+        # Enforces the cap in the download read loops; allocations are each
+        # download's fair share, not a ceiling. Under a parent
+        # (the download manager's global cap) the node is only attached while
+        # downloads hold allocations, so an idle scheduler claims no share.
+        self.parent = parent
+        self.limiter: Optional[BandwidthLimiter] = None
+        if parent is None:
+            self.limiter = BandwidthLimiter(self.max_bandwidth, name="scheduler")
+        self.limiters: Dict[str, BandwidthLimiter] = {}  # download_id -> limiter node
     
     async def allocate_bandwidth(self, download_id: str, requested_bandwidth: float) -> float:
         """Allocate bandwidth for a download"""
@@ -82,6 +126,12 @@ class BandwidthManager:
             allocated = min(requested_bandwidth, available)
             if allocated > 0:
                 self.allocated_bandwidth[download_id] = allocated
+                if download_id not in self.limiters:
+                    if self.limiter is None:
+                        self.limiter = self.parent.child(self.max_bandwidth, name="scheduler")
+                    # No ceiling of its own: the scheduler node splits its rate
+                    # by demand, so a download can use what idle siblings leave
+                    self.limiters[download_id] = self.limiter.child(name=download_id)
             
             return allocated
     
@@ -89,6 +139,16 @@ class BandwidthManager:
         """Release bandwidth allocation for a download"""
         async with self.lock:
             self.allocated_bandwidth.pop(download_id, None)
+            limiter = self.limiters.pop(download_id, None)
+            if limiter:
+                limiter.close()
+            if not self.limiters and self.parent is not None and self.limiter is not None:
+                self.limiter.close()
+                self.limiter = None
+    
+    def get_limiter(self, download_id: str) -> Optional[BandwidthLimiter]:
+        """Limiter node enforcing a download's allocation, if it has one"""
+        return self.limiters.get(download_id)
     
     async def get_bandwidth_info(self) -> Dict[str, Any]:
         """Get current bandwidth allocation info"""
@@ -104,27 +164,128 @@ class BandwidthManager:
                 }
             }
 
+# Field values download_from_record assumes when a record leaves them out
+_RECORD_DEFAULTS = {"max_retries": 3}
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value else None
+
+def _datetime(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value) if value is not None else None
+
+def download_record(download: ScheduledDownload) -> Dict[str, Any]:
+    """Store record for a download (see SchedulerStore)"""
+    data = {
+        "retry_count": download.retry_count,
+        "max_retries": download.max_retries,
+        "started_at": _timestamp(download.started_at),
+        "completed_at": _timestamp(download.completed_at),
+        "error_message": download.error_message,
+        "estimated_size": download.estimated_size,
+        "downloaded_size": download.downloaded_size,
+        "progress": download.progress,
+        "result": download.result,
+        "extractor": download.extractor,
+        "deadline": _timestamp(download.deadline),
+        "submitted_at": _timestamp(download.submitted_at),
+    }
+    return {
+        "id": download.id,
+        "url": download.url,
+        "status": download.status.value,
+        "priority": download.priority.value,
+        "scheduled_time": _timestamp(download.scheduled_time),
+        "created_at": download.created_at.timestamp(),
+        "options": download.options,
+        # Unset fields are left out: a fresh download stores an empty dict
+        "data": {k: v for k, v in data.items() if v and _RECORD_DEFAULTS.get(k) != v},
+    }
+
+def download_from_record(record: Dict[str, Any]) -> ScheduledDownload:
+    data = record["data"]
+    return ScheduledDownload(
+        id=record["id"],
+        url=record["url"],
+        options=record["options"],
+        priority=Priority(record["priority"]),
+        scheduled_time=_datetime(record["scheduled_time"]),
+        status=DownloadStatus(record["status"]),
+        retry_count=data.get("retry_count", 0),
+        max_retries=data.get("max_retries", _RECORD_DEFAULTS["max_retries"]),
+        created_at=_datetime(record["created_at"]),
+        started_at=_datetime(data.get("started_at")),
+        completed_at=_datetime(data.get("completed_at")),
+        error_message=data.get("error_message"),
+        estimated_size=data.get("estimated_size"),
+        downloaded_size=data.get("downloaded_size", 0),
+        progress=data.get("progress", 0.0),
+        result=data.get("result"),
+        extractor=data.get("extractor"),
+        deadline=_datetime(data.get("deadline")),
+        submitted_at=_datetime(data.get("submitted_at")),
+    )
+
+# Runs one scheduled download and returns the finished file's path (None = failed)
+DownloadExecutor = Callable[[ScheduledDownload], Awaitable[Optional[str]]]
+
 class AdvancedScheduler:
     """Advanced download scheduler with intelligent queuing"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], executor: Optional[DownloadExecutor] = None,
+                 bandwidth_parent: Optional[BandwidthLimiter] = None, performance_monitor: Any = None):
         self.config = config
-        self.download_queue = []  # Priority heap
+        self.executor = executor
+        self.policy = self._create_policy(config)
+        # Ready heaps of (policy rank, submit time, seq, download), one per host,
+        # and a timer heap of (due timestamp, seq, download). Entries are
+        # dropped lazily: one is live only while ``_queued`` maps its download
+        # id to the entry's seq. ``per_host_concurrency`` caps the downloads
+        # running per host (default 0: no cap beyond ``max_concurrent``).
+        self.hosts = HostQueues(
+            per_host=config.get('per_host_concurrency', 0),
+            host_limits=config.get('host_concurrency_limits'),
+            extractor_limits=config.get('extractor_concurrency_limits'),
+            min_interval=config.get('host_min_interval', 0.0),
+            host_intervals=config.get('host_min_intervals'),
+            backoff_base=config.get('host_backoff_base', 30.0),
+            backoff_max=config.get('host_backoff_max', 900.0),
+        )
+        # Downloads run outside the queue (plain batches) honor the same
+        # limits through the gate; a slot they free may unblock a queued host
+        self.host_gate = HostGate(self.hosts)
+        self.hosts.listeners.append(self._wake)
+        self.delayed_queue: List[Tuple[float, int, ScheduledDownload]] = []
+        self._queued: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
         self.active_downloads = {}  # download_id -> task
+        self.downloads: Dict[str, ScheduledDownload] = {}  # every download by id
+        self._futures: Dict[str, asyncio.Future] = {}  # download_id -> completion future
         self.completed_downloads = {}
         self.failed_downloads = {}
         
         # Configuration
-        self.max_concurrent = config.get('max_concurrent_downloads', 3)
+        # The download manager's ``max_concurrent``; ``max_concurrent_downloads`` is the older name
+        self.max_concurrent = config.get('max_concurrent', config.get('max_concurrent_downloads', 3))
+        self.concurrency_callbacks: List[Callable[[int], None]] = []  # see on_concurrency_change
         self.max_bandwidth_mbps = config.get('max_bandwidth_mbps', 100.0)
         self.retry_delay_base = config.get('retry_delay_base', 5.0)  # seconds
         self.retry_delay_multiplier = config.get('retry_delay_multiplier', 2.0)
+        self.max_retries = config.get('scheduler_max_retries', 3)
         
         # Components
-        self.bandwidth_manager = BandwidthManager(self.max_bandwidth_mbps)
+        self.bandwidth_manager = BandwidthManager(self.max_bandwidth_mbps, bandwidth_parent)
+        self.autotuner = self._create_autotuner(config, performance_monitor)
+        self._awaiting_first_byte: Dict[str, float] = {}  # download_id -> monotonic start
         self.is_running = False
         self.scheduler_task = None
         
+        # Optional durable queue; changes are written in batches by flush()
+        self.store = self._open_store(config)
+        self._dirty: Dict[str, ScheduledDownload] = {}
+        if self.store is not None:
+            self._recover()
+        
         # Callbacks
         self.download_started_callbacks = []
         self.download_completed_callbacks = []
@@ -133,6 +294,127 @@ class AdvancedScheduler:
         
         logger.info("Advanced scheduler initialized")
     
+    @staticmethod
+    def _create_policy(config: Dict[str, Any]) -> SchedulingPolicy:
+        """Start order (config ``scheduling_policy``: priority, sjf or edf;
+        ``priority_aging_seconds`` of waiting are worth one priority level)"""
+        aging = config.get('priority_aging_seconds', 0.0)
+        try:
+            return create_policy(config.get('scheduling_policy'), aging)
+        except ValueError as e:
+            logger.warning(f"{e}; using priority order")
+            return create_policy(None, aging)
+    
+    # Tunable limits: (config key, default, default minimum, default maximum)
+    AUTOTUNE_KNOBS = (
+        ('max_concurrent', 3, 1, 16),
+        ('max_concurrent_chunks', 8, 1, 32),
+        ('concurrent_fragment_downloads', 8, 1, 32),
+    )
+    
+    def _create_autotuner(self, config: Dict[str, Any], monitor: Any) -> Optional[ConcurrencyAutotuner]:
+        """Throughput-driven tuner for the concurrency limits (config ``autotune_concurrency``).
+
+        Download concurrency is the scheduler's own (listeners registered
+        with ``on_concurrency_change`` follow it); chunk and fragment
+        concurrency are written back to the shared config, where the
+        download manager reads them as each download starts. Scheduled
+        downloads feed it through ``update_progress``; plain batches,
+        which bypass the queue, through ``record_transfer``.
+        """
+        if not config.get('autotune_concurrency', False):
+            return None
+        tuner = ConcurrencyAutotuner(
+            interval=config.get('autotune_interval', 10.0),
+            improvement=config.get('autotune_improvement', 0.05),
+            error_rate=config.get('autotune_error_rate', 0.2),
+            latency_factor=config.get('autotune_latency_factor', 2.0),
+            monitor=monitor,
+        )
+        bounds = config.get('autotune_limits') or {}
+        for key, default, minimum, maximum in self.AUTOTUNE_KNOBS:
+            value = self.max_concurrent if key == 'max_concurrent' else config.get(key, default)
+            minimum, maximum = bounds.get(key, (minimum, max(maximum, value)))
+            tuner.add_knob(key, value, minimum, maximum, lambda n, key=key: self._apply_limit(key, n))
+        return tuner
+    
+    def _apply_limit(self, key: str, value: int) -> None:
+        self.config[key] = value
+        if key == 'max_concurrent':
+            self.set_concurrency(value)
+    
+    def set_concurrency(self, limit: int) -> None:
+        """Change how many downloads may run at once (0 = start none)"""
+        self.max_concurrent = limit
+        for callback in self.concurrency_callbacks:
+            callback(limit)
+        self._wake()
+    
+    def _autotune(self) -> None:
+        if self.autotuner is not None and self.autotuner.due():
+            self.autotuner.evaluate()
+    
+    def record_transfer(self, nbytes: int = 0, first_byte: Optional[float] = None,
+                        ok: Optional[bool] = None) -> None:
+        """Feed the autotuner from a download run outside the queue (plain batches).
+
+        ``nbytes`` arrived since the last call, ``first_byte`` is the time to
+        the first bytes in seconds and ``ok`` the outcome once it finished.
+        Called from the event loop thread.
+        """
+        if self.autotuner is None:
+            return
+        self.autotuner.record_bytes(nbytes)
+        if first_byte is not None:
+            self.autotuner.record_latency(first_byte)
+        if ok is not None:
+            self.autotuner.record_result(ok)
+        # The scheduler loop may not be running to evaluate for us
+        self._autotune()
+    
+    @staticmethod
+    def _open_store(config: Dict[str, Any]) -> Optional[SchedulerStore]:
+        """Store at ``scheduler_queue_path`` (True picks the default location)"""
+        path = config.get('scheduler_queue_path')
+        if not path:
+            return None
+        if path is True:
+            path = CACHE_DIR.parent / "scheduler_queue.db"
+        return SchedulerStore(path)
+    
+    def _recover(self) -> None:
+        """Queue the downloads a previous run left unfinished"""
+        recovered = 0
+        for record in self.store.recover():
+            download = download_from_record(record)
+            self.downloads[download.id] = download
+            if download.status == DownloadStatus.PENDING:
+                self._enqueue(download, persist=False)
+            recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished downloads from {self.store.path}")
+    
+    def _mark(self, download: ScheduledDownload) -> None:
+        """Note a changed download for the next flush"""
+        if self.store is not None:
+            self._dirty[download.id] = download
+    
+    def flush(self) -> None:
+        """Write pending changes to the durable queue in one transaction"""
+        if self.store is None or not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            self.store.save(download_record(d) for d in dirty.values())
+        except Exception as e:
+            logger.error(f"Could not persist scheduler queue: {e}")
+            # Keep the changes for the next attempt, unless newer ones replaced them
+            self._dirty = {**dirty, **self._dirty}
+    
+    def set_executor(self, executor: DownloadExecutor) -> None:
+        """Attach the coroutine function that performs the downloads"""
+        self.executor = executor
+    
     async def start(self) -> None:
         """Start the scheduler"""
         if self.is_running:
@@ -140,6 +422,7 @@ class AdvancedScheduler:
             return
         
         self.is_running = True
+        self._wakeup = asyncio.Event()
         self.scheduler_task = asyncio.create_task(self._scheduler_loop())
         logger.info("Advanced scheduler started")
     
@@ -157,6 +440,9 @@ class AdvancedScheduler:
         # Cancel all active downloads
         for task in self.active_downloads.values():
             task.cancel()
+        if self.active_downloads:
+            await asyncio.gather(*self.active_downloads.values(), return_exceptions=True)
+        self.flush()
         
         logger.info("Advanced scheduler stopped")
     
@@ -165,24 +451,138 @@ class AdvancedScheduler:
         url: str, 
         options: Dict[str, Any], 
         priority: Priority = Priority.NORMAL,
-        scheduled_time: Optional[datetime] = None
+        scheduled_time: Optional[datetime] = None,
+        extractor: Optional[str] = None,
+        estimated_size: Optional[int] = None,
+        deadline: Optional[datetime] = None
     ) -> str:
         """Schedule a new download"""
-        download_id = f"dl_{int(time.time() * 1000)}_{len(self.download_queue)}"
+        self._check_storable(options)
+        download_id = f"dl_{int(time.time() * 1000)}_{next(self._seq)}"
         
         download = ScheduledDownload(
             id=download_id,
             url=url,
             options=options,
             priority=priority,
-            scheduled_time=scheduled_time
+            scheduled_time=scheduled_time,
+            max_retries=self.max_retries,
+            extractor=extractor,
+            estimated_size=estimated_size,
+            deadline=deadline
         )
         
-        heapq.heappush(self.download_queue, download)
-        logger.info(f"Download scheduled: {download_id} with priority {priority.name}")
+        self.downloads[download_id] = download
+        self._enqueue(download)
+        self.flush()
+        logger.debug(f"Download scheduled: {download_id} with priority {priority.name}")
         
         return download_id
     
+    async def schedule_downloads(
+        self,
+        urls: Iterable[str],
+        options: Dict[str, Any],
+        priority: Priority = Priority.NORMAL,
+        scheduled_time: Optional[datetime] = None,
+        extractors: Optional[Dict[str, str]] = None,
+        sizes: Optional[Dict[str, int]] = None,
+        deadline: Optional[datetime] = None
+    ) -> List[str]:
+        """Schedule many downloads at once (one durable-queue transaction).
+
+        ``extractors`` maps URLs to their yt-dlp extractor where known, for
+        ``extractor_concurrency_limits``; ``sizes`` maps URLs to their
+        expected size in bytes where known, for the sjf policy.
+        """
+        self._check_storable(options)
+        download_ids = []
+        stamp = int(time.time() * 1000)
+        # One submit time for the batch, so aging leaves the policy's order within it alone
+        submitted_at = scheduled_time or datetime.now()
+        for url in urls:
+            download = ScheduledDownload(
+                id=f"dl_{stamp}_{next(self._seq)}",
+                url=url,
+                options=options,
+                priority=priority,
+                scheduled_time=scheduled_time,
+                max_retries=self.max_retries,
+                extractor=extractors.get(url) if extractors else None,
+                estimated_size=sizes.get(url) if sizes else None,
+                deadline=deadline,
+                submitted_at=submitted_at
+            )
+            self.downloads[download.id] = download
+            self._enqueue(download)
+            download_ids.append(download.id)
+        self.flush()
+        logger.debug(f"{len(download_ids)} downloads scheduled with priority {priority.name}")
+        return download_ids
+    
+    def _check_storable(self, options: Dict[str, Any]) -> None:
+        """Fail now, not at the next flush, on options the durable queue cannot hold"""
+        if self.store is not None:
+            encode_options(options)
+    
+    @property
+    def queue_size(self) -> int:
+        """Downloads waiting to start, including those due later"""
+        return len(self._queued)
+    
+    def _enqueue(self, download: ScheduledDownload, persist: bool = True) -> None:
+        """Queue a pending download (O(log n)) and wake the scheduler"""
+        if persist:
+            self._mark(download)
+        seq = next(self._seq)
+        self._queued[download.id] = seq
+        due = download.scheduled_time.timestamp() if download.scheduled_time else 0.0
+        if due > time.time():
+            heapq.heappush(self.delayed_queue, (due, seq, download))
+        else:
+            self._push_ready(download, seq)
+        self._wake()
+    
+    def _push_ready(self, download: ScheduledDownload, seq: int) -> None:
+        submitted = download.submitted_at
+        rank = self.policy.rank(download, submitted)
+        self.hosts.push(download.host, (rank, submitted.timestamp(), seq, download))
+    
+    def _dequeue(self, download_id: str) -> bool:
+        """Drop a queued download; its heap entry is discarded when reached"""
+        return self._queued.pop(download_id, None) is not None
+    
+    def _wake(self) -> None:
+        self._wakeup.set()
+    
+    def download_future(self, download_id: str) -> "asyncio.Future[ScheduledDownload]":
+        """Future resolving to the download once it has finished.
+
+        Finished means completed, failed with no retries left, or cancelled;
+        check ``status`` on the result. Raises KeyError for unknown ids.
+        """
+        download = self.downloads[download_id]
+        future = self._futures.get(download_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            if download.status in FINISHED_STATES:
+                future.set_result(download)
+            else:
+                self._futures[download_id] = future
+        return future
+    
+    async def as_completed(self, download_ids: Iterable[str]) -> AsyncIterator[ScheduledDownload]:
+        """Yield the given downloads as each one finishes, without polling"""
+        for next_done in asyncio.as_completed([self.download_future(i) for i in download_ids]):
+            yield await next_done
+    
+    def _finished(self, download: ScheduledDownload) -> None:
+        """Resolve the completion future of a download that reached a final state"""
+        self._mark(download)
+        future = self._futures.pop(download.id, None)
+        if future is not None and not future.done():
+            future.set_result(download)
+    
     async def cancel_download(self, download_id: str) -> bool:
         """Cancel a download"""
         # Check if it's in active downloads
@@ -190,83 +590,105 @@ class AdvancedScheduler:
             task = self.active_downloads[download_id]
             task.cancel()
             await self.bandwidth_manager.release_bandwidth(download_id)
-            del self.active_downloads[download_id]
+            self.active_downloads.pop(download_id, None)  # may have finished during the await
+            self._wake()
             logger.info(f"Active download cancelled: {download_id}")
             return True
         
         # Check if it's in the queue
-        for i, download in enumerate(self.download_queue):
-            if download.id == download_id:
-                download.status = DownloadStatus.CANCELLED
-                logger.info(f"Queued download cancelled: {download_id}")
-                return True
+        if self._dequeue(download_id):
+            self.downloads[download_id].status = DownloadStatus.CANCELLED
+            self._finished(self.downloads[download_id])
+            self.flush()
+            logger.info(f"Queued download cancelled: {download_id}")
+            return True
         
         logger.warning(f"Download not found for cancellation: {download_id}")
         return False
     
     async def pause_download(self, download_id: str) -> bool:
-        """Pause a download"""
+        """Pause a download; a running one stops and starts over on resume"""
+        download = self.downloads.get(download_id)
+        if download is None:
+            return False
         if download_id in self.active_downloads:
-            # For now, we cancel and re-queue with paused status
+            download.status = DownloadStatus.PAUSED
+            self._mark(download)
             await self.cancel_download(download_id)
-            # Mark as paused in queue
-            for download in self.download_queue:
-                if download.id == download_id:
-                    download.status = DownloadStatus.PAUSED
-                    break
+            return True
+        if self._dequeue(download_id):
+            download.status = DownloadStatus.PAUSED
+            self._mark(download)
+            self.flush()
             return True
         return False
     
     async def resume_download(self, download_id: str) -> bool:
         """Resume a paused download"""
-        for download in self.download_queue:
-            if download.id == download_id and download.status == DownloadStatus.PAUSED:
-                download.status = DownloadStatus.PENDING
-                logger.info(f"Download resumed: {download_id}")
-                return True
+        download = self.downloads.get(download_id)
+        if download is not None and download.status == DownloadStatus.PAUSED:
+            download.status = DownloadStatus.PENDING
+            self._enqueue(download)
+            self.flush()
+            logger.info(f"Download resumed: {download_id}")
+            return True
         return False
     
+    def report_throttled(self, url: str, retry_after: Optional[float] = None) -> float:
+        """Back off the host of ``url`` after it answered 429 Too Many Requests.
+
+        Returns the backoff in seconds (``retry_after`` when the origin sent
+        one). Its queued downloads wait; running ones are left alone.
+        """
+        backoff = self.hosts.throttled(host_of(url), retry_after)
+        if self.autotuner is not None:
+            # On top of the failure the download itself reports: a 429 is
+            # the clearest sign of too much concurrency
+            self.autotuner.record_result(False)
+        self._wake()
+        return backoff
+    
     async def get_queue_status(self) -> Dict[str, Any]:
         """Get current queue status"""
-        pending_count = sum(1 for d in self.download_queue if d.status == DownloadStatus.PENDING)
-        paused_count = sum(1 for d in self.download_queue if d.status == DownloadStatus.PAUSED)
+        paused_count = sum(1 for d in self.downloads.values() if d.status == DownloadStatus.PAUSED)
         
         bandwidth_info = await self.bandwidth_manager.get_bandwidth_info()
         
         return {
-            "queue_length": len(self.download_queue),
-            "pending_downloads": pending_count,
+            "queue_length": self.queue_size,
+            "pending_downloads": self.queue_size,
+            "delayed_downloads": len(self.delayed_queue),
+            "policy": self.policy.name,
+            "hosts": self.hosts.snapshot(),
             "paused_downloads": paused_count,
             "active_downloads": len(self.active_downloads),
             "completed_downloads": len(self.completed_downloads),
             "failed_downloads": len(self.failed_downloads),
             "bandwidth": bandwidth_info,
+            "concurrency": {"max_concurrent": self.max_concurrent},
+            "autotune": self.autotuner.snapshot() if self.autotuner is not None else None,
             "is_running": self.is_running
         }
     
+    def get_status(self) -> Dict[str, Any]:
+        """Summary of the scheduler's state for status displays"""
+        return {
+            "active": self.is_running,
+            "queue_size": self.queue_size,
+            "active_downloads": len(self.active_downloads),
+            "completed_downloads": len(self.completed_downloads),
+            "failed_downloads": len(self.failed_downloads),
+            "bandwidth_usage": sum(self.bandwidth_manager.allocated_bandwidth.values()) / 1024 / 1024,
+        }
+    
     async def get_download_info(self, download_id: str) -> Optional[Dict[str, Any]]:
         """Get information about a specific download"""
-        # Check active downloads
-        if download_id in self.active_downloads:
-            # Find the download in queue for full info
-            for download in self.download_queue:
-                if download.id == download_id:
-                    return self._download_to_dict(download)
-        
-        # Check completed downloads
-        if download_id in self.completed_downloads:
-            return self._download_to_dict(self.completed_downloads[download_id])
-        
-        # Check failed downloads
-        if download_id in self.failed_downloads:
-            return self._download_to_dict(self.failed_downloads[download_id])
-        
-        # Check queue
-        for download in self.download_queue:
-            if download.id == download_id:
-                return self._download_to_dict(download)
-        
-        return None
+        download = self.downloads.get(download_id)
+        if download is None and self.store is not None:
+            # Finished in an earlier run
+            record = self.store.load(download_id)
+            download = download_from_record(record) if record else None
+        return self._download_to_dict(download) if download else None
     
     def _download_to_dict(self, download: ScheduledDownload) -> Dict[str, Any]:
         """Convert download object to dictionary"""
@@ -281,57 +703,86 @@ class AdvancedScheduler:
             "started_at": download.started_at.isoformat() if download.started_at else None,
             "completed_at": download.completed_at.isoformat() if download.completed_at else None,
             "estimated_size": download.estimated_size,
+            "deadline": download.deadline.isoformat() if download.deadline else None,
             "downloaded_size": download.downloaded_size,
-            "error_message": download.error_message
+            "error_message": download.error_message,
+            "result": download.result
         }
     
     async def _scheduler_loop(self) -> None:
-        """Main scheduler loop"""
+        """Main scheduler loop.
+
+        Sleeps until something can change what runs: a download queued or
+        finished, a cancellation, or the next delayed download falling due.
+        """
         while self.is_running:
             try:
+                # Cleared first so a wakeup during dispatch is not lost
+                self._wakeup.clear()
                 await self._process_queue()
-                await asyncio.sleep(1.0)  # Check every second
+                self._autotune()
+                self.flush()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_timer_delay())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {e}")
                 await asyncio.sleep(5.0)  # Wait longer on error
+    
+    def _next_timer_delay(self) -> Optional[float]:
+        """Seconds until a delayed download is due, a waiting host opens or,
+        while downloads run, the autotuner is due (None = never)"""
+        while self.delayed_queue and self._queued.get(self.delayed_queue[0][2].id) != self.delayed_queue[0][1]:
+            heapq.heappop(self.delayed_queue)  # stale entry
+        now = time.time()
+        delays = [t - now for t in (self.delayed_queue[0][0] if self.delayed_queue else None,
+                                    self.hosts.next_wakeup) if t is not None]
+        if self.autotuner is not None and self.active_downloads:
+            delays.append(self.autotuner.next_due - time.monotonic())
+        if not delays:
+            return None
+        return max(0.0, min(delays))
+    
+    def _promote_due(self, now: float) -> None:
+        """Move delayed downloads that are due onto the ready heap"""
+        while self.delayed_queue and self.delayed_queue[0][0] <= now:
+            _, seq, download = heapq.heappop(self.delayed_queue)
+            if self._queued.get(download.id) == seq:
+                self._push_ready(download, seq)
+    
+    def _is_live(self, entry: Tuple[int, float, int, ScheduledDownload]) -> bool:
+        return self._queued.get(entry[3].id) == entry[2]
+    
+    def _pop_ready(self) -> Optional[ScheduledDownload]:
+        """Next download its host allows to start, removed from the queue"""
+        entry = self.hosts.pop(self._is_live)
+        if entry is None:
+            return None
+        download = entry[3]
+        del self._queued[download.id]
+        return download
+    
     async def _process_queue(self) -> None:
-        """Process the download queue with optimized flow control"""
-        current_time = datetime.now()
-        
-        # Start new downloads if we have capacity
-        while (len(self.active_downloads) < self.max_concurrent and 
-               self.download_queue):
-            
-            eligible_download = self._find_next_eligible_download(current_time)
-            if not eligible_download:
-                break  # No eligible downloads
-            
-            await self._prepare_and_start_download(eligible_download)
-    
-    def _find_next_eligible_download(self, current_time: datetime) -> Optional[ScheduledDownload]:
-        """Find the next eligible download from the queue"""
-        for i, download in enumerate(self.download_queue):
-            if self._is_download_eligible(download, current_time):
-                return download
-        return None
-    
-    def _is_download_eligible(self, download: ScheduledDownload, current_time: datetime) -> bool:
-        """Check if a download is eligible to start"""
-        return (download.status == DownloadStatus.PENDING and
-                (download.scheduled_time is None or download.scheduled_time <= current_time))
-    
-    async def _prepare_and_start_download(self, download: ScheduledDownload) -> None:
-        """Prepare and start a download with proper queue management"""
-        # Remove from queue and start
-        self.download_queue.remove(download)
-        heapq.heapify(self.download_queue)  # Re-heapify after removal
+        """Start queued downloads while there is capacity (O(log n) each)"""
+        self._promote_due(time.time())
         
-        await self._start_download(download)
+        while len(self.active_downloads) < self.max_concurrent:
+            download = self._pop_ready()
+            if download is None:
+                break  # Nothing ready
+            await self._start_download(download)
     
     async def _start_download(self, download: ScheduledDownload) -> None:
         """Start a download"""
         download.status = DownloadStatus.DOWNLOADING
         download.started_at = datetime.now()
+        self.hosts.started(download.host, download.extractor)
+        if self.autotuner is not None:
+            self._awaiting_first_byte[download.id] = time.monotonic()
+        self._mark(download)
         
         # Allocate bandwidth
         requested_bandwidth = self.max_bandwidth_mbps * 1024 * 1024 / self.max_concurrent
@@ -341,6 +792,7 @@ class AdvancedScheduler:
         
         # Create download task
         task = asyncio.create_task(self._execute_download(download))
+        task.add_done_callback(lambda t: self._task_done(download, t))
         self.active_downloads[download.id] = task
         
         # Notify callbacks
@@ -352,35 +804,66 @@ class AdvancedScheduler:
         
         logger.info(f"Download started: {download.id} (allocated {allocated/1024/1024:.1f} MB/s)")
     
+    def _task_done(self, download: ScheduledDownload, task: asyncio.Task) -> None:
+        # Runs however the task ended, even if it was cancelled before it ran
+        self.hosts.finished(download.host, download.extractor)
+        self._awaiting_first_byte.pop(download.id, None)
+        self._wake()
+        # A task cancelled before it ran never reached _execute_download's handler
+        if task.cancelled() and download.status not in FINISHED_STATES + (DownloadStatus.PAUSED,):
+            download.status = DownloadStatus.CANCELLED
+            self._finished(download)
+    
+    def update_progress(self, download: ScheduledDownload, downloaded: int, total: Optional[int] = None) -> None:
+        """Record bytes transferred for a running download.
+
+        Called by the executor (from the event loop thread) as data arrives;
+        progress callbacks fire at most once per whole percent.
+        """
+        if self.autotuner is not None:
+            self.autotuner.record_bytes(downloaded - download.downloaded_size)
+            started = self._awaiting_first_byte.pop(download.id, None) if downloaded else None
+            if started is not None:
+                self.autotuner.record_latency(time.monotonic() - started)
+        download.downloaded_size = downloaded
+        if total:
+            download.estimated_size = total
+        if not download.estimated_size:
+            return
+        previous = download.progress
+        download.progress = min(1.0, downloaded / download.estimated_size)
+        if self.progress_callbacks and int(download.progress * 100) != int(previous * 100):
+            asyncio.ensure_future(self._notify_progress(download))
+    
+    async def _notify_progress(self, download: ScheduledDownload) -> None:
+        for callback in self.progress_callbacks:
+            try:
+                await callback(download)
+            except Exception as e:
+                logger.error(f"Error in progress callback: {e}")
+    
     async def _execute_download(self, download: ScheduledDownload) -> None:
         """Execute the actual download"""
         try:
-            # Import download manager here to avoid circular imports
-            from .manager import AsyncDownloadManager
-            
-            # This would integrate with your existing download manager
-            # For now, simulate a download
+            if self.executor is None:
+                raise RuntimeError("No download executor attached to the scheduler")
             logger.info(f"Executing download: {download.id}")
             
-            # Simulate download progress
-            for progress in range(0, 101, 10):
-                download.progress = progress / 100.0
-                
-                # Notify progress callbacks
-                for callback in self.progress_callbacks:
-                    try:
-                        await callback(download)
-                    except Exception as e:
-                        logger.error(f"Error in progress callback: {e}")
-                
-                await asyncio.sleep(0.5)  # Simulate work
+            result = await self.executor(download)
+            if not result:
+                raise RuntimeError(f"Download of {download.url} did not produce a file")
             
             # Mark as completed
+            self.hosts.succeeded(download.host)
+            if self.autotuner is not None:
+                self.autotuner.record_result(True)
+            download.result = result
             download.status = DownloadStatus.COMPLETED
             download.completed_at = datetime.now()
             download.progress = 1.0
             
             self.completed_downloads[download.id] = download
+            self._finished(download)
             
             # Notify completion callbacks
             for callback in self.download_completed_callbacks:
@@ -392,13 +875,17 @@ class AdvancedScheduler:
             logger.info(f"Download completed: {download.id}")
             
         except asyncio.CancelledError:
-            download.status = DownloadStatus.CANCELLED
+            if download.status != DownloadStatus.PAUSED:
+                download.status = DownloadStatus.CANCELLED
+                self._finished(download)
             logger.info(f"Download cancelled: {download.id}")
             raise
             
         except Exception as e:
             download.status = DownloadStatus.FAILED
             download.error_message = str(e)
+            if self.autotuner is not None:
+                self.autotuner.record_result(False)
             
             # Handle retries
             if download.retry_count < download.max_retries:
@@ -408,10 +895,11 @@ class AdvancedScheduler:
                 download.status = DownloadStatus.PENDING
                 
                 # Re-queue for retry
-                heapq.heappush(self.download_queue, download)
+                self._enqueue(download)
                 logger.info(f"Download retry scheduled: {download.id} (attempt {download.retry_count})")
             else:
                 self.failed_downloads[download.id] = download
+                self._finished(download)
                 
                 # Notify failure callbacks
                 for callback in self.download_failed_callbacks:
@@ -426,6 +914,7 @@ class AdvancedScheduler:
             # Clean up
             await self.bandwidth_manager.release_bandwidth(download.id)
             self.active_downloads.pop(download.id, None)
+            self._wake()
     
     # Callback registration methods
     def on_download_started(self, callback: Callable[[ScheduledDownload], None]) -> None:
@@ -443,6 +932,10 @@ class AdvancedScheduler:
     def on_progress_update(self, callback: Callable[[ScheduledDownload], None]) -> None:
         """Register callback for progress updates"""
         self.progress_callbacks.append(callback)
+    
+    def on_concurrency_change(self, callback: Callable[[int], None]) -> None:
+        """Register callback for changes of the concurrency limit"""
+        self.concurrency_callbacks.append(callback)
 
 # Utility functions
 async def create_smart_scheduler(config: Dict[str, Any]) -> AdvancedScheduler:
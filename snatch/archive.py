@@ -0,0 +1,157 @@
+"""
+Download Archive for Snatch Media Downloader
+
+Remembers what has been downloaded so re-runs of the same playlists and URL
+lists skip finished media without extracting them again. Media are keyed by
+extractor and media id (``"youtube dQw4w9WgXcQ"``, the same line format as
+yt-dlp's ``--download-archive`` file, so either tool can read the other's)
+and by canonical URL. The whole archive is held in a set, so every check is
+a hash lookup; completions are appended to the file one line group per
+write, which is atomic for appenders and survives crashes.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+URL_PREFIX = "url "
+INFO_JSON_SUFFIX = ".info.json"
+
+
+def canonical_url(url: str) -> str:
+    """Normalized form of ``url`` (lowercase scheme and host, no fragment)"""
+    parsed = urlparse(url.strip())
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(),
+                           fragment="").geturl()
+
+
+def resolve_media_id(ydl: Any, url: str) -> Optional[Tuple[str, str]]:
+    """``(extractor key, media id)`` read off the URL alone, without extracting.
+
+    Uses the first specific extractor that claims the URL; the generic
+    extractor does not know ids, so it never matches.
+    """
+    try:
+        for ie_key, ie in ydl._ies.items():
+            if ie_key == "Generic" or not ie.suitable(url):
+                continue
+            media_id = ie.get_temp_id(url)
+            return (ie_key, str(media_id)) if media_id else None
+    except Exception as e:
+        logger.debug(f"Could not resolve extractor for {url}: {e}")
+    return None
+
+
+def media_key(extractor: str, media_id: str) -> str:
+    return f"{extractor.lower()} {media_id}"
+
+
+def url_key(url: str) -> str:
+    return URL_PREFIX + canonical_url(url)
+
+
+class DownloadArchive:
+    """Append-only archive of finished downloads with O(1) membership checks."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._keys: Set[str] = set()
+        self._lock = threading.Lock()
+        self.existed = os.path.exists(self.path)
+        self._load()
+
+    def _load(self) -> None:
+        if not self.existed:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._keys.update(line.strip() for line in f if line.strip())
+        except OSError as e:
+            logger.warning(f"Could not read download archive {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def has_media(self, extractor: Optional[str], media_id: Optional[str]) -> bool:
+        return bool(extractor and media_id) and media_key(extractor, media_id) in self._keys
+
+    def has_url(self, url: str) -> bool:
+        return url_key(url) in self._keys
+
+    def has_entry(self, entry: Dict[str, Any]) -> bool:
+        """Whether a (flat or full) info dict is archived, by id or by URL"""
+        extractor = entry.get("extractor_key") or entry.get("ie_key")
+        if self.has_media(extractor, entry.get("id")):
+            return True
+        return any(self.has_url(entry[k]) for k in ("webpage_url", "original_url", "url")
+                   if isinstance(entry.get(k), str))
+
+    @staticmethod
+    def keys_for(info: Dict[str, Any], urls: Iterable[str] = ()) -> Set[str]:
+        """Archive keys recording ``info`` (and any extra URLs it was reached by)"""
+        keys = set()
+        extractor = info.get("extractor_key") or info.get("ie_key")
+        if extractor and info.get("id"):
+            keys.add(media_key(extractor, str(info["id"])))
+        for url in [info.get("webpage_url"), info.get("original_url"), *urls]:
+            if isinstance(url, str) and url:
+                keys.add(url_key(url))
+        return keys
+
+    def add(self, keys: Iterable[str]) -> int:
+        """Record ``keys``; returns how many were new.
+
+        The new lines go out in a single appending write followed by fsync,
+        so a crash leaves either all of them or none.
+        """
+        with self._lock:
+            new = [k for k in dict.fromkeys(keys) if k and k not in self._keys]
+            if not new:
+                return 0
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            data = "".join(f"{k}\n" for k in new).encode("utf-8")
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._keys.update(new)
+            return len(new)
+
+    def record(self, info: Dict[str, Any], urls: Iterable[str] = ()) -> int:
+        return self.add(self.keys_for(info, urls))
+
+    def import_directory(self, directory: str) -> int:
+        """Archive media already on disk that have an ``.info.json`` sidecar.
+
+        A sidecar only counts while a media file with the same stem sits next
+        to it, so deleted downloads are fetched again. Returns keys added.
+        """
+        if not os.path.isdir(directory):
+            return 0
+        keys: Set[str] = set()
+        for root, _dirs, files in os.walk(directory):
+            media_stems = {n.rsplit(".", 1)[0] for n in files
+                           if "." in n and not n.endswith((INFO_JSON_SUFFIX, ".part", ".ytdl"))}
+            for name in files:
+                if not name.endswith(INFO_JSON_SUFFIX) or name[:-len(INFO_JSON_SUFFIX)] not in media_stems:
+                    continue
+                try:
+                    with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                        info = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Skipping unreadable sidecar {name}: {e}")
+                    continue
+                if isinstance(info, dict) and info.get("_type", "video") == "video":
+                    keys |= self.keys_for(info)
+        return self.add(keys)
@@ -0,0 +1,208 @@
+"""
+Concurrency Autotuner for Snatch Media Downloader
+
+The right number of parallel downloads, chunks and fragments depends on the
+link, the origins and the box, so instead of fixed numbers each limit is a
+knob tuned by throughput feedback, AIMD style: every interval the tuner
+raises one knob by one step and keeps the step only if aggregate throughput
+improved by a margin; a plateau reverts it. Resource pressure (CPU or memory
+over the PerformanceMonitor thresholds), a high failure rate or rising time
+to first byte cut every knob multiplicatively instead.
+"""
+
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Knob:
+    """One tuned limit; ``apply`` puts a new value into effect"""
+    name: str
+    value: int
+    minimum: int
+    maximum: int
+    apply: Callable[[int], None]
+
+
+@dataclass
+class TuningDecision:
+    knob: str
+    old: int
+    new: int
+    reason: str
+    at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"knob": self.knob, "from": self.old, "to": self.new, "reason": self.reason,
+                "at": round(self.at, 3)}
+
+
+class ConcurrencyAutotuner:
+    """AIMD tuner for a set of concurrency knobs.
+
+    Feed it with ``record_bytes``, ``record_result`` and ``record_latency``
+    and call ``evaluate`` once ``due``. Knobs are probed one at a time, in
+    turn; after a plateau or a decrease the tuner holds for
+    ``hold_intervals`` evaluations before probing again.
+    """
+
+    def __init__(self, interval: float = 10.0, improvement: float = 0.05, error_rate: float = 0.2,
+                 latency_factor: float = 2.0, decrease: float = 0.5, hold_intervals: int = 3,
+                 monitor: Any = None, history: int = 20):
+        self.interval = interval
+        self.improvement = improvement
+        self.error_rate = error_rate
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.hold_intervals = hold_intervals
+        self.monitor = monitor
+        self.knobs: Dict[str, Knob] = {}
+        self.decisions: Deque[TuningDecision] = deque(maxlen=history)
+        self.throughput = 0.0  # bytes/sec over the last interval
+        self.latency_baseline: Optional[float] = None
+        self._probe: Optional[Tuple[Knob, int, float]] = None  # knob, old value, throughput before
+        self._turn = 0
+        self._hold = 0
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now: float) -> None:
+        self._window_start = now
+        self._bytes = 0
+        self._ok = 0
+        self._failed = 0
+        self._latencies: List[float] = []
+
+    def add_knob(self, name: str, value: int, minimum: int, maximum: int, apply: Callable[[int], None]) -> None:
+        clamped = min(max(int(value), minimum), maximum)
+        self.knobs[name] = Knob(name, clamped, minimum, maximum, apply)
+        if clamped != value:
+            apply(clamped)
+
+    def remove_knob(self, name: str) -> None:
+        """Stop tuning ``name``, leaving its current value in place"""
+        knob = self.knobs.pop(name, None)
+        if knob is not None and self._probe is not None and self._probe[0] is knob:
+            self._probe = None
+
+    def limits(self) -> Dict[str, int]:
+        return {name: knob.value for name, knob in self.knobs.items()}
+
+    def record_bytes(self, nbytes: int) -> None:
+        if nbytes > 0:
+            self._bytes += nbytes
+
+    def record_result(self, ok: bool) -> None:
+        if ok:
+            self._ok += 1
+        else:
+            self._failed += 1
+
+    def record_latency(self, seconds: float) -> None:
+        """Time from a download's start to its first bytes"""
+        self._latencies.append(seconds)
+
+    @property
+    def next_due(self) -> float:
+        """Monotonic time of the next evaluation"""
+        return self._window_start + self.interval
+
+    def due(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) >= self.next_due
+
+    def _set(self, knob: Knob, value: int, reason: str, now: float) -> Optional[TuningDecision]:
+        value = min(max(value, knob.minimum), knob.maximum)
+        if value == knob.value:
+            return None
+        decision = TuningDecision(knob.name, knob.value, value, reason, now)
+        knob.value = value
+        knob.apply(value)
+        self.decisions.append(decision)
+        logger.info(f"Autotune: {knob.name} {decision.old} -> {value} ({reason})")
+        return decision
+
+    def _resource_pressure(self) -> Optional[str]:
+        metrics = self.monitor.get_current_metrics() if self.monitor is not None else None
+        if metrics is None:
+            return None
+        cpu = getattr(metrics, "cpu_percent", 0.0)
+        memory = getattr(metrics, "memory_percent", 0.0)
+        if cpu > getattr(self.monitor, "cpu_threshold", 100.0):
+            return f"CPU at {cpu:.0f}%"
+        if memory > getattr(self.monitor, "memory_threshold", 100.0):
+            return f"memory at {memory:.0f}%"
+        return None
+
+    def _congestion(self) -> Optional[str]:
+        """Why the last interval looks overloaded, if it does"""
+        pressure = self._resource_pressure()
+        if pressure:
+            return pressure
+        finished = self._ok + self._failed
+        if finished and self._failed / finished > self.error_rate:
+            return f"{self._failed}/{finished} downloads failed"
+        if self._latencies:
+            latency = sum(self._latencies) / len(self._latencies)
+            baseline = self.latency_baseline
+            if baseline is not None and latency > baseline * self.latency_factor:
+                return f"time to first byte {latency:.1f}s vs {baseline:.1f}s"
+            self.latency_baseline = latency if baseline is None else min(baseline, latency)
+        return None
+
+    def evaluate(self, now: Optional[float] = None) -> List[TuningDecision]:
+        """Close the current interval and adjust the knobs; returns the changes"""
+        now = time.monotonic() if now is None else now
+        elapsed = max(now - self._window_start, 1e-6)
+        throughput = self._bytes / elapsed
+        idle = not self._bytes and not (self._ok + self._failed)
+        congestion = self._congestion()
+        self._reset_window(now)
+        if idle and not congestion:
+            return []  # nothing running: no evidence either way
+        self.throughput = throughput
+        decisions: List[Optional[TuningDecision]] = []
+
+        if congestion:
+            # Multiplicative decrease of every knob
+            for knob in self.knobs.values():
+                decisions.append(self._set(knob, int(knob.value * self.decrease), congestion, now))
+            self._probe = None
+            self._hold = self.hold_intervals
+        elif self._probe is not None:
+            knob, old, before = self._probe
+            self._probe = None
+            if throughput >= before * (1 + self.improvement):
+                gain = f"throughput +{(throughput / before - 1) * 100:.0f}%" if before else "throughput up"
+                # Keep the step and try another on the same knob
+                step = self._set(knob, knob.value + 1, gain, now)
+                decisions.append(step)
+                if step is not None:
+                    self._probe = (knob, step.old, throughput)
+                else:
+                    self._turn += 1  # at its maximum
+            else:
+                decisions.append(self._set(knob, old, "throughput plateaued", now))
+                self._turn += 1
+                self._hold = self.hold_intervals
+        elif self._hold > 0:
+            self._hold -= 1
+        else:
+            knobs = [k for k in self.knobs.values() if k.value < k.maximum]
+            if knobs:
+                knob = knobs[self._turn % len(knobs)]
+                step = self._set(knob, knob.value + 1, "probing for more throughput", now)
+                decisions.append(step)
+                self._probe = (knob, step.old, throughput)
+        return [d for d in decisions if d is not None]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limits": self.limits(),
+            "throughput_mbps": round(self.throughput / 1024 / 1024, 3),
+            "probing": self._probe[0].name if self._probe else None,
+            "decisions": [d.to_dict() for d in self.decisions],
+        }
@@ -0,0 +1,211 @@
+"""
+Bandwidth Limiting for Snatch Media Downloader
+
+Hierarchical token-bucket limiter (global -> per-download -> per-connection)
+applied inside the streaming read loops. Each node enforces its own hard cap
+and splits it between its children by max-min fairness over their measured
+demand, so allocation a child leaves unused is redistributed to busier
+siblings instead of sitting idle.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Smallest burst a bucket allows, so one network read never waits on itself
+MIN_BURST = 64 * 1024
+
+
+class TokenBucket:
+    """Thread-safe token bucket that lets callers go into debt and wait it off.
+
+    ``reserve`` always succeeds and returns how long the caller must wait,
+    which keeps the bucket usable from both asyncio code and worker threads.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = max(0.0, float(rate))
+        self.burst = burst or max(self.rate * 0.25, MIN_BURST)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.consumed = 0  # total bytes ever reserved
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Change the fill rate, keeping tokens earned at the old rate."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(0.0, float(rate))
+            self.burst = max(self.rate * 0.25, MIN_BURST)
+            self._tokens = min(self._tokens, self.burst)
+
+    def reserve(self, nbytes: int) -> float:
+        """Take ``nbytes`` of tokens and return the seconds to wait before using them."""
+        with self._lock:
+            self.consumed += nbytes
+            if self.rate <= 0:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= nbytes
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class BandwidthLimiter:
+    """One node in the limiter hierarchy.
+
+    ``ceiling`` is the node's configured hard cap in bytes/sec (0 = none).
+    When the node itself is capped it periodically re-divides its rate among
+    its children: each gets what it actually used plus headroom, up to its
+    own ceiling, and whatever is left over is shared by the rest.
+    """
+
+    def __init__(self, ceiling: float = 0.0, parent: Optional["BandwidthLimiter"] = None,
+                 name: str = "", rebalance_interval: float = 0.5):
+        self.name = name
+        self.ceiling = max(0.0, float(ceiling))
+        self.parent = parent
+        self.bucket = TokenBucket(self.ceiling)
+        self.children: List["BandwidthLimiter"] = []
+        self.rebalance_interval = rebalance_interval
+        self._lock = threading.Lock()
+        self._last_rebalance = time.monotonic()
+        self._seen_consumed: Dict[int, Tuple[int, float]] = {}  # child id -> (consumed, when)
+        self._demands: Dict[int, float] = {}  # child id -> estimated bytes/sec wanted
+
+    @property
+    def is_limited(self) -> bool:
+        """Whether this node or any ancestor enforces a rate."""
+        node: Optional[BandwidthLimiter] = self
+        while node is not None:
+            if node.bucket.rate > 0 or node.ceiling > 0:
+                return True
+            node = node.parent
+        return False
+
+    def child(self, ceiling: float = 0.0, name: str = "") -> "BandwidthLimiter":
+        """Create a child node sharing this node's allocation."""
+        node = BandwidthLimiter(ceiling, parent=self, name=name,
+                                rebalance_interval=self.rebalance_interval)
+        with self._lock:
+            now = time.monotonic()
+            self.children.append(node)
+            self._seen_consumed[id(node)] = (0, now)
+            self._rebalance_locked(now, measure=False)
+        return node
+
+    def close(self) -> None:
+        """Detach from the parent so its allocation goes back to the siblings."""
+        parent = self.parent
+        if parent is None:
+            return
+        with parent._lock:
+            if self in parent.children:
+                parent.children.remove(self)
+                parent._seen_consumed.pop(id(self), None)
+                parent._demands.pop(id(self), None)
+                parent._rebalance_locked(time.monotonic(), measure=False)
+        self.parent = None
+
+    def reserve(self, nbytes: int) -> float:
+        """Charge ``nbytes`` to this node and its ancestors; returns seconds to wait."""
+        if self.children:
+            now = time.monotonic()
+            if now - self._last_rebalance >= self.rebalance_interval:
+                with self._lock:
+                    if now - self._last_rebalance >= self.rebalance_interval:
+                        self._rebalance_locked(now)
+        wait = self.bucket.reserve(nbytes)
+        if self.parent is not None:
+            wait = max(wait, self.parent.reserve(nbytes))
+        return wait
+
+    async def acquire(self, nbytes: int) -> None:
+        """Wait (without blocking the loop) until ``nbytes`` may be transferred."""
+        wait = self.reserve(nbytes)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, nbytes: int) -> None:
+        """Blocking variant for worker threads such as yt-dlp progress hooks."""
+        wait = self.reserve(nbytes)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _rebalance_locked(self, now: float, measure: bool = True) -> None:
+        """Max-min fair split of this node's rate over its children's demand.
+
+        With ``measure`` each child's demand is re-estimated from what it used
+        since the last pass; otherwise (a child joined or left) the previous
+        estimates are reused. Children never measured want their full ceiling.
+        """
+        children = list(self.children)
+        capacity = self.bucket.rate
+        if capacity <= 0:
+            # Uncapped parent: children are only bound by their own ceilings
+            for child in children:
+                child.bucket.set_rate(child.ceiling)
+            return
+        if not children:
+            return
+
+        floor = capacity / (len(children) * 10)
+        if measure:
+            self._last_rebalance = now
+            for child in children:
+                key = id(child)
+                consumed = child.bucket.consumed
+                last_consumed, since = self._seen_consumed.get(key, (consumed, now))
+                if now - since >= self.rebalance_interval / 2:
+                    used = (consumed - last_consumed) / (now - since)
+                    saturated = child.bucket.rate <= 0 or used >= 0.9 * child.bucket.rate
+                    self._demands[key] = float("inf") if saturated else max(used * 1.5, floor)
+                    self._seen_consumed[key] = (consumed, now)
+
+        demands = {
+            id(c): min(self._demands.get(id(c), float("inf")), c.ceiling or float("inf"))
+            for c in children
+        }
+
+        # Water-fill: satisfy the smallest demands first, split the rest evenly
+        remaining = capacity
+        allocation = {}
+        pending = sorted(children, key=lambda c: demands[id(c)])
+        for index, child in enumerate(pending):
+            share = remaining / (len(pending) - index)
+            allocation[id(child)] = min(demands[id(child)], share)
+            remaining -= allocation[id(child)]
+
+        # Work-conserving: hand leftover capacity to children below their
+        # ceiling, least headroom first so what a capped child can't take
+        # goes to the others
+        def headroom(c: "BandwidthLimiter") -> float:
+            return c.ceiling - allocation[id(c)] if c.ceiling else float("inf")
+
+        growable = sorted((c for c in children if headroom(c) > 0), key=headroom)
+        for index, child in enumerate(growable):
+            extra = min(remaining / (len(growable) - index), headroom(child))
+            allocation[id(child)] += extra
+            remaining -= extra
+
+        for child in children:
+            child.bucket.set_rate(max(allocation[id(child)], floor))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rates and usage of this subtree."""
+        return {
+            "name": self.name,
+            "ceiling_bps": self.ceiling,
+            "rate_bps": self.bucket.rate,
+            "consumed": self.bucket.consumed,
+            "children": [child.snapshot() for child in list(self.children)],
+        }
@@ -0,0 +1,271 @@
+"""
+Batch Engine for Snatch Media Downloader
+
+Runs a worker over a list of URLs with a bounded number in flight. The URL
+iterable is consumed lazily through a sliding window, so a 10k-URL batch holds
+a handful of tasks rather than ten thousand; a slot limit shared by every
+batch of one engine caps concurrent downloads process-wide. Results are
+streamed as they finish, any URL can be cancelled while pending or running,
+and ``run`` hands the results back in input order for the final report.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict,
+                    Iterable, List, Optional, Set, Union)
+
+from .chunk_engine import SlidingWindow
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one URL in a batch"""
+    index: int
+    url: str
+    status: str
+    result: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == COMPLETED
+
+
+class ConcurrencyLimit:
+    """Counting slot limit whose size can change while slots are held.
+
+    Slots go to waiters first come first served: a released slot is handed
+    straight to the oldest waiter, so a newcomer cannot take it first.
+    Lowering the limit never interrupts running work; new acquisitions wait
+    until enough slots have been released.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter  # resolved with the slot already counted for us
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # pass the slot we were handed on
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        self.active = max(0, self.active - 1)
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = max(1, int(limit))
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.active < self.limit and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.active += 1
+
+
+class _Batch:
+    """Bookkeeping for one running ``stream`` call"""
+
+    def __init__(self) -> None:
+        self.pending_cancels: Set[str] = set()
+        self.running: Dict[str, Set[asyncio.Task]] = {}
+        self.cancelled_tasks: Set[asyncio.Task] = set()
+
+
+class BatchEngine:
+    """Bounded-concurrency runner shared by the download managers.
+
+    ``max_concurrent`` is the global limit for every batch started on this
+    engine and can be changed at runtime with ``set_limit``.
+    """
+
+    def __init__(self, max_concurrent: int = 3):
+        self._slots = ConcurrencyLimit(max_concurrent)
+        self._batches: List[_Batch] = []
+
+    @property
+    def limit(self) -> int:
+        return self._slots.limit
+
+    @property
+    def active(self) -> int:
+        """Workers currently holding a slot"""
+        return self._slots.active
+
+    def set_limit(self, max_concurrent: int) -> None:
+        self._slots.set_limit(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the engine-wide slots for work run outside a batch"""
+        await self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def cancel(self, url: str) -> bool:
+        """Cancel ``url`` in every running batch, whether started or still queued.
+
+        Returns False when no batch is running. A running worker is cancelled
+        and reported as ``cancelled``; a queued one is skipped.
+        """
+        if not self._batches:
+            return False
+        for batch in self._batches:
+            batch.pending_cancels.add(url)
+            for task in batch.running.get(url, ()):
+                batch.cancelled_tasks.add(task)
+                task.cancel()
+        return True
+
+    def cancel_all(self) -> int:
+        """Cancel every running worker and stop feeding new URLs; returns tasks cancelled"""
+        count = 0
+        for batch in self._batches:
+            batch.pending_cancels.add("*")
+            for tasks in batch.running.values():
+                for task in tasks:
+                    batch.cancelled_tasks.add(task)
+                    task.cancel()
+                    count += 1
+        return count
+
+    async def _guarded(self, worker: Callable[[Any], Awaitable[Any]], item: Any) -> Any:
+        await self._slots.acquire()
+        try:
+            return await worker(item)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _item_url(item: Any) -> str:
+        return item if isinstance(item, str) else getattr(item, "url", str(item))
+
+    async def stream(self, urls: Union[Iterable[Any], AsyncIterable[Any]],
+                     worker: Callable[[Any], Awaitable[Any]],
+                     is_success: Callable[[Any], bool] = bool,
+                     max_in_flight: Optional[int] = None) -> AsyncIterator[BatchResult]:
+        """Run ``worker`` over ``urls`` and yield each result as it finishes.
+
+        ``urls`` may be a plain or an async iterable of URL strings, or of
+        items carrying a ``url`` attribute (the worker gets the item itself).
+        An async source is polled alongside the running work, so a slow
+        producer never holds back results. ``max_in_flight`` narrows this
+        batch below the engine-wide limit. A worker that raises, or whose
+        return value fails ``is_success``, is reported as ``failed``. Closing
+        the iterator early cancels the workers still in flight.
+        """
+        batch = _Batch()
+        self._batches.append(batch)
+        window = SlidingWindow(self.limit)
+        end = object()
+        is_async = hasattr(urls, "__aiter__")
+        source = urls.__aiter__() if is_async else iter(urls)
+        next_item: Optional[asyncio.Future] = None
+        exhausted = False
+        index = 0
+        try:
+            while True:
+                window.size = min(self.limit, max_in_flight or self.limit)
+                while not exhausted and window.has_capacity():
+                    if not is_async:
+                        item = next(source, end)
+                    else:
+                        if next_item is None:
+                            next_item = asyncio.ensure_future(source.__anext__())
+                        if not next_item.done():
+                            if window:
+                                break  # wait for it together with the running work
+                            await asyncio.wait([next_item])
+                        pulled, next_item = next_item, None
+                        item = end if isinstance(pulled.exception(), StopAsyncIteration) else pulled.result()
+                    if item is end:
+                        exhausted = True
+                        break
+                    url = self._item_url(item)
+                    if url in batch.pending_cancels or "*" in batch.pending_cancels:
+                        yield BatchResult(index, url, CANCELLED)
+                    else:
+                        task = window.submit(self._guarded(worker, item), (index, url, time.monotonic()))
+                        batch.running.setdefault(url, set()).add(task)
+                    index += 1
+                if not window:
+                    break
+                if next_item is not None:
+                    running = [task for _, task in window.items()]
+                    await asyncio.wait(running + [next_item], return_when=asyncio.FIRST_COMPLETED)
+                    finished = await window.wait_next(timeout=0)
+                else:
+                    finished = await window.wait_next()
+                for (i, url, started), task in finished:
+                    tasks = batch.running.get(url)
+                    if tasks is not None:
+                        tasks.discard(task)
+                        if not tasks:
+                            del batch.running[url]
+                    yield self._result(batch, task, i, url, time.monotonic() - started, is_success)
+        finally:
+            if next_item is not None:
+                next_item.cancel()
+                await asyncio.gather(next_item, return_exceptions=True)
+            await window.cancel_all()
+            if is_async and hasattr(source, "aclose"):
+                await source.aclose()
+            self._batches.remove(batch)
+
+    @staticmethod
+    def _result(batch: _Batch, task: asyncio.Task, index: int, url: str, elapsed: float,
+                is_success: Callable[[Any], bool]) -> BatchResult:
+        # Workers may swallow CancelledError and return normally
+        if task in batch.cancelled_tasks or task.cancelled():
+            batch.cancelled_tasks.discard(task)
+            return BatchResult(index, url, CANCELLED, elapsed=elapsed)
+        error = task.exception()
+        if error is not None:
+            logger.debug(f"Batch worker failed for {url}: {error}")
+            return BatchResult(index, url, FAILED, error=error, elapsed=elapsed)
+        result = task.result()
+        status = COMPLETED if is_success(result) else FAILED
+        return BatchResult(index, url, status, result=result, elapsed=elapsed)
+
+    async def run(self, urls: Union[Iterable[Any], AsyncIterable[Any]],
+                  worker: Callable[[Any], Awaitable[Any]],
+                  on_result: Optional[Callable[[BatchResult], Any]] = None,
+                  is_success: Callable[[Any], bool] = bool,
+                  max_in_flight: Optional[int] = None) -> List[BatchResult]:
+        """Run a whole batch; ``on_result`` sees results as they finish, the
+        returned list is in input order."""
+        results: List[BatchResult] = []
+        async for result in self.stream(urls, worker, is_success, max_in_flight):
+            if on_result is not None:
+                outcome = on_result(result)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+            results.append(result)
+        results.sort(key=lambda r: r.index)
+        return results
@@ -17,6 +17,7 @@ class DownloadCache:
     def __init__(self, max_memory_entries: int = 1000, cache_ttl: int = 3600):
         self._memory_cache = {}  # In-memory LRU cache
         self._access_times = {}  # Track last access time
+        self._expires = {}  # Absolute expiry of entries stored with their own TTL
         self._lock = threading.RLock()
         self._last_cleanup = time.time()
         self.max_memory_entries = max_memory_entries
@@ -51,11 +52,12 @@ class DownloadCache:
             # Remove expired entries
             expired = [
                 k for k, t in self._access_times.items() 
-                if now - t > self.cache_ttl
+                if now - t > self.cache_ttl or now > self._expires.get(k, now)
             ]
             for k in expired:
                 self._memory_cache.pop(k, None)
                 self._access_times.pop(k, None)
+                self._expires.pop(k, None)
                 
             # If still too many entries, evict oldest via heapq (O(n+k) vs O(n log n))
             if len(self._memory_cache) > self.max_memory_entries:
@@ -64,6 +66,7 @@ class DownloadCache:
                 for k, _ in oldest:
                     self._memory_cache.pop(k, None)
                     self._access_times.pop(k, None)
+                    self._expires.pop(k, None)
                     
             self._last_cleanup = now
             
@@ -74,6 +77,10 @@ class DownloadCache:
             
         # Check memory cache first
         with self._lock:
+            if key in self._expires and time.time() > self._expires[key]:
+                self._memory_cache.pop(key, None)
+                self._access_times.pop(key, None)
+                self._expires.pop(key, None)
             if key in self._memory_cache:
                 self._access_times[key] = time.time()
                 return self._memory_cache[key].copy()  # Return copy for thread safety
@@ -86,7 +93,8 @@ class DownloadCache:
                     data = json.load(f)
                     
                 # Check if expired
-                if time.time() - data.get('timestamp', 0) > self.cache_ttl:
+                expires = data.get('expires')
+                if time.time() - data.get('timestamp', 0) > self.cache_ttl or (expires and time.time() > expires):
                     os.unlink(cache_path)
                     return None
                     
@@ -94,6 +102,8 @@ class DownloadCache:
                 with self._lock:
                     self._memory_cache[key] = data['content']
                     self._access_times[key] = time.time()
+                    if expires:
+                        self._expires[key] = expires
                     return data['content'].copy()
                     
         except (IOError, json.JSONDecodeError) as e:
@@ -101,16 +111,26 @@ class DownloadCache:
             
         return None
         
-    def set(self, key: str, value: Dict[str, Any]) -> bool:
-        """Store item in cache with both memory and disk persistence"""
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        """Store item in cache with both memory and disk persistence
+
+        ``ttl`` (seconds) gives the entry a fixed lifetime, counted from now
+        and unaffected by reads, e.g. for data holding expiring media URLs.
+        """
         if not key or not value:
             return False
             
         try:
+            expires = time.time() + ttl if ttl else None
+
             # Store in memory
             with self._lock:
                 self._memory_cache[key] = value.copy()  # Store copy for thread safety
                 self._access_times[key] = time.time()
+                if expires:
+                    self._expires[key] = expires
+                else:
+                    self._expires.pop(key, None)
                 self._cleanup_memory()  # Cleanup if needed
                 
             # Store on disk
@@ -119,6 +139,8 @@ class DownloadCache:
                 'timestamp': time.time(),
                 'content': value
             }
+            if expires:
+                cache_data['expires'] = expires
             
             # Use atomic write with temporary file
             temp_path = cache_path.with_suffix('.tmp')
@@ -137,6 +159,7 @@ class DownloadCache:
         with self._lock:
             self._memory_cache.pop(key, None)
             self._access_times.pop(key, None)
+            self._expires.pop(key, None)
             
         try:
             cache_path = self._get_cache_path(key)
@@ -150,6 +173,7 @@ class DownloadCache:
         with self._lock:
             self._memory_cache.clear()
             self._access_times.clear()
+            self._expires.clear()
             
         try:
             # Clear all cache files
@@ -0,0 +1,955 @@
+"""
+Chunk Engine for Snatch Media Downloader
+
+Building blocks for the segmented HTTP downloads run by AsyncDownloadManager.
+Byte ranges are fetched over several connections, written straight to their
+offsets in a preallocated part file, and tracked so that an interrupted
+download resumes with only the ranges it is missing. The hash manifest
+written alongside a finished file lets it be verified range by range.
+"""
+
+import asyncio
+import base64
+import errno
+import hashlib
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .common_utils import get_free_space
+
+logger = logging.getLogger(__name__)
+
+
+class PartFile:
+    """Preallocated ``.part`` file written with positional writes.
+
+    Chunks may complete in any order; each one is written straight to its own
+    offset, so no reordering buffer is needed between the network and the disk.
+    """
+
+    def __init__(self, path: str, total_size: Optional[int] = None, preallocate: bool = True):
+        self.path = path
+        self.total_size = total_size
+        self.preallocate = preallocate
+        self.preallocated = False  # blocks reserved with posix_fallocate
+        self._fd: Optional[int] = None
+        self._seek_lock = threading.Lock()  # Only used where pwrite is unavailable
+        # close() waits for I/O still running in executor threads (e.g. from
+        # cancelled hedge attempts) so a recycled descriptor is never touched
+        self._io_in_flight = 0
+        self._io_done = threading.Condition()
+
+    def open(self, resume: bool = False) -> None:
+        """Open (or create) the part file and size it to the full download.
+
+        With ``preallocate`` the blocks are reserved up front where the OS
+        supports it, so the file is laid out contiguously and a full disk
+        fails here rather than halfway through; elsewhere the file is only
+        extended (sparse). A file of unknown size (``total_size`` None) grows
+        as it is written.
+
+        Args:
+            resume: Keep existing contents instead of truncating the file
+        """
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if not resume:
+            flags |= os.O_TRUNC
+        fd = os.open(self.path, flags, 0o644)
+        try:
+            if self.total_size is not None:
+                self._allocate(fd)
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def _allocate(self, fd: int) -> None:
+        if os.fstat(fd).st_size > self.total_size:
+            os.ftruncate(fd, self.total_size)
+        if self.preallocate and self.total_size > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, self.total_size)
+                self.preallocated = True
+                return
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+                # e.g. EOPNOTSUPP on filesystems without fallocate support
+                logger.debug(f"Preallocation unavailable for {self.path}: {e}")
+        if os.fstat(fd).st_size != self.total_size:
+            os.ftruncate(fd, self.total_size)
+
+    @staticmethod
+    def allocated_bytes(path: str) -> int:
+        """Disk space already held by an existing file (0 if there is none)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0
+        blocks = getattr(st, "st_blocks", None)
+        return st.st_size if blocks is None else min(st.st_size, blocks * 512)
+
+    @property
+    def is_open(self) -> bool:
+        return self._fd is not None
+
+    @contextmanager
+    def _io(self) -> Iterator[int]:
+        """Borrow the descriptor for one operation; close() waits for it."""
+        with self._io_done:
+            if self._fd is None:
+                raise ValueError(f"Part file is not open: {self.path}")
+            fd = self._fd
+            self._io_in_flight += 1
+        try:
+            yield fd
+        finally:
+            with self._io_done:
+                self._io_in_flight -= 1
+                self._io_done.notify_all()
+
+    def write_at(self, offset: int, data: bytes) -> int:
+        """Write data at an absolute offset, returning the number of bytes written."""
+        with self._io() as fd:
+            view = memoryview(data)
+            written = 0
+            if hasattr(os, "pwrite"):
+                while written < len(view):
+                    written += os.pwrite(fd, view[written:], offset + written)
+                return written
+
+            # Windows has no pwrite; serialize seek+write pairs instead
+            with self._seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                while written < len(view):
+                    written += os.write(fd, view[written:])
+            return written
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read up to ``size`` bytes from an absolute offset."""
+        with self._io() as fd:
+            if hasattr(os, "pread"):
+                return os.pread(fd, size, offset)
+            with self._seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                return os.read(fd, size)
+
+    async def write_at_async(self, offset: int, data: bytes) -> int:
+        """Positional write executed off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.write_at, offset, data)
+
+    def truncate(self, size: int) -> None:
+        """Cut the file down to ``size`` bytes, e.g. when a stream restarts."""
+        with self._io() as fd:
+            os.ftruncate(fd, size)
+
+    def sync(self) -> None:
+        """Flush written data to stable storage."""
+        if self._fd is not None:
+            os.fsync(self._fd)
+
+    def close(self) -> None:
+        """Close the underlying file descriptor once in-flight writes finish."""
+        with self._io_done:
+            if self._fd is None:
+                return
+            fd, self._fd = self._fd, None
+            while self._io_in_flight:
+                self._io_done.wait()
+        os.close(fd)
+
+    def __enter__(self) -> "PartFile":
+        if self._fd is None:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class SlidingWindow:
+    """Keeps up to ``size`` tasks in flight and hands back whichever finish first.
+
+    Unlike lockstep batches, a slot is refilled as soon as any task completes,
+    so one slow range never idles the other connections.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, int(size))
+        self._in_flight: Dict[asyncio.Task, Any] = {}
+        self._cancelled: Set[asyncio.Task] = set()  # discarded, still unwinding
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def __bool__(self) -> bool:
+        return bool(self._in_flight)
+
+    def has_capacity(self) -> bool:
+        """Whether another task can be started right now."""
+        return len(self._in_flight) < self.size
+
+    def submit(self, coro: Awaitable[Any], tag: Any) -> asyncio.Task:
+        """Start a task for ``coro`` and remember ``tag`` for when it completes."""
+        task = asyncio.ensure_future(coro)
+        self._in_flight[task] = tag
+        return task
+
+    def items(self) -> List[Tuple[Any, asyncio.Task]]:
+        """Snapshot of the in-flight ``(tag, task)`` pairs."""
+        return [(tag, task) for task, tag in self._in_flight.items()]
+
+    async def wait_next(self, timeout: Optional[float] = None) -> List[Tuple[Any, asyncio.Task]]:
+        """Wait until at least one task finishes and return ``(tag, task)`` pairs.
+
+        With a ``timeout`` the result may be empty, which lets callers inspect
+        the tasks still in flight (e.g. to hedge stragglers) at a steady cadence.
+        """
+        if not self._in_flight:
+            return []
+        done, _ = await asyncio.wait(self._in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        return [(self._in_flight.pop(task), task) for task in done]
+
+    def discard(self, task: asyncio.Task) -> None:
+        """Cancel one in-flight task and free its slot immediately."""
+        self._in_flight.pop(task, None)
+        if not task.done():
+            task.cancel()
+            self._cancelled.add(task)
+            task.add_done_callback(self._cancelled.discard)
+
+    async def cancel_all(self) -> None:
+        """Cancel every in-flight task and wait for them to unwind."""
+        tasks = list(self._in_flight) + list(self._cancelled)
+        self._in_flight.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ChunkBitmap:
+    """Compact completion bitmap over fixed-size blocks of a download.
+
+    One bit per block lets a resumed download fetch exactly the missing ranges,
+    in any order, instead of assuming everything below a high-water mark is done.
+    """
+
+    def __init__(self, total_size: int, block_size: int, bits: Optional[bytearray] = None):
+        if total_size <= 0 or block_size <= 0:
+            raise ValueError("total_size and block_size must be positive")
+        self.total_size = total_size
+        self.block_size = block_size
+        self.num_blocks = (total_size + block_size - 1) // block_size
+        num_bytes = (self.num_blocks + 7) // 8
+        if bits is not None and len(bits) == num_bytes:
+            self._bits = bytearray(bits)
+        else:
+            self._bits = bytearray(num_bytes)
+
+    def block_range(self, index: int) -> Tuple[int, int]:
+        """Inclusive byte range covered by block ``index``."""
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.total_size) - 1
+
+    def is_set(self, index: int) -> bool:
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def mark(self, index: int) -> None:
+        self._bits[index >> 3] |= 1 << (index & 7)
+
+    def mark_range(self, start: int, end: int) -> None:
+        """Mark every block fully covered by the inclusive byte range ``start``-``end``."""
+        first = (start + self.block_size - 1) // self.block_size
+        last_block = self.num_blocks - 1
+        last = last_block if end >= self.total_size - 1 else (end + 1) // self.block_size - 1
+        for index in range(first, last + 1):
+            self.mark(index)
+
+    def missing_blocks(self) -> Iterator[int]:
+        """Yield the indices of blocks that have not completed yet."""
+        for index in range(self.num_blocks):
+            if not self.is_set(index):
+                yield index
+
+    def missing_runs(self) -> List[Tuple[int, int]]:
+        """Inclusive byte ranges of contiguous missing blocks."""
+        runs: List[Tuple[int, int]] = []
+        for index in self.missing_blocks():
+            start, end = self.block_range(index)
+            if runs and runs[-1][1] + 1 == start:
+                runs[-1] = (runs[-1][0], end)
+            else:
+                runs.append((start, end))
+        return runs
+
+    def completed_prefix(self) -> int:
+        """Number of bytes from offset 0 up to the first missing block."""
+        for index in self.missing_blocks():
+            return index * self.block_size
+        return self.total_size
+
+    @property
+    def completed_blocks(self) -> int:
+        return sum(byte.bit_count() for byte in self._bits)
+
+    def completed_bytes(self) -> int:
+        """Number of bytes covered by completed blocks."""
+        done = self.completed_blocks * self.block_size
+        if self.is_set(self.num_blocks - 1):
+            done -= self.num_blocks * self.block_size - self.total_size
+        return done
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completed_blocks == self.num_blocks
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form for session persistence."""
+        return {
+            "total_size": self.total_size,
+            "block_size": self.block_size,
+            "bits": base64.b64encode(bytes(self._bits)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["ChunkBitmap"]:
+        """Rebuild a bitmap from :meth:`to_dict` output, or None if it is unusable."""
+        if not data:
+            return None
+        try:
+            bits = bytearray(base64.b64decode(data["bits"]))
+            bitmap = cls(int(data["total_size"]), int(data["block_size"]))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.debug(f"Ignoring invalid chunk bitmap: {e}")
+            return None
+        if len(bits) != len(bitmap._bits):
+            return None
+        bitmap._bits = bits
+        return bitmap
+
+
+class RangePlanner:
+    """Hands out block-aligned byte ranges from the parts of a file still missing.
+
+    Ranges are carved on demand, so each one can have a different size chosen
+    at dispatch time rather than from a grid fixed before the download starts.
+    """
+
+    def __init__(self, runs: List[Tuple[int, int]], block_size: int):
+        self.block_size = block_size
+        self._runs = deque(runs)
+        self.remaining_bytes = sum(end - start + 1 for start, end in runs)
+
+    def __bool__(self) -> bool:
+        return bool(self._runs)
+
+    def next_range(self, size: int) -> Optional[Tuple[int, int]]:
+        """Take the next range of up to ``size`` bytes (rounded to whole blocks)."""
+        if not self._runs:
+            return None
+        size = max(self.block_size, size - size % self.block_size)
+        start, run_end = self._runs.popleft()
+        end = min(start + size - 1, run_end)
+        if end < run_end:
+            self._runs.appendleft((end + 1, run_end))
+        self.remaining_bytes -= end - start + 1
+        return start, end
+
+    def claim(self, start: int, end: int) -> bool:
+        """Take a specific range out of the plan (e.g. one already being fetched).
+
+        Returns False, leaving the plan untouched, unless the range lies
+        entirely inside a single missing run.
+        """
+        for index, (run_start, run_end) in enumerate(self._runs):
+            if run_start <= start and end <= run_end:
+                del self._runs[index]
+                pieces = [(s, e) for s, e in ((run_start, start - 1), (end + 1, run_end)) if s <= e]
+                for piece in reversed(pieces):
+                    self._runs.insert(index, piece)
+                self.remaining_bytes -= end - start + 1
+                return True
+        return False
+
+    def requeue(self, start: int, end: int) -> None:
+        """Put a range back at the front, e.g. after its request failed."""
+        self._runs.appendleft((start, end))
+        self.remaining_bytes += end - start + 1
+
+
+class AdaptiveChunkSizer:
+    """Sizes range requests from measured per-connection throughput and TTFB.
+
+    Each request should stream for roughly ``target_seconds`` and keep the
+    time-to-first-byte under ``overhead_ratio`` of that, so fast links use
+    few large ranges and slow or lossy links use small, cheap-to-retry ones.
+    Sizes grow at most 2x per sample toward ``maximum`` and halve after errors.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, block_size: Optional[int] = None,
+                 target_seconds: float = 2.0, overhead_ratio: float = 0.1,
+                 enabled: bool = True, smoothing: float = 0.3, history: int = 50):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.block_size = block_size or self.minimum
+        self.target_seconds = target_seconds
+        self.overhead_ratio = overhead_ratio
+        self.enabled = enabled
+        self.smoothing = smoothing
+        self.throughput: Optional[float] = None  # bytes/sec per connection (EWMA)
+        self.ttfb: Optional[float] = None  # seconds (EWMA)
+        self.samples = 0
+        self.errors = 0
+        self.decisions: deque = deque(maxlen=history)
+        self.current_size = self._align(initial)
+
+    def _align(self, size: float) -> int:
+        size = int(max(self.minimum, min(self.maximum, size)))
+        return max(self.block_size, size - size % self.block_size)
+
+    def _ewma(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return previous + self.smoothing * (sample - previous)
+
+    def _decide(self, new_size: int, reason: str) -> None:
+        if new_size == self.current_size:
+            return
+        self.decisions.append({
+            "time": time.time(),
+            "from": self.current_size,
+            "to": new_size,
+            "reason": reason,
+        })
+        logger.debug(f"Chunk size {self.current_size} -> {new_size} ({reason})")
+        self.current_size = new_size
+
+    def record_success(self, nbytes: int, ttfb: float, elapsed: float) -> None:
+        """Feed one completed request into the throughput/TTFB estimates."""
+        transfer = max(elapsed - ttfb, 1e-3)
+        self.throughput = self._ewma(self.throughput, nbytes / transfer)
+        self.ttfb = self._ewma(self.ttfb, max(ttfb, 0.0))
+        self.samples += 1
+        if not self.enabled:
+            return
+
+        target = max(self.throughput * self.target_seconds,
+                     self.throughput * self.ttfb / self.overhead_ratio)
+        bounded = min(max(target, self.current_size / 2), self.current_size * 2)
+        self._decide(
+            self._align(bounded),
+            f"{self.throughput / 1048576:.2f} MiB/s per connection, ttfb {self.ttfb * 1000:.0f} ms",
+        )
+
+    def record_failure(self, reason: str = "request error") -> None:
+        """Shrink after an error so the next retry is cheaper."""
+        self.errors += 1
+        if self.enabled:
+            self._decide(self._align(self.current_size // 2), reason)
+
+    def next_size(self, remaining: int = 0, parallelism: int = 1) -> int:
+        """Size for the next range, capped so the tail still spreads over all connections."""
+        size = self.current_size
+        if remaining > 0 and parallelism > 1:
+            size = min(size, -(-remaining // parallelism))
+        return self._align(size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current sizing state and recent decisions for progress/metrics output."""
+        return {
+            "chunk_size": self.current_size,
+            "min_chunk_size": self.minimum,
+            "max_chunk_size": self.maximum,
+            "throughput_bps": self.throughput or 0.0,
+            "ttfb_ms": (self.ttfb or 0.0) * 1000,
+            "samples": self.samples,
+            "errors": self.errors,
+            "decisions": list(self.decisions),
+        }
+
+
+class HedgePolicy:
+    """Spots in-flight ranges falling far behind their peers.
+
+    Completed ranges give a median per-connection rate and TTFB, and from them
+    an expected duration for any range size. A range is a straggler once it has
+    run ``factor`` times longer than expected and, at its own current rate,
+    would still finish later than a fresh duplicate request could.
+    """
+
+    def __init__(self, factor: float = 3.0, min_delay: float = 1.0,
+                 min_samples: int = 3, history: int = 32):
+        self.factor = factor
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._rates: deque = deque(maxlen=history)
+        self._ttfbs: deque = deque(maxlen=history)
+
+    def record(self, nbytes: int, ttfb: float, elapsed: float) -> None:
+        """Add a completed range to the peer statistics."""
+        self._rates.append(nbytes / max(elapsed - ttfb, 1e-3))
+        self._ttfbs.append(max(ttfb, 0.0))
+
+    def expected_seconds(self, nbytes: int) -> Optional[float]:
+        """Typical time for a range of ``nbytes``, or None without enough samples."""
+        if len(self._rates) < self.min_samples:
+            return None
+        return statistics.median(self._ttfbs) + nbytes / statistics.median(self._rates)
+
+    def is_straggler(self, nbytes: int, received: int, elapsed: float) -> bool:
+        """Whether a range with ``received`` of ``nbytes`` after ``elapsed`` seconds should be hedged."""
+        expected = self.expected_seconds(nbytes)
+        if expected is None or elapsed < max(self.min_delay, self.factor * expected):
+            return False
+        if received > 0 and (nbytes - received) * elapsed / received < expected:
+            return False  # Nearly done: a duplicate could not overtake it
+        return True
+
+
+@dataclass
+class Mirror:
+    """One source URL for a file, with its live transfer statistics."""
+    url: str
+    if_range: Optional[str] = None
+    throughput: Optional[float] = None  # bytes/sec per request (EWMA)
+    in_flight: int = 0
+    bytes_served: int = 0
+    errors: int = 0
+    demoted_until: float = 0.0
+    disabled: str = ""  # reason when permanently excluded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "throughput_bps": self.throughput or 0.0,
+            "bytes": self.bytes_served,
+            "errors": self.errors,
+            "state": "disabled" if self.disabled else
+                     "demoted" if self.demoted_until > time.monotonic() else "active",
+            "reason": self.disabled,
+        }
+
+
+class MirrorPool:
+    """Spreads ranges across equivalent URLs in proportion to their throughput.
+
+    Each new range goes to the mirror with the lowest in-flight load relative
+    to its measured rate; unmeasured mirrors are assumed as fast as the best
+    one so they get tried. A mirror that errors is demoted for ``cooldown``
+    seconds, and one serving different content is disabled for good.
+    """
+
+    def __init__(self, urls: List[str], cooldown: float = 30.0, smoothing: float = 0.3):
+        self.mirrors = [Mirror(url) for url in dict.fromkeys(urls)]
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+    def __len__(self) -> int:
+        return len(self.mirrors)
+
+    def get(self, url: str) -> Optional[Mirror]:
+        return next((m for m in self.mirrors if m.url == url), None)
+
+    def usable(self) -> List[Mirror]:
+        """Mirrors that are not disabled (demoted ones included)."""
+        return [m for m in self.mirrors if not m.disabled]
+
+    def healthy(self) -> List[Mirror]:
+        """Usable mirrors that are not currently demoted."""
+        now = time.monotonic()
+        return [m for m in self.usable() if m.demoted_until <= now]
+
+    def has_alternative(self, url: str) -> bool:
+        """Whether a healthy mirror other than ``url`` is available."""
+        return any(m.url != url for m in self.healthy())
+
+    def pick(self, exclude: Optional[str] = None) -> Optional[Mirror]:
+        """Best mirror for the next range, preferring healthy ones other than ``exclude``."""
+        healthy = self.healthy()
+        candidates = [m for m in healthy if m.url != exclude] or healthy or self.usable()
+        if not candidates:
+            return None
+        best_known = max((m.throughput for m in candidates if m.throughput), default=1.0)
+        return min(candidates, key=lambda m: (m.in_flight + 1) / (m.throughput or best_known))
+
+    def record_success(self, url: str, nbytes: int, seconds: float) -> None:
+        mirror = self.get(url)
+        if mirror is None:
+            return
+        rate = nbytes / max(seconds, 1e-3)
+        if mirror.throughput is None:
+            mirror.throughput = rate
+        else:
+            mirror.throughput += self.smoothing * (rate - mirror.throughput)
+        mirror.bytes_served += nbytes
+
+    def demote(self, url: str, reason: str = "") -> None:
+        """Take a failing mirror out of rotation for a while."""
+        mirror = self.get(url)
+        if mirror is None:
+            return
+        mirror.errors += 1
+        mirror.demoted_until = time.monotonic() + self.cooldown
+        if mirror.throughput:
+            mirror.throughput /= 2
+        if len(self.mirrors) > 1:
+            logger.info(f"Demoting mirror {url}: {reason}")
+
+    def disable(self, url: str, reason: str) -> None:
+        """Stop using a mirror for the rest of the download."""
+        mirror = self.get(url)
+        if mirror is not None and not mirror.disabled:
+            mirror.disabled = reason
+            if len(self.mirrors) > 1:
+                logger.warning(f"Disabling mirror {url}: {reason}")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [m.snapshot() for m in self.mirrors]
+
+
+class MemoryBudget:
+    """Byte budget for data received from the network but not yet on disk.
+
+    Readers reserve bytes before buffering them and release them once written;
+    when the budget is spent they wait, which stops socket reads and lets TCP
+    flow control push back on the sender.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self._waiters: deque = deque()
+
+    def _clamp(self, nbytes: int) -> int:
+        return min(nbytes, self.limit)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Reserve ``nbytes`` if the budget allows it right now."""
+        nbytes = self._clamp(nbytes)
+        if self._waiters or self.in_use + nbytes > self.limit:
+            return False
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+        return True
+
+    async def acquire(self, nbytes: int) -> None:
+        """Reserve ``nbytes``, waiting (first come, first served) for room."""
+        nbytes = self._clamp(nbytes)
+        if not self._waiters and self.in_use + nbytes <= self.limit:
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+            return
+
+        self.waits += 1
+        waiter = (nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release(nbytes)  # Granted just as we were cancelled
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+
+    def release(self, nbytes: int) -> None:
+        """Return ``nbytes`` to the budget and admit waiters that now fit."""
+        self.in_use = max(0, self.in_use - self._clamp(nbytes))
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + nbytes > self.limit:
+                break
+            self._waiters.popleft()
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_use": self.in_use, "peak": self.peak, "waits": self.waits}
+
+
+class DiskSpaceLedger:
+    """Free-space admission control shared by concurrent downloads.
+
+    Each admitted download reserves the bytes it still has to write on its
+    volume. A new one is admitted only if the volume's free space, minus what
+    running downloads have reserved and a safety ``headroom``, still covers
+    it; otherwise it waits for reservations to be released or is refused.
+    """
+
+    def __init__(self, headroom: int = 0, free_space: Optional[Callable[[str], int]] = None,
+                 poll_interval: float = 5.0):
+        self.headroom = max(0, int(headroom))
+        self.poll_interval = poll_interval
+        self.refused = 0
+        self.waits = 0
+        self._free_space = free_space or get_free_space
+        self._reservations: Dict[Any, Tuple[Any, int]] = {}  # key -> (volume, bytes)
+        self._lock = threading.RLock()
+        self._released: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def _volume(path: str) -> Tuple[Any, str]:
+        """Device id and nearest existing directory of ``path``."""
+        directory = os.path.dirname(os.path.abspath(path))
+        while not os.path.isdir(directory):
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        try:
+            return os.stat(directory).st_dev, directory
+        except OSError:
+            return directory, directory
+
+    def available(self, path: str, exclude: Any = None) -> int:
+        """Free bytes on ``path``'s volume not yet promised to another download."""
+        volume, directory = self._volume(path)
+        with self._lock:
+            reserved = sum(n for key, (v, n) in self._reservations.items()
+                           if v == volume and key != exclude)
+        return self._free_space(directory) - reserved - self.headroom
+
+    def try_reserve(self, key: Any, path: str, nbytes: int) -> bool:
+        """Reserve ``nbytes`` for download ``key`` if the volume has room for it now."""
+        volume, _ = self._volume(path)
+        with self._lock:
+            if self.available(path, exclude=key) < nbytes:
+                return False
+            self._reservations[key] = (volume, max(0, nbytes))
+            return True
+
+    async def acquire(self, key: Any, path: str, nbytes: int, timeout: float = 0.0) -> bool:
+        """Reserve ``nbytes``, waiting up to ``timeout`` seconds for space to free up.
+
+        Returns False (and counts a refusal) if the space never became available.
+        """
+        if self.try_reserve(key, path, nbytes):
+            return True
+        if timeout > 0:
+            self.waits += 1
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                if self._released is None:
+                    self._released = asyncio.Event()
+                released = self._released
+                try:
+                    await asyncio.wait_for(released.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass  # Poll anyway: space may have been freed outside Snatch
+                if self.try_reserve(key, path, nbytes):
+                    return True
+        self.refused += 1
+        return False
+
+    def release(self, key: Any) -> None:
+        """Drop a download's reservation (finished, failed, or space now allocated)."""
+        with self._lock:
+            if self._reservations.pop(key, None) is None:
+                return
+        if self._released is not None:
+            # Wake every waiter; each re-checks against the new free space
+            self._released.set()
+            self._released = None
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            reserved = sum(n for _, n in self._reservations.values())
+            active = len(self._reservations)
+        return {"reserved": reserved, "active": active, "waits": self.waits, "refused": self.refused}
+
+
+class RangeWriter:
+    """Streams one range into the part file as it arrives.
+
+    Network reads are coalesced into writes of about ``flush_size`` bytes;
+    every buffered byte is charged to the shared ``budget``. Before waiting
+    for budget the writer flushes what it already holds, so connections never
+    sit on memory while blocking each other.
+    """
+
+    def __init__(self, part_file: PartFile, offset: int, budget: Optional[MemoryBudget] = None,
+                 flush_size: int = 256 * 1024):
+        self.part_file = part_file
+        self.offset = offset
+        self.budget = budget
+        self.flush_size = flush_size
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._held = 0  # bytes reserved from the budget
+
+    async def write(self, data: bytes) -> None:
+        if self.budget is not None:
+            if not self.budget.try_acquire(len(data)):
+                await self.flush()
+                await self.budget.acquire(len(data))
+            self._held += self.budget._clamp(len(data))
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= self.flush_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write buffered bytes at the current offset and return their budget."""
+        if not self._pending:
+            return
+        data = self._pending[0] if len(self._pending) == 1 else b"".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        try:
+            await self.part_file.write_at_async(self.offset, data)
+            self.offset += len(data)
+        finally:
+            self._release()
+
+    def discard(self) -> None:
+        """Drop unwritten data (e.g. on failure) and return its budget."""
+        self._pending = []
+        self._pending_bytes = 0
+        self._release()
+
+    def _release(self) -> None:
+        if self.budget is not None and self._held:
+            self.budget.release(self._held)
+        self._held = 0
+
+
+class SequentialDigest:
+    """Whole-file SHA-256 that trails the contiguous completed prefix.
+
+    Ranges finish out of order, so the digest catches up from the part file
+    whenever the completed prefix grows. Those bytes were just written and are
+    read back from the page cache in the background, which avoids a second
+    cold read of the finished file.
+    """
+
+    def __init__(self, part_file: PartFile, read_size: int = 1024 * 1024,
+                 step: int = 16 * 1024 * 1024):
+        self.part_file = part_file
+        self.read_size = read_size
+        self.step = step
+        self.position = 0
+        self._hasher = hashlib.sha256()
+        self._target = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def advance_to(self, end: int) -> None:
+        """Hash up to byte ``end`` (exclusive) in the background."""
+        self._target = max(self._target, end)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._catch_up())
+
+    async def _catch_up(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self.position < self._target:
+            end = min(self._target, self.position + self.step)
+            await loop.run_in_executor(None, self._hash_range, self.position, end)
+
+    def _hash_range(self, start: int, end: int) -> None:
+        offset = start
+        while offset < end:
+            data = self.part_file.read_at(offset, min(self.read_size, end - offset))
+            if not data:
+                raise IOError(f"Unexpected end of {self.part_file.path} at {offset}")
+            self._hasher.update(data)
+            offset += len(data)
+        self.position = end
+
+    async def finish(self, total_size: int) -> str:
+        """Hash whatever is left and return the hex digest of the whole file."""
+        self.advance_to(total_size)
+        await self._task
+        return self._hasher.hexdigest()
+
+    async def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _parse_range_key(key: str) -> Tuple[int, int]:
+    start, end = key.split("-")
+    return int(start), int(end)
+
+
+def manifest_root(chunks: List[List[Any]]) -> str:
+    """Digest over the ordered ``[start, end, sha256]`` entries of a manifest."""
+    hasher = hashlib.sha256()
+    for start, end, digest in chunks:
+        hasher.update(f"{start}-{end}:{digest}\n".encode())
+    return hasher.hexdigest()
+
+
+def build_manifest(total_size: int, chunk_hashes: Dict[str, str],
+                   sha256: Optional[str] = None, file_path: Optional[str] = None) -> Dict[str, Any]:
+    """Verification manifest for a finished download.
+
+    Args:
+        total_size: Size of the file in bytes
+        chunk_hashes: ``"start-end"`` -> SHA-256 of that range, as recorded while streaming
+        sha256: Whole-file SHA-256, if it was computed
+        file_path: Finished file; its size and mtime are recorded for cheap checks
+    """
+    chunks = [[start, end, digest] for (start, end), digest in
+              sorted((_parse_range_key(key), digest) for key, digest in chunk_hashes.items())]
+    manifest: Dict[str, Any] = {
+        "version": 1,
+        "algorithm": "sha256",
+        "total_size": total_size,
+        "chunks": chunks,
+        "root": manifest_root(chunks),
+    }
+    if sha256:
+        manifest["sha256"] = sha256
+    if file_path and os.path.exists(file_path):
+        stat = os.stat(file_path)
+        manifest["file_size"] = stat.st_size
+        manifest["file_mtime"] = stat.st_mtime
+    return manifest
+
+
+def verify_manifest(file_path: str, manifest: Dict[str, Any],
+                    ranges: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int]]:
+    """Re-hash manifest ranges of ``file_path`` and return those that do not match.
+
+    Args:
+        file_path: File to check
+        manifest: Manifest from :func:`build_manifest`
+        ranges: Only re-hash manifest ranges overlapping these byte ranges
+            (inclusive); all ranges when None
+    """
+    bad: List[Tuple[int, int]] = []
+    with open(file_path, "rb") as f:
+        for start, end, digest in manifest.get("chunks", []):
+            if ranges is not None and not any(s <= end and start <= e for s, e in ranges):
+                continue
+            f.seek(start)
+            hasher = hashlib.sha256()
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(1024 * 1024, remaining))
+                if not data:
+                    break
+                hasher.update(data)
+                remaining -= len(data)
+            if remaining or hasher.hexdigest() != digest:
+                bad.append((start, end))
+    return bad
@@ -120,7 +120,12 @@ class EnhancedCLI:
             # Initialize customization manager
             customization_file = config.get("customization_file", "customization.yaml")
             self.customization_manager = CustomizationManager(customization_file)
-            
+
+            # Bandwidth caps from the customization profile feed the download limiter
+            performance = self.customization_manager.load_config().performance
+            config.setdefault("global_bandwidth_limit", performance.global_bandwidth_limit)
+            config.setdefault("per_download_bandwidth_limit", performance.per_download_bandwidth_limit)
+
             # Create download manager with dependencies
             self.download_manager = AsyncDownloadManager(
                 config=config,
@@ -254,6 +259,14 @@ class EnhancedCLI:
             factor = options.get("upscale_factor", 2)
             console.print(f"[bold cyan]Video upscaling:[/] {method} {factor}x")
 
+        scheduling = []
+        if options.get("priority") is not None:
+            scheduling.append(f"priority {options['priority']}")
+        if options.get("deadline"):
+            scheduling.append(f"deadline {options['deadline']}")
+        if scheduling:
+            console.print(f"[bold cyan]Scheduler:[/] {', '.join(scheduling)}")
+
     @handle_errors(ErrorCategory.DOWNLOAD, ErrorSeverity.WARNING)
     def _run_download_safely(self, urls: List[str], options: Dict[str, Any]) -> int:
         """Run download with safe event loop handling"""
@@ -374,6 +387,8 @@ class EnhancedCLI:
             
             # General options
             batch_file: str = typer.Option(None, "--batch-file", "-b", help="File containing URLs to download"),
+            priority: int = typer.Option(None, "--priority", help="Queue on the scheduler at this priority (1 = urgent, 5 = background)"),
+            deadline: str = typer.Option(None, "--deadline", help="Queue on the scheduler with a wanted-by time (ISO 8601, used by the edf policy)"),
             quiet: bool = typer.Option(False, "--quiet", "-q", help="Suppress output"),
             verbose: bool = typer.Option(False, "--verbose", "-v", help="Verbose output"),
             interactive: bool = typer.Option(False, "--interactive", "-i", help="Launch interactive mode after processing"),
@@ -435,6 +450,10 @@ class EnhancedCLI:
                 "upscale_quality": upscale_quality,
                 "replace_original": replace_original,
                 
+                # Scheduling (either one queues the batch on the advanced scheduler)
+                "priority": priority,
+                "deadline": deadline,
+                
                 # General options
                 "quiet": quiet,
                 "verbose": verbose,
@@ -580,6 +599,34 @@ class EnhancedCLI:
         ):
             """Real-time system monitoring dashboard"""
             return self.run_async(self._monitor_command_async(interval, duration))
+
+        # Distributed mode: one coordinator owns the queue, workers on any host run it
+        @app.command("coordinator", help="Run a distributed download coordinator")
+        def coordinator_command(
+            host: str = typer.Option("127.0.0.1", "--host",
+                                     help="Address to listen on (non-loopback needs distributed_token)"),
+            port: int = typer.Option(8765, "--port", help="Port to listen on"),
+        ):
+            """Serve the shared download queue to workers"""
+            return self.run_async(self._coordinator_command_async(host, port))
+
+        @app.command("worker", help="Run downloads leased from a distributed coordinator")
+        def worker_command(
+            coordinator: str = typer.Argument(..., help="Coordinator URL, e.g. http://host:8765"),
+            slots: int = typer.Option(0, "--slots", help="Downloads to run at once (default: max_concurrent)"),
+        ):
+            """Join a coordinator and download until interrupted"""
+            return self.run_async(self._worker_command_async(coordinator, slots))
+
+        @app.command("submit", help="Queue URLs on a distributed coordinator")
+        def submit_command(
+            urls: List[str] = typer.Argument(..., help="URLs to download"),
+            coordinator: str = typer.Option(..., "--coordinator", help="Coordinator URL"),
+            priority: int = typer.Option(3, "--priority", help="Priority (1 = urgent, 5 = background)"),
+            wait: bool = typer.Option(False, "--wait", help="Wait for the downloads to finish"),
+        ):
+            """Submit downloads to a coordinator"""
+            return self.run_async(self._submit_command_async(urls, coordinator, priority, wait))
         
         # Configuration management commands
         @app.command("clear-cache", help="Clear cache data")
@@ -1170,6 +1217,70 @@ class EnhancedCLI:
             
         return 0
 
+    async def _coordinator_command_async(self, host: str, port: int) -> int:
+        """Serve the distributed queue until interrupted"""
+        from .distributed import Coordinator
+
+        coordinator = Coordinator(self.config)
+        try:
+            url = await coordinator.serve(host, port)
+        except ValueError as e:
+            console.print(f"[bold red]{e}[/]")
+            await coordinator.close()
+            return 1
+        console.print(f"[bold cyan]Coordinator listening on {url}[/] (Ctrl+C to stop)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await coordinator.close()
+        return 0
+
+    async def _worker_command_async(self, coordinator_url: str, slots: int) -> int:
+        """Download leased jobs until interrupted; running jobs finish first"""
+        from .distributed import DistributedWorker
+
+        async with self.download_manager:
+            worker = DistributedWorker(
+                coordinator_url, self.download_manager.download_leased,
+                slots=slots or self.config.get("max_concurrent", 3),
+                token=self.config.get("distributed_token"))
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, worker.stop)
+                except (NotImplementedError, RuntimeError):
+                    pass  # Windows: Ctrl+C cancels the run instead
+            console.print(f"[bold cyan]Worker {worker.worker_id} joining {coordinator_url}[/]")
+            await worker.run()
+            console.print(f"[green]Worker stopped: {worker.completed} downloaded, {worker.failed} failed[/]")
+        return 0
+
+    async def _submit_command_async(self, urls: List[str], coordinator_url: str, priority: int, wait: bool) -> int:
+        """Queue URLs on a coordinator, optionally waiting for the results"""
+        from .distributed import CoordinatorClient, DistributedError
+
+        client = CoordinatorClient(coordinator_url, self.config.get("distributed_token"))
+        try:
+            download_ids = await client.submit(urls, {}, priority)
+            console.print(f"[cyan]Queued {len(download_ids)} downloads on {coordinator_url}[/]")
+            if not wait:
+                return 0
+            failed = 0
+            for download_id in download_ids:
+                info = await client.download(download_id, wait=300)
+                while info and info["status"] not in ("completed", "failed", "cancelled"):
+                    info = await client.download(download_id, wait=300)
+                if info and info["status"] == "completed":
+                    console.print(f"[green]Downloaded:[/] {info['url']} -> {info['result']}")
+                else:
+                    failed += 1
+                    console.print(f"[bold red]Failed:[/] {info['url'] if info else download_id} "
+                                  f"{(info or {}).get('error_message') or ''}")
+            return 1 if failed else 0
+        except DistributedError as e:
+            console.print(f"[bold red]Coordinator error:[/] {e}")
+            return 1
+
     async def _monitor_command_async(self, interval: int, duration: int) -> int:
         """Handle real-time monitoring command"""
         if not self.download_manager.performance_monitor:
@@ -0,0 +1,575 @@
+"""
+Distributed Downloads for Snatch Media Downloader
+
+One coordinator owns the download queue and any number of workers, on any
+hosts, lease downloads from it over HTTP, run them and report back. The
+queue is an AdvancedScheduler whose executor hands downloads to workers, so
+priorities, scheduling policies, per-host politeness, retries and the
+durable queue all apply across the cluster. The coordinator's download
+concurrency is the total of the connected workers' slots.
+
+A lease lasts ``distributed_lease_ttl`` seconds and is renewed by the
+worker's heartbeats. When it runs out (the worker crashed, lost the network
+or was stopped) the download goes back to the front of the queue for the
+next worker; a worker that leaves cleanly hands its leases back at once.
+
+Without ``distributed_token`` the coordinator only listens on a loopback
+address; with it, every request must carry the token in ``X-Snatch-Token``.
+Endpoints (JSON):
+
+- ``POST /submit``: queue URLs; ``GET /downloads/{id}[?wait=s]``: one download
+- ``POST /join``, ``/lease``, ``/heartbeat``, ``/complete``, ``/leave``: workers
+- ``GET /status``: queue, workers and leases
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from .advanced_scheduler import AdvancedScheduler, FINISHED_STATES, Priority, ScheduledDownload
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Snatch-Token"
+
+_json_response = partial(web.json_response, dumps=partial(json.dumps, default=str))
+
+# Runs one leased download: (url, options, on_progress(downloaded, total)) -> final file or None
+JobRunner = Callable[[str, Dict[str, Any], Callable[[int, Optional[int]], None]], Awaitable[Optional[str]]]
+
+
+class DistributedError(Exception):
+    """A coordinator request failed"""
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # a hostname, or "" for all interfaces
+
+
+@dataclass
+class Lease:
+    download: ScheduledDownload
+    worker: str
+    expires: float  # monotonic
+    future: "asyncio.Future[Optional[str]]"
+
+
+@dataclass
+class WorkerInfo:
+    id: str
+    slots: int
+    address: str
+    last_seen: float  # monotonic
+    leases: Set[str] = field(default_factory=set)
+    completed: int = 0
+    failed: int = 0
+    bytes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"slots": self.slots, "address": self.address, "active": len(self.leases),
+                "completed": self.completed, "failed": self.failed, "bytes": self.bytes,
+                "last_seen": round(time.monotonic() - self.last_seen, 1)}
+
+
+class Coordinator:
+    """Owns the queue and leases its downloads to workers"""
+
+    def __init__(self, config: Dict[str, Any], scheduler: Optional[AdvancedScheduler] = None):
+        self.config = config
+        self.lease_ttl = config.get('distributed_lease_ttl', 30.0)
+        self.token = config.get('distributed_token')
+        self.scheduler = scheduler or AdvancedScheduler(config)
+        self.scheduler.set_executor(self._dispatch)
+        if self.scheduler.autotuner is not None:
+            # Concurrency is the workers' slot total, not something to tune here
+            self.scheduler.autotuner.remove_knob('max_concurrent')
+        self.workers: Dict[str, WorkerInfo] = {}
+        self.leases: Dict[str, Lease] = {}  # download_id -> lease
+        # Downloads the scheduler started that wait for a worker
+        self._waiting: Deque[Tuple[ScheduledDownload, asyncio.Future]] = deque()
+        self._job_ready = asyncio.Condition()
+        self._reaper: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self._update_capacity()
+
+    # Queue side
+
+    async def _dispatch(self, download: ScheduledDownload) -> Optional[str]:
+        """Scheduler executor: wait until a worker has run the download"""
+        future = asyncio.get_running_loop().create_future()
+        await self._offer(download, future)
+        try:
+            return await future
+        finally:
+            # Cancelled or paused on the coordinator: the worker is told on its next heartbeat
+            lease = self.leases.pop(download.id, None)
+            if lease is not None and lease.worker in self.workers:
+                self.workers[lease.worker].leases.discard(download.id)
+
+    async def _offer(self, download: ScheduledDownload, future: asyncio.Future, front: bool = False) -> None:
+        if front:
+            self._waiting.appendleft((download, future))
+        else:
+            self._waiting.append((download, future))
+        async with self._job_ready:
+            self._job_ready.notify_all()
+
+    def _update_capacity(self) -> None:
+        # No workers, nothing starts: downloads keep their place in the queue
+        self.scheduler.set_concurrency(sum(w.slots for w in self.workers.values()))
+
+    async def _requeue(self, lease: Lease, reason: str) -> None:
+        self.leases.pop(lease.download.id, None)
+        worker = self.workers.get(lease.worker)
+        if worker is not None:
+            worker.leases.discard(lease.download.id)
+        if not lease.future.done():
+            logger.warning(f"Requeuing {lease.download.url}: {reason}")
+            await self._offer(lease.download, lease.future, front=True)
+
+    async def _drop_worker(self, worker_id: str, reason: str) -> None:
+        worker = self.workers.pop(worker_id, None)
+        if worker is None:
+            return
+        for download_id in list(worker.leases):
+            lease = self.leases.get(download_id)
+            if lease is not None:
+                await self._requeue(lease, f"worker {worker_id} {reason}")
+        self._update_capacity()
+        logger.info(f"Worker {worker_id} {reason}")
+
+    async def reap(self) -> None:
+        """Requeue expired leases and forget workers that stopped heartbeating"""
+        now = time.monotonic()
+        for lease in [lease for lease in self.leases.values() if lease.expires <= now]:
+            await self._requeue(lease, f"lease held by {lease.worker} expired")
+        for worker in [w for w in self.workers.values() if now - w.last_seen > self.lease_ttl]:
+            await self._drop_worker(worker.id, "timed out")
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Error reaping leases: {e}")
+
+    def _has_work(self) -> bool:
+        """Whether a download waits for a worker; drops cancelled ones off the front"""
+        while self._waiting and self._waiting[0][1].done():
+            self._waiting.popleft()
+        return bool(self._waiting)
+
+    def _take(self, worker: WorkerInfo, count: int) -> List[Dict[str, Any]]:
+        jobs = []
+        while self._waiting and len(jobs) < count:
+            download, future = self._waiting.popleft()
+            if future.done():
+                continue  # cancelled while waiting
+            self.leases[download.id] = Lease(download, worker.id, time.monotonic() + self.lease_ttl, future)
+            worker.leases.add(download.id)
+            jobs.append({"id": download.id, "url": download.url, "options": download.options})
+        return jobs
+
+    # HTTP side
+
+    @web.middleware
+    async def _authenticate(self, request: web.Request, handler: Callable) -> web.StreamResponse:
+        if self.token and not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ""), self.token):
+            return _json_response({"error": "invalid token"}, status=401)
+        return await handler(request)
+
+    def _worker(self, body: Dict[str, Any]) -> WorkerInfo:
+        worker = self.workers.get(str(body.get("worker")))
+        if worker is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown worker, join first"}),
+                                   content_type="application/json")
+        worker.last_seen = time.monotonic()
+        return worker
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        urls = body.get("urls") or []
+        if not isinstance(urls, list) or not urls:
+            return _json_response({"error": "urls must be a non-empty list"}, status=400)
+        download_ids = await self.scheduler.schedule_downloads(
+            urls, body.get("options") or {}, Priority.from_value(body.get("priority")))
+        return _json_response({"ids": download_ids})
+
+    async def handle_download(self, request: web.Request) -> web.Response:
+        download_id = request.match_info["id"]
+        wait = float(request.query.get("wait", 0))
+        download = self.scheduler.downloads.get(download_id)
+        if wait > 0 and download is not None and download.status not in FINISHED_STATES:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.scheduler.download_future(download_id)), wait)
+            except asyncio.TimeoutError:
+                pass
+        info = await self.scheduler.get_download_info(download_id)
+        if info is None:
+            return _json_response({"error": "unknown download"}, status=404)
+        return _json_response(info)
+
+    async def handle_join(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        worker_id = str(body.get("worker") or uuid.uuid4().hex[:12])
+        slots = max(1, int(body.get("slots", 1)))
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            worker = self.workers[worker_id] = WorkerInfo(worker_id, slots, request.remote or "", time.monotonic())
+            logger.info(f"Worker {worker_id} joined with {slots} slots")
+        worker.slots, worker.last_seen = slots, time.monotonic()
+        self._update_capacity()
+        return _json_response({"worker": worker_id, "lease_ttl": self.lease_ttl})
+
+    async def handle_lease(self, request: web.Request) -> web.Response:
+        """Up to ``max`` jobs, waiting up to ``wait`` seconds for the first one"""
+        body = await request.json()
+        worker = self._worker(body)
+        count = max(1, int(body.get("max", 1)))
+        wait = min(float(body.get("wait", 0)), self.lease_ttl)
+        if not self._has_work() and wait > 0:
+            try:
+                async with self._job_ready:
+                    await asyncio.wait_for(self._job_ready.wait_for(self._has_work), wait)
+            except asyncio.TimeoutError:
+                pass
+        if self.workers.get(worker.id) is not worker:
+            # Left (and maybe joined again) while waiting: this request is stale
+            raise web.HTTPNotFound(text=json.dumps({"error": "worker dropped"}), content_type="application/json")
+        return _json_response({"jobs": self._take(worker, count)})
+
+    async def handle_heartbeat(self, request: web.Request) -> web.Response:
+        """Renew the worker's leases; answers with the ones it no longer holds"""
+        body = await request.json()
+        worker = self._worker(body)
+        expires = time.monotonic() + self.lease_ttl
+        revoked = []
+        progress = body.get("progress") or {}
+        for download_id in body.get("leases") or []:
+            lease = self.leases.get(download_id)
+            if lease is None or lease.worker != worker.id:
+                revoked.append(download_id)
+                continue
+            lease.expires = expires
+            if download_id in progress:
+                downloaded, total = progress[download_id]
+                self.scheduler.update_progress(lease.download, int(downloaded), total)
+        return _json_response({"revoked": revoked})
+
+    async def handle_complete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        worker = self._worker(body)
+        lease = self.leases.get(str(body.get("id")))
+        if lease is None or lease.worker != worker.id:
+            # Expired and handed to another worker meanwhile: that one's result counts
+            return _json_response({"accepted": False}, status=409)
+        self.leases.pop(lease.download.id)
+        worker.leases.discard(lease.download.id)
+        worker.bytes += int(body.get("bytes") or 0)
+        if body.get("result"):
+            worker.completed += 1
+            if not lease.future.done():
+                lease.future.set_result(body["result"])
+        else:
+            worker.failed += 1
+            if not lease.future.done():
+                lease.future.set_exception(RuntimeError(body.get("error") or f"{worker.id} did not produce a file"))
+        return _json_response({"accepted": True})
+
+    async def handle_leave(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await self._drop_worker(str(body.get("worker")), "left")
+        return _json_response({"left": True})
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return _json_response(await self.get_status())
+
+    async def get_status(self) -> Dict[str, Any]:
+        return {
+            "queue": await self.scheduler.get_queue_status(),
+            "workers": {w.id: w.to_dict() for w in self.workers.values()},
+            "leases": len(self.leases),
+            "waiting_for_worker": sum(1 for _, future in self._waiting if not future.done()),
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._authenticate])
+        app.router.add_post("/submit", self.handle_submit)
+        app.router.add_get("/downloads/{id}", self.handle_download)
+        app.router.add_post("/join", self.handle_join)
+        app.router.add_post("/lease", self.handle_lease)
+        app.router.add_post("/heartbeat", self.handle_heartbeat)
+        app.router.add_post("/complete", self.handle_complete)
+        app.router.add_post("/leave", self.handle_leave)
+        app.router.add_get("/status", self.handle_status)
+        app.on_startup.append(lambda app: self.start())
+        app.on_cleanup.append(lambda app: self.stop())
+        return app
+
+    async def start(self) -> None:
+        """Start the scheduler and the lease reaper (``serve`` does this too)"""
+        if not self.scheduler.is_running:
+            await self.scheduler.start()
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.scheduler.stop()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> str:
+        """Listen on ``host:port`` (0 = any free port); returns the base URL.
+
+        Anything but a loopback address needs ``distributed_token``: the
+        coordinator runs whatever URLs and options it is sent.
+        """
+        if not self.token and not _is_loopback(host):
+            raise ValueError(f"Refusing to listen on {host or 'all interfaces'} without distributed_token")
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = self._runner.addresses[0][1]
+        self.url = f"http://{'127.0.0.1' if host in ('0.0.0.0', '') else host}:{bound}"
+        logger.info(f"Coordinator listening on {self.url}")
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()  # runs stop()
+            self._runner = None
+
+
+class CoordinatorClient:
+    """Submit downloads to a coordinator and query it"""
+
+    def __init__(self, url: str, token: Optional[str] = None, session: Optional[aiohttp.ClientSession] = None):
+        self.url = url.rstrip("/")
+        self.token = token
+        self._session = session
+
+    async def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> Tuple[int, Dict[str, Any]]:
+        """Returns (status, JSON body); raises DistributedError when unreachable"""
+        headers = {TOKEN_HEADER: self.token} if self.token else {}
+        session = self._session or aiohttp.ClientSession()
+        try:
+            async with session.request(method, f"{self.url}{path}", json=body, headers=headers,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 401:
+                    raise DistributedError("coordinator rejected the token")
+                return response.status, await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise DistributedError(f"{method} {path} failed: {e}") from e
+        finally:
+            if self._session is None:
+                await session.close()
+
+    async def submit(self, urls: List[str], options: Optional[Dict[str, Any]] = None,
+                     priority: Any = None) -> List[str]:
+        status, body = await self.request("POST", "/submit", {"urls": urls, "options": options or {},
+                                                              "priority": priority})
+        if status != 200:
+            raise DistributedError(body.get("error", f"HTTP {status}"))
+        return body["ids"]
+
+    async def download(self, download_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        status, body = await self.request("GET", f"/downloads/{download_id}?wait={wait}", timeout=wait + 30)
+        return body if status == 200 else None
+
+    async def status(self) -> Dict[str, Any]:
+        return (await self.request("GET", "/status"))[1]
+
+
+class DistributedWorker:
+    """Leases downloads from a coordinator and runs up to ``slots`` at once.
+
+    ``run`` joins, works until ``stop`` and then leaves; downloads still
+    running on ``stop`` are finished first unless ``cancel`` is set, in
+    which case the coordinator gets them back for another worker.
+    """
+
+    def __init__(self, coordinator_url: str, runner: JobRunner, slots: int = 2,
+                 worker_id: Optional[str] = None, token: Optional[str] = None,
+                 lease_wait: float = 10.0, retry_delay: float = 2.0):
+        self.client = CoordinatorClient(coordinator_url, token)
+        self.runner = runner
+        self.slots = max(1, slots)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.lease_wait = lease_wait
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = 10.0
+        self.running: Dict[str, asyncio.Task] = {}
+        self._progress: Dict[str, Tuple[int, Optional[int]]] = {}
+        self._stopping = asyncio.Event()
+        self._cancel = False
+        self._slot_free = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+
+    async def _call(self, path: str, body: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        status, response = await self.client.request("POST", path, dict(body, worker=self.worker_id), timeout)
+        if status == 404:
+            # The coordinator restarted or dropped us; join again
+            await self._join()
+            status, response = await self.client.request("POST", path, dict(body, worker=self.worker_id), timeout)
+        if status >= 400 and status != 409:
+            raise DistributedError(response.get("error", f"HTTP {status}"))
+        return response
+
+    async def _join(self) -> None:
+        status, response = await self.client.request("POST", "/join", {"worker": self.worker_id, "slots": self.slots})
+        if status != 200:
+            raise DistributedError(response.get("error", f"HTTP {status}"))
+        self.heartbeat_interval = response["lease_ttl"] / 3
+
+    def stop(self, cancel: bool = False) -> None:
+        self._cancel = cancel
+        self._stopping.set()
+
+    async def run(self) -> None:
+        session = aiohttp.ClientSession()
+        self.client._session = session
+        heartbeat = None
+        try:
+            while True:
+                try:
+                    await self._join()
+                    break
+                except DistributedError as e:
+                    logger.warning(f"Cannot join coordinator: {e}")
+                    if await self._sleep_or_stop(self.retry_delay):
+                        return
+            logger.info(f"Worker {self.worker_id} joined {self.client.url} with {self.slots} slots")
+            heartbeat = asyncio.create_task(self._heartbeat_loop())
+            await self._lease_loop()
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            await self._finish_running()
+            try:
+                await self.client.request("POST", "/leave", {"worker": self.worker_id}, timeout=5)
+            except DistributedError as e:
+                logger.warning(f"Could not leave cleanly, leases will expire: {e}")
+            self.client._session = None
+            await session.close()
+
+    async def _sleep_or_stop(self, seconds: float) -> bool:
+        """Sleep; True if stopped meanwhile"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    async def _lease_loop(self) -> None:
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                free = self.slots - len(self.running)
+                if free <= 0:
+                    self._slot_free.clear()
+                    await asyncio.wait([stopping, asyncio.ensure_future(self._slot_free.wait())],
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                lease = asyncio.ensure_future(self._call(
+                    "/lease", {"max": free, "wait": self.lease_wait}, timeout=self.lease_wait + 30))
+                await asyncio.wait([stopping, lease], return_when=asyncio.FIRST_COMPLETED)
+                if not lease.done():
+                    lease.cancel()  # anything leased meanwhile goes back on /leave
+                    break
+                try:
+                    jobs = lease.result()["jobs"]
+                except DistributedError as e:
+                    logger.warning(f"Lease request failed: {e}")
+                    await self._sleep_or_stop(self.retry_delay)
+                    continue
+                for job in jobs:
+                    self.running[job["id"]] = asyncio.create_task(self._run_job(job))
+        finally:
+            stopping.cancel()
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        download_id = job["id"]
+
+        def on_progress(downloaded: int, total: Optional[int]) -> None:
+            self._progress[download_id] = (downloaded, total)
+
+        result, error = None, None
+        try:
+            result = await self.runner(job["url"], job.get("options") or {}, on_progress)
+        except asyncio.CancelledError:
+            self._forget(download_id)
+            raise  # revoked or stopping: the coordinator requeues it
+        except Exception as e:
+            error = str(e)
+        try:
+            if result:
+                self.completed += 1
+            else:
+                self.failed += 1
+            await self._report(download_id, result, error)
+        finally:
+            self._forget(download_id)
+
+    def _forget(self, download_id: str) -> None:
+        self.running.pop(download_id, None)
+        self._progress.pop(download_id, None)
+        self._slot_free.set()
+
+    async def _report(self, download_id: str, result: Optional[str], error: Optional[str]) -> None:
+        body = {"id": download_id, "result": result, "error": error,
+                "bytes": self._progress.get(download_id, (0, None))[0]}
+        for attempt in range(3):
+            try:
+                await self._call("/complete", body)
+                return
+            except DistributedError as e:
+                logger.warning(f"Could not report {download_id} (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                response = await self._call("/heartbeat", {
+                    "leases": list(self.running),
+                    "progress": {i: p for i, p in self._progress.items() if i in self.running},
+                })
+            except DistributedError as e:
+                logger.warning(f"Heartbeat failed: {e}")
+                continue
+            for download_id in response.get("revoked", []):
+                task = self.running.get(download_id)
+                if task is not None:
+                    logger.info(f"Lease on {download_id} was revoked, stopping it")
+                    task.cancel()
+
+    async def _finish_running(self) -> None:
+        tasks = list(self.running.values())
+        if self._cancel:
+            for task in tasks:
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
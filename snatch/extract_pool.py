@@ -0,0 +1,177 @@
+"""
+Extraction Process Pool for Snatch Media Downloader
+
+yt-dlp extraction is largely CPU work (regexes over big pages, signature JS,
+JSON parsing), so extractor threads in one interpreter serialize on the GIL.
+This optional tier runs extraction in worker processes and hands plain,
+picklable info dicts back to the downloader. Workers are recycled after a
+number of jobs so extractor caches and leaks cannot grow without bound.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import pickle
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .playlist import PLAYLIST_TYPES
+from .ydl_pool import PER_USE_OPTIONS, options_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# YoutubeDL instances of the current worker process, keyed by options
+_worker_instances: Dict[str, Any] = {}
+
+
+def extract_info_job(url: str, opts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fully extract ``url`` inside a worker process.
+
+    Single media come back processed (formats selected) and sanitized.
+    Playlists come back without their entries: entry lists are lazy and tied
+    to this process, so the caller lists them itself.
+    """
+    import yt_dlp
+
+    key = options_fingerprint(opts)
+    ydl = _worker_instances.get(key)
+    if ydl is None:
+        ydl = _worker_instances[key] = yt_dlp.YoutubeDL(opts)
+    try:
+        raw = ydl.extract_info(url, download=False, process=False)
+        if not raw:
+            return None
+        if raw.get("_type") in PLAYLIST_TYPES:
+            return {k: v for k, v in ydl.sanitize_info({**raw, "entries": None}).items() if k != "entries"}
+        return ydl.sanitize_info(ydl.process_ie_result(raw, download=False))
+    except yt_dlp.utils.YoutubeDLError as e:
+        # Extractor errors carry unpicklable state; keep the type callers check for
+        raise yt_dlp.utils.DownloadError(str(e)) from None
+
+
+def is_playlist(info: Optional[Dict[str, Any]]) -> bool:
+    return bool(info) and info.get("_type") in PLAYLIST_TYPES
+
+
+def _context() -> Any:
+    # Workers must not inherit the parent's event loop and thread pools
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["snatch.extract_pool", "yt_dlp"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ExtractionPool:
+    """Process pool running ``job(url, opts)`` with worker recycling.
+
+    Each worker is replaced after ``max_jobs`` extractions (natively on
+    Python 3.11+, by rotating the whole pool before that). A pool that breaks
+    (a worker killed by the OOM killer, say) is replaced on the next job, and
+    infrastructure failures are reported as ``None`` so callers can fall back
+    to extracting in-process.
+    """
+
+    def __init__(self, workers: int, max_jobs: int = 50,
+                 job: Callable[[str, Dict[str, Any]], Optional[Dict[str, Any]]] = extract_info_job,
+                 mp_context: Any = None):
+        self.workers = max(1, int(workers))
+        self.max_jobs = max(1, int(max_jobs))
+        self._job = job
+        self._mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._submitted = 0  # jobs sent to the current executor
+        self.generations = 0
+        self.completed = 0
+        self.fallbacks = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        context = self._mp_context or _context()
+        if sys.version_info >= (3, 11):
+            return ProcessPoolExecutor(self.workers, mp_context=context, max_tasks_per_child=self.max_jobs)
+        return ProcessPoolExecutor(self.workers, mp_context=context)
+
+    def _executor_for_job(self) -> ProcessPoolExecutor:
+        with self._lock:
+            rotate = sys.version_info < (3, 11) and self._submitted >= self.workers * self.max_jobs
+            if self._executor is None or rotate:
+                old, self._executor = self._executor, self._new_executor()
+                self._submitted = 0
+                self.generations += 1
+                if old is not None:
+                    # Running jobs finish; the old workers exit afterwards
+                    old.shutdown(wait=False)
+            self._submitted += 1
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _shareable(opts: Dict[str, Any]) -> Dict[str, Any]:
+        """Options that can cross a process boundary (hooks and callables stay here)"""
+        return {k: v for k, v in opts.items() if k not in PER_USE_OPTIONS and not callable(v)}
+
+    def _submit(self, url: str, opts: Dict[str, Any]) -> Optional[Tuple[ProcessPoolExecutor, Any]]:
+        try:
+            executor = self._executor_for_job()
+            return executor, executor.submit(self._job, url, self._shareable(opts))
+        except (RuntimeError, pickle.PicklingError, TypeError) as e:
+            logger.warning(f"Extraction pool unavailable, extracting in-process: {e}")
+            self.fallbacks += 1
+            return None
+
+    def _failed(self, executor: ProcessPoolExecutor, url: str, error: BaseException) -> None:
+        if isinstance(error, BrokenProcessPool):
+            logger.warning(f"Extraction worker died on {url}, extracting in-process: {error}")
+            self._discard(executor)
+        else:
+            logger.warning(f"Extraction result for {url} could not be transferred: {error}")
+        self.fallbacks += 1
+
+    def extract_sync(self, url: str, opts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Blocking extraction; returns None if the pool itself failed.
+
+        Extraction errors (yt-dlp ``DownloadError``) are raised as usual.
+        """
+        submitted = self._submit(url, opts)
+        if submitted is None:
+            return None
+        executor, future = submitted
+        try:
+            info = future.result()
+        except (BrokenProcessPool, pickle.PicklingError) as e:
+            return self._failed(executor, url, e)
+        self.completed += 1
+        return info
+
+    async def extract(self, url: str, opts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Async variant of ``extract_sync``"""
+        submitted = self._submit(url, opts)
+        if submitted is None:
+            return None
+        executor, future = submitted
+        try:
+            info = await asyncio.wrap_future(future)
+        except (BrokenProcessPool, pickle.PicklingError) as e:
+            return self._failed(executor, url, e)
+        self.completed += 1
+        return info
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"workers": self.workers, "generations": self.generations,
+                "completed": self.completed, "fallbacks": self.fallbacks}
@@ -10,7 +10,10 @@ Features:
 """
 
 import asyncio
+import copy
+import errno
 import hashlib
+import inspect
 import json
 import logging
 import os
@@ -23,8 +26,9 @@ import aiohttp
 import aiofiles
 import backoff
 from abc import ABC, abstractmethod
-from contextlib import contextmanager, asynccontextmanager
+from contextlib import contextmanager, asynccontextmanager, nullcontext
 from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Callable, Tuple, TypeVar, Protocol, Union, Set, TYPE_CHECKING
 import platform
@@ -95,9 +99,13 @@ except ImportError:
     create_performance_system = None
 
 try:
-    from .advanced_scheduler import AdvancedScheduler, create_smart_scheduler
+    from .advanced_scheduler import (AdvancedScheduler, DownloadStatus, Priority, ScheduledDownload,
+                                     create_smart_scheduler)
 except ImportError:
     AdvancedScheduler = None
+    DownloadStatus = None
+    Priority = None
+    ScheduledDownload = None
     create_smart_scheduler = None
 from .defaults import (
     CACHE_DIR,
@@ -117,6 +125,19 @@ from .ffmpeg_helper import locate_ffmpeg, validate_ffmpeg_installation
 from .audio_processor import EnhancedAudioProcessor, AudioEnhancementSettings, AUDIO_ENHANCEMENT_PRESETS
 from .network import check_internet_connection, run_speedtest
 from .constants import DEFAULT_TIMEOUT, DEFAULT_USER_AGENT, DEFAULT_CHUNK_SIZE
+from .bandwidth import BandwidthLimiter
+from .ydl_pool import YoutubeDLPool
+from .batch import BatchEngine, BatchResult
+from .playlist import PlaylistEntry, PlaylistExpander
+from .extract_pool import ExtractionPool, is_playlist
+from .archive import DownloadArchive, canonical_url, media_key, resolve_media_id
+from .postprocess import PostProcessPool
+from .politeness import parse_retry_after
+from .chunk_engine import (
+    SequentialDigest, build_manifest, DiskSpaceLedger,
+    AdaptiveChunkSizer, ChunkBitmap, HedgePolicy, MemoryBudget, MirrorPool, PartFile, RangePlanner,
+    RangeWriter, SlidingWindow
+)
 
 # File extensions
 PART_EXT = '.part'
@@ -213,6 +234,14 @@ class AudioConversionError(DownloadError):
     """Raised when audio conversion fails"""
     pass
 
+class OriginChangedError(ResourceError):
+    """Raised when the remote file changed while a download was in progress"""
+    pass
+
+class InsufficientDiskSpaceError(FileSystemError):
+    """Raised when the target volume cannot hold a download"""
+    pass
+
 @dataclass
 class DownloadChunk:
     """Represents a chunk of a download file"""
@@ -343,7 +372,33 @@ def timer(name: str = "", silent: bool = False):
             logging.info(f"{name} completed in {elapsed:.2f} seconds")
         else:
             logging.debug(f"{name} completed in {elapsed:.2f} seconds")
-class DownloadManager:
+
+
+class _DownloadEngines:
+    """Pools and limits set up the same way by both download managers"""
+
+    def _init_engines(self, config: Dict[str, Any], default_concurrency: int = 3) -> None:
+        # Long-lived YoutubeDL instances, reused across URLs with the same options
+        self.ydl_pool = YoutubeDLPool(max_idle=config.get("ydl_pool_size", 4))
+        # Global cap on simultaneous downloads across all batches
+        self.batch_engine = BatchEngine(config.get("max_concurrent", default_concurrency))
+        # Optional extraction worker processes (0 = extract in threads)
+        self.extraction_pool = self._create_extraction_pool(config)
+
+    @staticmethod
+    def _create_extraction_pool(config: Dict[str, Any]) -> Optional[ExtractionPool]:
+        """Process pool for CPU-heavy extraction, if ``extraction_processes`` is set"""
+        workers = config.get("extraction_processes", 0)
+        if not workers:
+            return None
+        return ExtractionPool(workers, max_jobs=config.get("extraction_worker_max_jobs", 50))
+
+    def cancel_download(self, url: str) -> bool:
+        """Cancel a URL in the running batches, whether started or still queued"""
+        return self.batch_engine.cancel(url)
+
+
+class DownloadManager(_DownloadEngines):
     """Enhanced download manager with improved UI and dependency injection.
     
     Features:
@@ -353,6 +408,9 @@ class DownloadManager:
     - Advanced audio/video format options
     - Resource-aware downloads
     """      
+    MAX_BATCH_WORKERS = 32
+    DEFAULT_BATCH_WORKERS = min(MAX_BATCH_WORKERS, (os.cpu_count() or 1) * 2)
+
     def __init__(
         self,
         config: Dict[str, Any],
@@ -380,6 +438,7 @@ class DownloadManager:
         self.session_manager = session_manager or SessionManager(DOWNLOAD_SESSIONS_FILE)
         self.download_cache = download_cache or DownloadCache() 
         self.file_organizer = file_organizer or FileOrganizer(config)
+        self._init_engines(config, default_concurrency=self.MAX_BATCH_WORKERS)
         self.download_stats = download_stats or DownloadStats(keep_history=True)
         
         # Initialize advanced systems
@@ -506,16 +565,24 @@ class DownloadManager:
             self.download_start_time = None
 
     async def batch_download(
-        self, urls: List[str], max_concurrent: Optional[int] = None, **kwargs
+        self, urls: List[str], max_concurrent: Optional[int] = None,
+        on_result: Optional[Callable[[BatchResult], Any]] = None, **kwargs
     ) -> List[bool]:
-        """Download multiple URLs in parallel."""
-        max_workers = max_concurrent or min(32, os.cpu_count() * 2)
-        
-        async with asyncio.Semaphore(max_workers):
-            tasks = [self.download(url, **kwargs) for url in urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-        return [isinstance(r, bool) and r for r in results]    
+        """Download multiple URLs with bounded concurrency.
+
+        At most ``max_concurrent`` URLs of this batch run at once (default
+        ``min(32, cpu_count * 2)``), never more than the manager-wide limit:
+        the config's ``max_concurrent`` if set, otherwise 32. ``on_result``
+        receives each result as it finishes; the returned flags follow the
+        order of ``urls``.
+        """
+        results = await self.batch_engine.run(
+            urls, lambda url: self.download(url, **kwargs),
+            on_result=on_result, is_success=lambda ok: ok is True,
+            max_in_flight=max_concurrent or self.DEFAULT_BATCH_WORKERS,
+        )
+        return [r.ok for r in results]
+
     async def _perform_download(self, url: str, session_id: str, options: Dict[str, Any]) -> bool:
         """Execute the download with progress tracking and error handling."""
         try:
@@ -531,7 +598,11 @@ class DownloadManager:
             
             loop = asyncio.get_event_loop()
             try:
-                await loop.run_in_executor(None, lambda: self._do_download(url, ydl_opts))
+                # Extraction is CPU-bound: with a process pool it scales past the GIL
+                info = None
+                if self.extraction_pool is not None:
+                    info = await self.extraction_pool.extract(url, ydl_opts)
+                await loop.run_in_executor(None, lambda: self._do_download(url, ydl_opts, info))
                 error_code = 0
             except asyncio.CancelledError:
                 logging.info(f"Download process cancelled for {url}")
@@ -561,11 +632,17 @@ class DownloadManager:
             with self._download_lock:
                 self._active_downloads -= 1
 
-    def _do_download(self, url: str, ydl_opts: Dict[str, Any]) -> None:
-        """Perform actual download using yt-dlp."""
-        import yt_dlp
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+    def _do_download(self, url: str, ydl_opts: Dict[str, Any], info: Optional[Dict[str, Any]] = None) -> None:
+        """Perform actual download using a pooled yt-dlp instance.
+
+        ``info`` extracted elsewhere (the extraction pool) is downloaded as is;
+        playlists are left to yt-dlp, which lists their entries itself.
+        """
+        with self.ydl_pool.checkout(ydl_opts) as ydl:
+            if info and not is_playlist(info):
+                ydl.process_ie_result(info, download=True)
+            else:
+                ydl.download([url])
 
     def _progress_hook(self, d: Dict[str, Any]) -> None:
         """Handle download progress updates."""
@@ -838,6 +915,29 @@ class DownloadChunk:
     data: bytes = field(default=b"")
     sha256: str = ""
     retries: int = 0
+    ttfb: float = 0.0  # seconds from request to response headers
+    elapsed: float = 0.0  # seconds from request to last byte
+    started_at: float = 0.0  # monotonic start of the current attempt
+    received: int = 0  # bytes received by the current attempt
+    hedge: bool = False  # duplicate request racing a straggling range
+    source: str = ""  # mirror URL serving the current attempt
+    prefetched: Optional[Any] = field(default=None, repr=False)  # open response to read first
+
+@dataclass
+class OriginProbe:
+    """What the first (ranged) GET to an origin revealed about it"""
+    total_size: Optional[int]  # None when the server does not say (chunked encoding)
+    validator: Dict[str, str]
+    accepts_ranges: bool = True
+    status: int = 0
+    response: Optional[Any] = field(default=None, repr=False)  # body not read yet
+    byte_range: Optional[Tuple[int, int]] = None  # range covered by a 206 body
+    started_at: float = 0.0
+
+    @property
+    def segmentable(self) -> bool:
+        """Whether the file can be fetched as parallel ranges"""
+        return self.accepts_ranges and bool(self.total_size)
 
 class DownloadHooks(ABC):
     """Abstract base class defining hooks for download lifecycle events"""
@@ -856,7 +956,7 @@ class DownloadHooks(ABC):
         """Called after download completes"""
         pass
 
-class AsyncDownloadManager:
+class AsyncDownloadManager(_DownloadEngines):
     """Async download manager with resumable downloads and chunk validation"""
     def __init__(self, config: Dict[str, Any],
                  session_manager: SessionManager,
@@ -868,11 +968,32 @@ class AsyncDownloadManager:
         self.session_manager = session_manager 
         self.download_cache = download_cache
         self._http_client = None  # Will be created in __aenter__
+        self._hedge_client = None  # Created on first hedged request
         self.user_provided_client = http_client is not None
         if http_client:
             self._http_client = http_client
         self.hooks: List[DownloadHooks] = []
-        self.chunk_size = 1024 * 1024  # 1MB default
+        self.chunk_size = 1024 * 1024  # 1MB default (initial range size)
+        self.min_chunk_size = config.get("min_chunk_size", 256 * 1024)
+        self.max_chunk_size = config.get("max_chunk_size", 16 * 1024 * 1024)
+        # Per-URL transfer metrics (chunk sizing decisions etc.) for status output
+        self.transfer_stats: Dict[str, Dict[str, Any]] = {}
+        # Hierarchical bandwidth limits in bytes/sec (0 = unlimited): this node is
+        # the global cap; each download and each connection hangs a child off it
+        self.bandwidth_limiter = BandwidthLimiter(config.get("global_bandwidth_limit", 0), name="global")
+        # Cap on bytes received but not yet written, shared by all downloads
+        self.memory_budget = MemoryBudget(config.get("max_buffer_memory", 64 * 1024 * 1024))
+        self._init_engines(config)
+        # Finished media, so re-runs skip them without extracting
+        self.download_archive = self._open_download_archive(config)
+        # CPU-bound post-processing runs beside downloads, not inside their slots
+        self.postprocess_pool = PostProcessPool(config.get("postprocess_workers"),
+                                                config.get("postprocess_queue_size"))
+        # Per-batch context (options, console, progress) of scheduled downloads by id
+        self._scheduled_context: Dict[str, Tuple[Dict[str, Any], Console, Optional[Progress],
+                                                 Optional[Dict[str, Any]]]] = {}
+        # Bytes promised to running downloads per volume, checked before new ones start
+        self.disk_ledger = DiskSpaceLedger(config.get("disk_space_headroom", 100 * 1024 * 1024))
         
         # Initialize error handler
         error_log_path = config.get("error_log_path", "logs/snatch_errors.log")
@@ -923,6 +1044,53 @@ class AsyncDownloadManager:
         # Import dependencies
         self._import_dependencies()
         
+    @staticmethod
+    def _open_download_archive(config: Dict[str, Any]) -> Optional[DownloadArchive]:
+        """Archive at ``download_archive`` (True picks the default location).
+
+        A new archive starts with whatever the output directories already
+        hold, as far as ``.info.json`` sidecars identify it.
+        """
+        path = config.get("download_archive")
+        if not path:
+            return None
+        if path is True:
+            path = CACHE_DIR.parent / "download_archive.txt"
+        archive = DownloadArchive(path)
+        if not archive.existed:
+            imported = sum(archive.import_directory(config[key])
+                           for key in ("video_output", "audio_output") if config.get(key))
+            if imported:
+                logging.info(f"Download archive seeded with {imported} entries from existing downloads")
+        return archive
+
+    def _archived(self, urls: List[str], options: Dict[str, Any]) -> Set[str]:
+        """The URLs in ``urls`` the download archive already has.
+
+        Canonical URLs are checked first; only misses pay for matching an
+        extractor to read the media id off the URL (nothing is extracted).
+        """
+        archive = self.download_archive
+        if archive is None or options.get("ignore_archive"):
+            return set()
+        found = {url for url in urls if archive.has_url(url)}
+        misses = [url for url in urls if url not in found]
+        if misses and len(archive):
+            with self.ydl_pool.checkout(self._setup_download_options(options)) as ydl:
+                for url in misses:
+                    media = resolve_media_id(ydl, url)
+                    if media and media_key(*media) in archive:
+                        found.add(url)
+        return found
+
+    def _archive_download(self, info: Dict[str, Any], url: str) -> None:
+        if self.download_archive is None:
+            return
+        try:
+            self.download_archive.record(info, [url])
+        except OSError as e:
+            logging.warning(f"Could not update download archive: {e}")
+
     def _import_dependencies(self):
         """Import optional dependencies"""
         # Import yt-dlp for download functionality
@@ -935,13 +1103,20 @@ class AsyncDownloadManager:
             self.yt_dlp_available = False
             logging.warning("yt-dlp not available, some functionality may be limited")
 
-    def _create_http_client(self) -> aiohttp.ClientSession:
-        """Create an aiohttp session with connection pooling and timeouts."""
+    def _create_http_client(self, fresh_connections: bool = False) -> aiohttp.ClientSession:
+        """Create an aiohttp session with connection pooling and timeouts.
+
+        With ``fresh_connections`` every request resolves DNS and opens its own
+        connection, so a hedged request is not queued behind a slow socket or edge.
+        """
         connector_kwargs = {
             "limit": 30,
             "limit_per_host": 10,
             "ttl_dns_cache": 300,
         }
+        if fresh_connections:
+            connector_kwargs.update(force_close=True, use_dns_cache=False)
+            del connector_kwargs["ttl_dns_cache"]
         # enable_cleanup_closed is deprecated in Python 3.14+ (CPython fix)
         if sys.version_info < (3, 14):
             connector_kwargs["enable_cleanup_closed"] = True
@@ -956,6 +1131,15 @@ class AsyncDownloadManager:
             self._http_client = self._create_http_client()
         return self._http_client
 
+    @property
+    def hedge_client(self) -> HTTPClientProtocol:
+        """HTTP client for hedged requests (the caller's client when one was injected)"""
+        if self.user_provided_client:
+            return self.http_client
+        if not self._hedge_client:
+            self._hedge_client = self._create_http_client(fresh_connections=True)
+        return self._hedge_client
+
     async def __aenter__(self):
         """Async context manager entry"""
         if not self._http_client and not self.user_provided_client:
@@ -967,6 +1151,13 @@ class AsyncDownloadManager:
         if self._http_client and not self.user_provided_client:
             await self._http_client.close()
             self._http_client = None
+        if self._hedge_client:
+            await self._hedge_client.close()
+            self._hedge_client = None
+        self.ydl_pool.close()
+        self.postprocess_pool.close()
+        if self.extraction_pool is not None:
+            self.extraction_pool.close()
 
     async def _calculate_sha256(self, data: bytes) -> str:
         """Calculate SHA256 hash of chunk data"""
@@ -977,31 +1168,82 @@ class AsyncDownloadManager:
         (aiohttp.ClientError, asyncio.TimeoutError),
         max_tries=5
     )
-    async def _download_chunk(self, url: str, chunk: DownloadChunk) -> bool:
-        """Download a single chunk with streaming reads and inline hashing"""
+    async def _download_chunk(self, url: str, chunk: DownloadChunk, if_range: Optional[str] = None,
+                              client: Optional[HTTPClientProtocol] = None,
+                              limiter: Optional[BandwidthLimiter] = None,
+                              part_file: Optional[PartFile] = None) -> bool:
+        """Download a single chunk with streaming reads and inline hashing
+
+        With a ``part_file`` the bytes are streamed to their offset as they
+        arrive (under the shared memory budget) instead of kept in ``chunk.data``.
+        A ``chunk.prefetched`` response (the probe's 206 body) is read instead
+        of sending a request; retries always go back to the network.
+        """
         headers = {"Range": f"bytes={chunk.start}-{chunk.end}"}
-
+        if if_range:
+            headers["If-Range"] = if_range
+
+        # Per-connection node under the download's limiter; skipped when nothing is capped
+        throttle = None
+        if limiter is not None:
+            throttle = limiter.child(self.config.get("per_connection_bandwidth_limit", 0),
+                                     name=f"{chunk.start}-{chunk.end}")
+            if not throttle.is_limited:
+                throttle.close()
+                throttle = None
+
+        prefetched, chunk.prefetched = chunk.prefetched, None
+        if prefetched is None:
+            chunk.started_at = time.monotonic()
+        started = chunk.started_at
+        chunk.received = 0
+        writer = None
         try:
-            async with self.http_client.get(url, headers=headers) as response:
+            request = prefetched if prefetched is not None else (client or self.http_client).get(url, headers=headers)
+            async with request as response:
+                chunk.ttfb = time.monotonic() - started
+                if response.status == 200 and if_range:
+                    # If-Range failed: the server is sending the whole (new) file
+                    raise OriginChangedError(f"Remote file changed since download started: {url}")
                 if response.status != 206:
                     logging.error(f"Range request failed: got status {response.status}")
                     return False
 
                 # Stream data in 64KB sub-chunks, compute SHA256 inline
-                buffer = BytesIO()
+                buffer = BytesIO() if part_file is None else None
+                if part_file is not None:
+                    writer = RangeWriter(part_file, chunk.start, self.memory_budget,
+                                         self.config.get("write_buffer_size", 256 * 1024))
                 hasher = hashlib.sha256()
                 async for data in response.content.iter_chunked(64 * 1024):
-                    buffer.write(data)
                     hasher.update(data)
-
-                chunk.data = buffer.getvalue()
+                    chunk.received += len(data)
+                    if writer:
+                        await writer.write(data)
+                    else:
+                        buffer.write(data)
+                    if throttle:
+                        await throttle.acquire(len(data))
+
+                expected = chunk.end - chunk.start + 1
+                if chunk.received != expected:
+                    raise aiohttp.ClientPayloadError(
+                        f"Short read for range {chunk.start}-{chunk.end}: {chunk.received}/{expected} bytes"
+                    )
+                if writer:
+                    await writer.flush()
+                else:
+                    chunk.data = buffer.getvalue()
                 chunk.sha256 = hasher.hexdigest()
+                chunk.elapsed = time.monotonic() - started
 
                 # Notify hooks
                 for hook in self.hooks:
                     await hook.post_chunk(chunk, chunk.sha256)
 
                 return True
+        except OriginChangedError:
+            raise
         except Exception as e:
             logging.error(f"Chunk download error: {str(e)}")
             chunk.retries += 1
@@ -1009,32 +1251,333 @@ class AsyncDownloadManager:
                 logging.error(f"Maximum retries reached for chunk {chunk.start}-{chunk.end}")
                 return False
             raise  # Let backoff handle retry
+        finally:
+            if writer:
+                writer.discard()
+            if throttle:
+                throttle.close()
+
+    async def _fetch_chunk_to_file(self, url: str, chunk: DownloadChunk, part_file: PartFile,
+                                   if_range: Optional[str] = None,
+                                   client: Optional[HTTPClientProtocol] = None,
+                                   limiter: Optional[BandwidthLimiter] = None) -> bool:
+        """Download one range and write it straight to its offset in the part file"""
+        return await self._download_chunk(url, chunk, if_range=if_range, client=client,
+                                          limiter=limiter, part_file=part_file)
+
+    @staticmethod
+    def _origin_validator(headers: Any) -> Dict[str, str]:
+        """Extract the ETag/Last-Modified validators that identify a remote file version"""
+        validator = {}
+        if headers.get("ETag"):
+            validator["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            validator["last_modified"] = headers["Last-Modified"]
+        return validator
+
+    @staticmethod
+    def _if_range_value(validator: Dict[str, str]) -> Optional[str]:
+        """Pick the If-Range value for a validator (weak ETags are not allowed there)"""
+        etag = validator.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return validator.get("last_modified")
+
+    def _load_chunk_state(self, url: str, temp_path: str, total_size: int,
+                          validator: Dict[str, str]) -> Tuple[ChunkBitmap, Dict[str, str]]:
+        """Restore the completion bitmap and chunk hashes of an interrupted download.
+
+        Falls back to a fresh bitmap when there is no usable state, the part
+        file is gone, or the origin's size or validators no longer match.
+        """
+        fresh = ChunkBitmap(total_size, min(self.min_chunk_size, self.chunk_size)), {}
+        state = self.session_manager.get_chunk_state(url)
+        if not isinstance(state, dict):
+            return fresh
+
+        bitmap = ChunkBitmap.from_dict(state.get("bitmap"))
+        if bitmap is None or bitmap.total_size != total_size:
+            return fresh
+        if state.get("validator", {}) != validator:
+            logging.info(f"Remote file changed since last attempt, restarting download: {url}")
+            self.session_manager.clear_chunk_state(url)
+            return fresh
+        if not os.path.exists(temp_path) or os.path.getsize(temp_path) != total_size:
+            return fresh
+
+        return bitmap, dict(state.get("chunk_hashes", {}))
+
+    def _record_chunk_state(self, url: str, output_path: str, bitmap: ChunkBitmap,
+                            chunk_hashes: Dict[str, str], validator: Dict[str, str],
+                            status: Optional[str] = None,
+                            manifest: Optional[Dict[str, Any]] = None) -> None:
+        """Persist the completion bitmap and per-chunk SHA-256s through the session layer"""
+        self.session_manager.update_chunk_state(
+            url,
+            {"bitmap": bitmap.to_dict(), "chunk_hashes": chunk_hashes, "validator": validator},
+            bitmap.completed_bytes(),
+            total_size=bitmap.total_size,
+            file_path=output_path,
+            status=status,
+            manifest=manifest,
+        )
+
+    def _create_chunk_sizer(self, block_size: int) -> AdaptiveChunkSizer:
+        """Build the range sizer for one download, aligned to the bitmap's block size"""
+        return AdaptiveChunkSizer(
+            initial=self.chunk_size,
+            minimum=block_size,
+            maximum=max(self.max_chunk_size, self.chunk_size),
+            block_size=block_size,
+            target_seconds=self.config.get("chunk_target_seconds", 2.0),
+            enabled=self.config.get("adaptive_chunk_sizing", True),
+        )
+
+    async def _probe_origin(self, url: str) -> Tuple[int, Dict[str, str]]:
+        """HEAD a URL for its Content-Length and ETag/Last-Modified validators"""
+        async with self.http_client.head(url) as response:
+            if response.status >= 400:
+                raise NetworkError(f"Failed to fetch URL: HTTP {response.status}")
+            return int(response.headers.get("Content-Length", 0)), self._origin_validator(response.headers)
+
+    def _probe_range(self, url: str, temp_path: str) -> Tuple[int, int]:
+        """Range for the capability probe: the first range a resume would fetch"""
+        start, end = 0, self.chunk_size - 1
+        state = self.session_manager.get_chunk_state(url)
+        if not isinstance(state, dict) or not os.path.exists(temp_path):
+            return start, end
+        bitmap = ChunkBitmap.from_dict(state.get("bitmap"))
+        runs = bitmap.missing_runs() if bitmap is not None else []
+        if runs:
+            start = runs[0][0]
+            end = min(start + self.chunk_size - 1, runs[0][1])
+        elif bitmap is None and state.get("stream_offset"):
+            start = int(state["stream_offset"])
+            end = start + self.chunk_size - 1
+        return start, end
+
+    async def _probe_capabilities(self, url: str, start: int, end: int) -> OriginProbe:
+        """Learn size, validators and Range support from a ranged GET.
+
+        This replaces a separate HEAD: a 206 body is the first range of a
+        segmented download and a 200 body is the whole file for streaming, so
+        the response is handed back unread. Origins that refuse the probe get
+        the old HEAD-based check instead.
+        """
+        started = time.monotonic()
+        response = await self.http_client.get(url, headers={"Range": f"bytes={start}-{end}"})
+        validator = self._origin_validator(response.headers)
+        if response.status == 206:
+            match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", response.headers.get("Content-Range", ""))
+            if match and match.group(3) != "*":
+                first, last = int(match.group(1)), int(match.group(2))
+                if first != start or last > end:
+                    response.release()
+                    response = None
+                return OriginProbe(int(match.group(3)), validator, status=206, response=response,
+                                   byte_range=(first, last) if response else None, started_at=started)
+            # Ranges work but the size is unknown: stream with open-ended ranges
+            response.release()
+            return OriginProbe(None, validator, status=206, started_at=started)
+        if response.status == 200:
+            # Range was ignored; the body is the whole file
+            return OriginProbe(response.content_length, validator, accepts_ranges=False,
+                               status=200, response=response, started_at=started)
+
+        status = response.status
+        response.release()
+        logging.debug(f"Range probe answered HTTP {status}, falling back to HEAD: {url}")
+        total_size, validator = await self._probe_origin(url)
+        return OriginProbe(total_size or None, validator, status=status, started_at=started)
+
+    async def _build_mirror_pool(self, urls: List[str], total_size: int,
+                                 validator: Dict[str, str],
+                                 probes: Optional[List[Any]] = None) -> MirrorPool:
+        """Check the extra mirrors and keep only those serving the primary's content
+
+        ``probes`` are the mirrors' already gathered HEAD results (or exceptions);
+        they are fetched here when not given.
+        """
+        pool = MirrorPool(urls, cooldown=self.config.get("mirror_cooldown", 30.0))
+        pool.mirrors[0].if_range = self._if_range_value(validator)
+
+        if probes is None:
+            probes = await asyncio.gather(*(self._probe_origin(m.url) for m in pool.mirrors[1:]),
+                                          return_exceptions=True)
+        for mirror, probe in zip(pool.mirrors[1:], probes):
+            if isinstance(probe, Exception):
+                pool.disable(mirror.url, f"probe failed: {probe}")
+                continue
+            size, mirror_validator = probe
+            etag, mirror_etag = validator.get("etag"), mirror_validator.get("etag")
+            if size != total_size:
+                pool.disable(mirror.url, f"Content-Length {size} != {total_size}")
+            elif etag and mirror_etag and etag != mirror_etag:
+                pool.disable(mirror.url, f"ETag {mirror_etag} != {etag}")
+            else:
+                mirror.if_range = self._if_range_value(mirror_validator)
+        return pool
+
+    def _submit_range(self, window: SlidingWindow, mirrors: MirrorPool, chunk: DownloadChunk,
+                      part_file: PartFile, limiter: Optional[BandwidthLimiter] = None,
+                      exclude: Optional[str] = None,
+                      client: Optional[HTTPClientProtocol] = None,
+                      source: Optional[str] = None) -> Optional[asyncio.Task]:
+        """Start fetching a range from the best available mirror (or from ``source``)"""
+        mirror = mirrors.get(source) if source else mirrors.pick(exclude=exclude)
+        if mirror is None:
+            return None
+        chunk.source = mirror.url
+        mirror.in_flight += 1
+        task = window.submit(
+            self._fetch_chunk_to_file(mirror.url, chunk, part_file, mirror.if_range,
+                                      client=client, limiter=limiter),
+            chunk,
+        )
+
+        def _release(_task: asyncio.Task, m=mirror) -> None:
+            m.in_flight -= 1
+
+        task.add_done_callback(_release)
+        return task
+
+    def _hedge_stragglers(self, window: SlidingWindow,
+                          attempts: Dict[Tuple[int, int], List[asyncio.Task]],
+                          policy: HedgePolicy, stats: Dict[str, int],
+                          mirrors: MirrorPool, part_file: PartFile,
+                          limiter: Optional[BandwidthLimiter] = None) -> None:
+        """Race a duplicate request against ranges falling far behind their peers.
+
+        A range has at most one hedge in flight, sent on a fresh connection
+        (to another mirror when there is one), and no more than ``max_hedges``
+        hedges run at a time.
+        """
+        max_hedges = self.config.get("max_hedges", 2)
+        running = sum(1 for tasks in attempts.values() if len(tasks) > 1)
+        now = time.monotonic()
+        for c, _ in window.items():
+            if running >= max_hedges:
+                break
+            key = (c.start, c.end)
+            if c.hedge or c.started_at == 0 or len(attempts.get(key, [])) != 1:
+                continue
+            if not policy.is_straggler(c.end - c.start + 1, c.received, now - c.started_at):
+                continue
+
+            duplicate = DownloadChunk(start=c.start, end=c.end, hedge=True)
+            task = self._submit_range(window, mirrors, duplicate, part_file, limiter,
+                                      exclude=c.source, client=self.hedge_client)
+            if task is None:
+                break
+            attempts[key].append(task)
+            running += 1
+            stats["hedged"] += 1
+            logging.info(f"Hedging straggling range {c.start}-{c.end} "
+                         f"({c.received}/{c.end - c.start + 1} bytes after {now - c.started_at:.1f}s)")
+
+    def get_transfer_stats(self, url: Optional[str] = None) -> Dict[str, Any]:
+        """Transfer metrics (including chunk sizing decisions) per URL"""
+        if url is not None:
+            return self.transfer_stats.get(url, {})
+        return dict(self.transfer_stats)
+
+    async def _flush_sessions(self) -> None:
+        """Write session state to disk now (works with sync and async session managers)"""
+        try:
+            result = self.session_manager.flush()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logging.debug(f"Session flush failed: {e}")
+
+    async def _reserve_disk_space(self, key: str, path: str, nbytes: int) -> None:
+        """Admit a download only if its volume can hold ``nbytes`` more.
+
+        Waits up to ``disk_space_wait`` seconds for other downloads to release
+        space before giving up with InsufficientDiskSpaceError.
+        """
+        if await self.disk_ledger.acquire(key, path, nbytes, timeout=self.config.get("disk_space_wait", 0)):
+            return
+        available = max(0, self.disk_ledger.available(path, exclude=key))
+        raise InsufficientDiskSpaceError(
+            f"Not enough disk space for {os.path.basename(path)}: needs {format_size(nbytes)}, "
+            f"{format_size(available)} available after active downloads and headroom"
+        )
+
+    async def _notify_pre_download(self, url: str, metadata: Dict[str, Any], key: str) -> None:
+        """Run pre-download hooks, giving back the disk reservation if one fails"""
+        try:
+            for hook in self.hooks:
+                await hook.pre_download(url, metadata)
+        except BaseException:
+            self.disk_ledger.release(key)
+            raise
+
+    def _open_part_file(self, key: str, part_file: PartFile, resume: bool) -> None:
+        """Open (and preallocate) a part file; its reservation ends once blocks are allocated"""
+        try:
+            part_file.open(resume=resume)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise InsufficientDiskSpaceError(f"Disk full while allocating {part_file.path}") from e
+            raise
+        if part_file.preallocated:
+            self.disk_ledger.release(key)
+
+    def _transfer_progress(self, console: Console) -> Progress:
+        """Progress display for a direct HTTP download"""
+        return Progress(
+            SpinnerColumn(),
+            TextColumn("[bold blue]Downloading...", justify="right"),
+            BarColumn(bar_width=40),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TextColumn("•"),
+            DownloadColumn(),
+            TextColumn("•"),
+            TransferSpeedColumn(),
+            TextColumn("•"),
+            TimeElapsedColumn(),
+            TextColumn("• chunk {task.fields[chunk_size]}"),
+            console=console
+        )
+
     @handle_errors(ErrorCategory.DOWNLOAD, ErrorSeverity.ERROR)
-    async def download(self, url: str, output_path: str, **options) -> str:
+    async def download(self, url: Union[str, List[str]], output_path: str, **options) -> str:
         """
         Download file with resume support and chunk validation
+
+        The first request is a ranged GET that also probes the origin. A 206
+        with a known size starts the parallel range engine (its body is the
+        first range); origins that ignore Range or do not announce a size are
+        streamed over a single connection instead.
         
         Args:
-            url: Download URL
+            url: Download URL, or a list of equivalent mirror URLs
             output_path: Where to save the file
-            **options: Additional download options
+            **options: Additional download options (``mirrors``: extra
+                equivalent URLs to spread ranges across)
             
         Returns:
             Path to downloaded file
         """
         console = Console()
         
-        # Get content info
+        # The first URL is the primary: resume state is keyed by it and
+        # mirrors must match its size and ETag
+        urls = [url] if isinstance(url, str) else list(url)
+        urls += [m for m in options.get("mirrors", []) if m not in urls]
+        url = urls[0]
+        
+        # Probe the primary with a ranged GET while the mirrors are HEADed
+        mirror_probes = asyncio.ensure_future(asyncio.gather(
+            *(self._probe_origin(m) for m in urls[1:]), return_exceptions=True
+        ))
         try:
-            async with self.http_client.head(url) as response:
-                if response.status >= 400:
-                    raise NetworkError(f"Failed to fetch URL: HTTP {response.status}")
-                total_size = int(response.headers.get("Content-Length", 0))
-                
-            if total_size <= 0:
-                raise ResourceError("Unable to determine file size. Content-Length header missing.")
-                
+            probe = await self._probe_capabilities(
+                url, *self._probe_range(url, f"{output_path}{PART_EXT}")
+            )
         except aiohttp.ClientError as e:
+            mirror_probes.cancel()
             error_msg = f"Network error during download preparation: {str(e)}"
             logging.error(error_msg)
             self.error_handler.log_error(
@@ -1045,6 +1588,7 @@ class AsyncDownloadManager:
             )
             raise NetworkError(f"Connection error: {str(e)}") from e
         except Exception as e:
+            mirror_probes.cancel()
             error_msg = f"Error preparing download: {str(e)}"
             logging.error(error_msg)
             self.error_handler.log_error(
@@ -1054,86 +1598,405 @@ class AsyncDownloadManager:
                 context={"url": url, "preparation_stage": True}
             )
             raise
+
+        try:
+            if probe.segmentable:
+                mirrors = await self._build_mirror_pool(urls, probe.total_size, probe.validator,
+                                                        await mirror_probes)
+                await self._download_segmented(url, output_path, probe, mirrors, console)
+            else:
+                mirror_probes.cancel()
+                if len(urls) > 1:
+                    logging.info(f"{url} cannot serve byte ranges, ignoring {len(urls) - 1} mirror(s)")
+                await self._download_streaming(url, output_path, probe, console)
+        finally:
+            if probe.response is not None:
+                probe.response.release()
+        
+        # Notify post-download hooks
+        for hook in self.hooks:
+            await hook.post_download(url, output_path)
             
-        # Load resume data if exists
-        session_data = self.session_manager.get_session(url)
-        resume_from = session_data.get("downloaded_bytes", 0) if session_data else 0
-        
-        # Calculate chunks
-        chunks = []
-        for start in range(resume_from, total_size, self.chunk_size):
-            end = min(start + self.chunk_size - 1, total_size - 1)
-            chunks.append(DownloadChunk(start=start, end=end))
+        return output_path
+
+    async def _download_segmented(self, url: str, output_path: str, probe: OriginProbe,
+                                  mirrors: MirrorPool, console: Console) -> None:
+        """Fetch the missing ranges of a file in parallel into a preallocated part file"""
+        total_size, validator = probe.total_size, probe.validator
+
+        # Load resume state: only ranges missing from the completion bitmap are fetched
+        temp_path = f"{output_path}{PART_EXT}"
+        bitmap, chunk_hashes = self._load_chunk_state(url, temp_path, total_size, validator)
+        resume_from = bitmap.completed_bytes()
+        
+        # Ranges are carved from the missing runs at dispatch time, sized from
+        # the throughput and TTFB measured on the ranges completed so far
+        planner = RangePlanner(bitmap.missing_runs(), bitmap.block_size)
+        sizer = self._create_chunk_sizer(bitmap.block_size)
+        hedge_policy = HedgePolicy(
+            factor=self.config.get("hedge_factor", 3.0),
+            min_delay=self.config.get("hedge_min_delay", 1.0),
+        ) if self.config.get("hedge_requests", True) else None
+        hedge_stats = {"hedged": 0, "hedge_wins": 0}
+        self.transfer_stats[url] = {
+            "mode": "segmented",
+            "chunk_sizing": sizer.snapshot(),
+            "hedging": hedge_stats,
+            "mirrors": mirrors.snapshot(),
+        }
+
+        # The probe's 206 body becomes the first range, saving a request
+        first = None
+        if probe.byte_range and planner.claim(*probe.byte_range):
+            first = DownloadChunk(start=probe.byte_range[0], end=probe.byte_range[1],
+                                  started_at=probe.started_at, prefetched=probe.response)
             
+        # Admission: the volume must hold the rest of the file on top of
+        # what running downloads have reserved
+        await self._reserve_disk_space(
+            temp_path, temp_path, total_size - PartFile.allocated_bytes(temp_path)
+        )
+
         # Notify pre-download hooks
         metadata = {"total_size": total_size, "resume_from": resume_from}
-        for hook in self.hooks:
-            await hook.pre_download(url, metadata)
+        await self._notify_pre_download(url, metadata, temp_path)
             
-        # Download chunks
-        temp_path = f"{output_path}.part"
-        mode = "ab" if resume_from > 0 else "wb"
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[bold blue]Downloading...", justify="right"),
-            BarColumn(bar_width=40),
-            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-            TextColumn("•"),
-            DownloadColumn(),
-            TextColumn("•"),
-            TransferSpeedColumn(),
-            TextColumn("•"),
-            TimeElapsedColumn(),
-            console=console
-        ) as progress:
-            task = progress.add_task(f"Downloading {os.path.basename(output_path)}", total=total_size)
+        # Download chunks into a preallocated part file
+        part_file = PartFile(temp_path, total_size, preallocate=self.config.get("preallocate_files", True))
+        
+        with self._transfer_progress(console) as progress:
+            task = progress.add_task(
+                f"Downloading {os.path.basename(output_path)}",
+                total=total_size,
+                chunk_size=format_size(sizer.current_size),
+            )
             progress.update(task, completed=resume_from)
             
+            window = SlidingWindow(self.config.get("max_concurrent_chunks", 8))
+            # In-flight attempts per range: the primary plus at most one hedge
+            attempts: Dict[Tuple[int, int], List[asyncio.Task]] = {}
+            digest = None
+            download_limiter = self.bandwidth_limiter.child(
+                self.config.get("per_download_bandwidth_limit", 0), name=url
+            )
             try:
-                max_concurrent = self.config.get("max_concurrent_chunks", 8)
-                semaphore = asyncio.Semaphore(max_concurrent)
-
-                async def _download_with_limit(c):
-                    async with semaphore:
-                        return await self._download_chunk(url, c)
-
-                async with aiofiles.open(temp_path, mode) as f:
-                    # Download in parallel batches, write in order
-                    for i in range(0, len(chunks), max_concurrent):
-                        batch = chunks[i:i + max_concurrent]
-                        results = await asyncio.gather(
-                            *[_download_with_limit(c) for c in batch],
-                            return_exceptions=True,
+                self._open_part_file(temp_path, part_file, resume=resume_from > 0)
+                # Whole-file SHA-256 computed alongside the download, not after it
+                digest = SequentialDigest(part_file) if self.config.get("whole_file_digest", True) else None
+                if first is not None:
+                    attempts[(first.start, first.end)] = [
+                        self._submit_range(window, mirrors, first, part_file, download_limiter, source=url)
+                    ]
+
+                # Keep the window full: start the next range as soon as any slot frees up
+                while planner or window:
+                    while planner and window.has_capacity():
+                        size = sizer.next_size(planner.remaining_bytes, window.size)
+                        start, end = planner.next_range(size)
+                        c = DownloadChunk(start=start, end=end)
+                        submitted = self._submit_range(window, mirrors, c, part_file, download_limiter)
+                        if submitted is None:
+                            raise DownloadError(f"No usable mirror left for {url}")
+                        attempts[(start, end)] = [submitted]
+
+                    timeout = self.config.get("hedge_check_interval", 0.25) if hedge_policy else None
+                    for c, finished in await window.wait_next(timeout=timeout):
+                        key = (c.start, c.end)
+                        others = [t for t in attempts.get(key, []) if t is not finished]
+                        error = finished.exception()
+                        if error is not None or not finished.result():
+                            if isinstance(error, OriginChangedError):
+                                mirrors.disable(c.source, "content changed (If-Range mismatch)")
+                            else:
+                                mirrors.demote(c.source, str(error or "range request failed"))
+                            if others:
+                                # The other attempt at this range may still succeed
+                                attempts[key] = others
+                                continue
+                            if mirrors.has_alternative(c.source):
+                                # Another mirror will pick this range up
+                                attempts.pop(key, None)
+                                planner.requeue(c.start, c.end)
+                                continue
+                            if isinstance(error, OriginChangedError):
+                                self.session_manager.clear_chunk_state(url)
+                                raise error
+                            if error is not None:
+                                raise DownloadError(f"Chunk {c.start}-{c.end} failed: {error}")
+                            raise DownloadError(f"Failed to download chunk {c.start}-{c.end}")
+
+                        # First attempt to finish wins; cancel the one it raced
+                        for other in others:
+                            window.discard(other)
+                        attempts.pop(key, None)
+                        if c.hedge:
+                            hedge_stats["hedge_wins"] += 1
+
+                        mirrors.record_success(c.source, c.end - c.start + 1, c.elapsed)
+                        self.transfer_stats[url]["mirrors"] = mirrors.snapshot()
+                        if hedge_policy:
+                            hedge_policy.record(c.end - c.start + 1, c.ttfb, c.elapsed)
+                        if c.retries:
+                            sizer.record_failure(f"{c.retries} retries on {c.start}-{c.end}")
+                        else:
+                            sizer.record_success(c.end - c.start + 1, c.ttfb, c.elapsed)
+                        self.transfer_stats[url]["chunk_sizing"] = sizer.snapshot()
+                        progress.update(
+                            task,
+                            advance=c.end - c.start + 1,
+                            chunk_size=format_size(sizer.current_size),
                         )
-                        for c, result in zip(batch, results):
-                            if isinstance(result, Exception):
-                                raise DownloadError(f"Chunk {c.start}-{c.end} failed: {result}")
-                            if not result:
-                                raise DownloadError(f"Failed to download chunk {c.start}-{c.end}")
 
-                            await f.write(c.data)
-                            progress.update(task, advance=len(c.data))
-                            c.data = None  # Free memory eagerly
+                        # Persist completion bitmap and chunk hash for out-of-order resume
+                        bitmap.mark_range(c.start, c.end)
+                        chunk_hashes[f"{c.start}-{c.end}"] = c.sha256
+                        self._record_chunk_state(url, output_path, bitmap, chunk_hashes, validator)
+                        if digest:
+                            digest.advance_to(bitmap.completed_prefix())
+
+                    if hedge_policy:
+                        self._hedge_stragglers(window, attempts, hedge_policy, hedge_stats,
+                                               mirrors, part_file, download_limiter)
 
-                            # Update session
-                            downloaded = c.end + 1
-                            self.session_manager.update_session(url, {"progress": downloaded / total_size * 100})
+                sha256 = None
+                if digest:
+                    try:
+                        sha256 = await digest.finish(total_size)
+                    except OSError as e:
+                        logging.warning(f"Whole-file digest unavailable for {output_path}: {e}")
+                part_file.sync()
+                part_file.close()
 
                 # Rename temp file to final
                 os.replace(temp_path, output_path)
+                manifest = build_manifest(total_size, chunk_hashes, sha256, output_path)
+                self.transfer_stats[url]["sha256"] = sha256
+                self._record_chunk_state(url, output_path, bitmap, chunk_hashes, validator,
+                                         status="completed", manifest=manifest)
             except Exception as e:
                 logging.error(f"Download failed: {str(e)}")
                 if os.path.exists(temp_path):
                     # Leave partial download for potential future resume
                     logging.info(f"Partial download saved as {temp_path}")
                 raise
-        
-        # Notify post-download hooks
-        for hook in self.hooks:
-            await hook.post_download(url, output_path)
-            
-        return output_path    
+            finally:
+                await window.cancel_all()
+                if digest:
+                    await digest.cancel()
+                part_file.close()
+                self.disk_ledger.release(temp_path)
+                self.transfer_stats[url]["bandwidth"] = download_limiter.snapshot()
+                self.transfer_stats[url]["memory"] = self.memory_budget.snapshot()
+                self.transfer_stats[url]["preallocated"] = part_file.preallocated
+                download_limiter.close()
+                await self._flush_sessions()
+
+    def _load_stream_offset(self, url: str, temp_path: str, validator: Dict[str, str]) -> int:
+        """Bytes an interrupted single-connection download already wrote to its part file"""
+        state = self.session_manager.get_chunk_state(url)
+        if not isinstance(state, dict) or not state.get("stream_offset"):
+            return 0
+        if state.get("validator", {}) != validator:
+            logging.info(f"Remote file changed since last attempt, restarting download: {url}")
+            self.session_manager.clear_chunk_state(url)
+            return 0
+        offset = int(state["stream_offset"])
+        if not os.path.exists(temp_path) or os.path.getsize(temp_path) < offset:
+            return 0
+        return offset
+
+    def _record_stream_state(self, url: str, output_path: str, offset: int,
+                             total_size: Optional[int], validator: Dict[str, str],
+                             status: Optional[str] = None,
+                             manifest: Optional[Dict[str, Any]] = None) -> None:
+        """Persist how far a single-connection download got through the session layer"""
+        self.session_manager.update_chunk_state(
+            url,
+            {"stream_offset": offset, "validator": validator},
+            offset,
+            total_size=total_size,
+            file_path=output_path,
+            status=status,
+            manifest=manifest,
+        )
+
+    @staticmethod
+    def _hash_part_prefix(part_file: PartFile, hasher: Any, size: int, read_size: int = 1024 * 1024) -> None:
+        """Feed the first ``size`` bytes of the part file into ``hasher``"""
+        offset = 0
+        while offset < size:
+            data = part_file.read_at(offset, min(read_size, size - offset))
+            if not data:
+                raise IOError(f"Unexpected end of {part_file.path} at {offset}")
+            hasher.update(data)
+            offset += len(data)
+
+    @staticmethod
+    def _stream_start(response: Any) -> Optional[int]:
+        """Offset the body of a streaming response starts at (None if unusable)"""
+        if response.status == 200:
+            return 0
+        match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+
+    async def _open_stream(self, url: str, offset: int, if_range: Optional[str]) -> Any:
+        """GET the file from ``offset`` onwards; server errors raise a retryable ClientError"""
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if if_range:
+                headers["If-Range"] = if_range
+        response = await self.http_client.get(url, headers=headers)
+        if response.status in (200, 206):
+            return response
+        response.release()
+        if response.status >= 500 or response.status == 429:
+            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                              status=response.status, message=response.reason or "")
+        raise NetworkError(f"Failed to fetch URL: HTTP {response.status}")
+
+    async def _download_streaming(self, url: str, output_path: str, probe: OriginProbe,
+                                  console: Console) -> None:
+        """Fetch a file over one connection when the origin cannot serve parallel ranges.
+
+        Bytes are written at their offset in the part file as they arrive and
+        hashed inline. A dropped connection resumes with an open-ended Range
+        (guarded by If-Range) where the origin honours one, and starts over
+        where it does not.
+        """
+        temp_path = f"{output_path}{PART_EXT}"
+        total_size, validator = probe.total_size, probe.validator
+        if_range = self._if_range_value(validator)
+        accepts_ranges = probe.accepts_ranges
+        # A 200 probe body is the whole file; anything else needs a new request
+        response = probe.response if probe.status == 200 else None
+        probe.response = None
+        offset = 0 if response is not None else self._load_stream_offset(url, temp_path, validator)
+        self.transfer_stats[url] = {"mode": "stream", "resumable": accepts_ranges}
+
+        # Admission; with an unknown size only the headroom can be checked
+        await self._reserve_disk_space(
+            temp_path, temp_path,
+            total_size - PartFile.allocated_bytes(temp_path) if total_size else 0
+        )
+
+        # Notify pre-download hooks
+        metadata = {"total_size": total_size or 0, "resume_from": offset}
+        await self._notify_pre_download(url, metadata, temp_path)
+
+        # Preallocated when the size is known, grown by the writes otherwise
+        part_file = PartFile(temp_path, total_size, preallocate=self.config.get("preallocate_files", True))
+        hasher = hashlib.sha256()
+        max_retries = self.config.get("stream_max_retries", 5)
+        retry_delay = self.config.get("stream_retry_delay", 1.0)
+        retries = 0
+        writer = None
+        completed = False
+
+        with self._transfer_progress(console) as progress:
+            task = progress.add_task(
+                f"Downloading {os.path.basename(output_path)}",
+                total=total_size,
+                chunk_size="stream",
+            )
+            download_limiter = self.bandwidth_limiter.child(
+                self.config.get("per_download_bandwidth_limit", 0), name=url
+            )
+            try:
+                self._open_part_file(temp_path, part_file, resume=offset > 0)
+                if offset:
+                    # The kept prefix is re-hashed so the digest still covers the whole file
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self._hash_part_prefix, part_file, hasher, offset
+                    )
+                    progress.update(task, completed=offset)
+
+                while True:
+                    attempt_start = offset
+                    try:
+                        if response is None:
+                            response = await self._open_stream(url, offset if accepts_ranges else 0, if_range)
+                        start = self._stream_start(response)
+                        if start is None or start > offset:
+                            # Unusable range answer: fall back to whole-file requests
+                            accepts_ranges = False
+                            raise aiohttp.ClientPayloadError(
+                                f"Unexpected Content-Range {response.headers.get('Content-Range')!r}"
+                            )
+                        if start < offset:
+                            # Range ignored or If-Range failed: the body starts at byte 0
+                            logging.info(f"Cannot resume {url} at byte {offset}, restarting")
+                            offset = attempt_start = 0
+                            writer = None
+                            hasher = hashlib.sha256()
+                            validator = self._origin_validator(response.headers) or validator
+                            if_range = self._if_range_value(validator)
+                            if total_size is None:
+                                part_file.truncate(0)
+                            progress.update(task, completed=0)
+
+                        writer = RangeWriter(part_file, offset, self.memory_budget,
+                                             self.config.get("write_buffer_size", 256 * 1024))
+                        async for data in response.content.iter_chunked(64 * 1024):
+                            hasher.update(data)
+                            offset += len(data)
+                            await writer.write(data)
+                            progress.update(task, completed=offset)
+                            await download_limiter.acquire(len(data))
+                        if total_size is not None and offset < total_size:
+                            raise aiohttp.ClientPayloadError(
+                                f"Stream ended at {offset} of {total_size} bytes"
+                            )
+                        await writer.flush()
+                        break
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if writer:
+                            await writer.flush()
+                        retries = retries + 1 if offset == attempt_start else 1
+                        if retries > max_retries:
+                            raise NetworkError(f"Download of {url} failed at byte {offset}: {e}") from e
+                        self._record_stream_state(url, output_path, offset, total_size, validator)
+                        logging.warning(f"Connection lost at byte {offset} of {url} ({e}), retrying")
+                        await asyncio.sleep(retry_delay * 2 ** (retries - 1))
+                    finally:
+                        if response is not None:
+                            response.release()
+                            response = None
+
+                sha256 = hasher.hexdigest()
+                if offset != total_size:
+                    part_file.truncate(offset)
+                part_file.sync()
+                part_file.close()
+
+                # Rename temp file to final
+                os.replace(temp_path, output_path)
+                completed = True
+                chunk_hashes = {f"0-{offset - 1}": sha256} if offset else {}
+                manifest = build_manifest(offset, chunk_hashes, sha256, output_path)
+                self.transfer_stats[url]["sha256"] = sha256
+                self._record_stream_state(url, output_path, offset, offset, validator,
+                                          status="completed", manifest=manifest)
+            except Exception as e:
+                logging.error(f"Download failed: {str(e)}")
+                if os.path.exists(temp_path):
+                    # Leave partial download for potential future resume
+                    logging.info(f"Partial download saved as {temp_path}")
+                raise
+            finally:
+                if writer:
+                    writer.discard()
+                    if not completed and writer.offset:
+                        # Only bytes already on disk count toward a resume
+                        self._record_stream_state(url, output_path, writer.offset, total_size, validator)
+                part_file.close()
+                self.disk_ledger.release(temp_path)
+                self.transfer_stats[url]["bandwidth"] = download_limiter.snapshot()
+                self.transfer_stats[url]["memory"] = self.memory_budget.snapshot()
+                self.transfer_stats[url]["preallocated"] = part_file.preallocated
+                download_limiter.close()
+                await self._flush_sessions()
+
     @handle_errors(ErrorCategory.DOWNLOAD, ErrorSeverity.ERROR)    
     async def download_with_options(self, urls: List[str], options: Dict[str, Any]) -> List[str]:
         """
@@ -1152,7 +2015,15 @@ class AsyncDownloadManager:
         
         # Prepare download environment
         self._prepare_download_environment(options)
-        
+
+        # Skip media finished by an earlier run before anything is extracted
+        archived = self._archived(urls, options)
+        if archived:
+            Console().print(f"[dim]Skipping {len(archived)} already downloaded URL(s) (download archive)[/]")
+            urls = [url for url in urls if url not in archived]
+            if not urls:
+                return []
+
         # Process downloads
         return await self._process_downloads(urls, options)
     
@@ -1184,82 +2055,296 @@ class AsyncDownloadManager:
         ]):
             options['process_audio'] = True
     async def _process_downloads(self, urls: List[str], options: Dict[str, Any]) -> List[str]:
-        """Process all downloads with advanced scheduling and performance monitoring"""
-        # Check if advanced scheduler is available and should be used
-        if self.advanced_scheduler and len(urls) > 1:
+        """Process downloads on the batch engine.
+
+        Downloads asking for a ``priority`` or a ``deadline`` are queued on
+        the advanced scheduler instead; either way they run in the batch
+        engine's slots, so ``max_concurrent`` caps them all.
+        """
+        if self.advanced_scheduler and (options.get('priority') is not None or options.get('deadline')):
             return await self._process_downloads_with_scheduler(urls, options)
-        else:
-            return await self._process_downloads_sequentially(urls, options)
+        return await self._process_downloads_batch(urls, options)
     
     async def _process_downloads_with_scheduler(self, urls: List[str], options: Dict[str, Any]) -> List[str]:
-        """Process downloads using the advanced scheduler for optimal performance"""
+        """Process downloads through the advanced scheduler.
+
+        Playlists are expanded (skipping archived entries) before anything is
+        queued. The scheduler orders the entries by priority, runs them on
+        this manager (in batch engine slots), retries failures with backoff
+        and gives each download its share of the bandwidth.
+        """
+        scheduler = self.advanced_scheduler
+        if scheduler.executor is None:
+            scheduler.set_executor(self._run_scheduled_download)
+
         console = Console()
-        downloaded_files = []
-        
-        # Add downloads to scheduler queue
-        download_tasks = []
-        for url in urls:
-            task_id = await self.advanced_scheduler.add_download(
-                url=url,
-                options=options,
-                priority=options.get('priority', 5),  # Default priority
-                callback=self._download_progress_callback
-            )
-            download_tasks.append((task_id, url))
-            
-        console.print(f"[cyan]Added {len(download_tasks)} downloads to scheduler queue[/]")
-        
-        # Monitor progress
-        with console.status("[bold green]Processing downloads with scheduler...") as status:
-            completed = 0
-            while completed < len(download_tasks):
-                # Check scheduler status
-                scheduler_status = self.advanced_scheduler.get_status()
-                active_downloads = scheduler_status.get('active_downloads', 0)
-                queue_size = scheduler_status.get('queue_size', 0)
-                
-                status.update(f"[bold green]Active: {active_downloads}, Queued: {queue_size}, Completed: {completed}/{len(download_tasks)}[/]")
-                
-                # Check for completed downloads
-                for task_id, url in download_tasks:
-                    task_status = await self.advanced_scheduler.get_download_status(task_id)
-                    if task_status.get('status') == 'completed' and task_status.get('result'):
-                        downloaded_files.append(task_status['result'])
-                        completed += 1
-                    elif task_status.get('status') == 'failed':
-                        console.print(f"[bold red]Failed: {url}[/]")
-                        completed += 1
-                        
-                await asyncio.sleep(0.5)  # Brief pause
-                
+        progress = self._media_progress(console)
+        ydl_opts = self._setup_download_options(options)
+        priority = Priority.from_value(options.get('priority'))
+
+        infos: Dict[str, Dict[str, Any]] = {}
+        expander = self._playlist_expander(ydl_opts, options)
+        if expander is not None:
+            expanded = []
+            try:
+                async for entry in expander.expand(urls):
+                    if entry.error is not None:
+                        console.print(f"[bold red]Error downloading {entry.url}: {str(entry.error)}[/]")
+                        logging.error(f"Download error for {entry.url}: {str(entry.error)}")
+                        continue
+                    expanded.append(entry.url)
+                    if entry.info is not None:
+                        infos[entry.url] = entry.info
+            finally:
+                expander.close()
+            if expander.skipped:
+                console.print(f"[dim]Skipped {expander.skipped} playlist entries already downloaded (download archive)[/]")
+            urls = expanded
+
+        extractors = sizes = None
+        if scheduler.hosts.extractor_limits or scheduler.policy.uses_sizes:
+            with self.ydl_pool.checkout(ydl_opts) as ydl:
+                if scheduler.hosts.extractor_limits:
+                    # Read off the URLs (nothing is extracted) for the per-extractor caps
+                    extractors = {url: media[0] for url in urls if (media := resolve_media_id(ydl, url))}
+                if scheduler.policy.uses_sizes:
+                    sizes = self._cached_sizes(ydl, urls, infos)
+        download_ids = await scheduler.schedule_downloads(urls, options, priority, extractors=extractors,
+                                                          sizes=sizes, deadline=self._deadline(options))
+        for url, download_id in zip(urls, download_ids):
+            self._scheduled_context[download_id] = (ydl_opts, console, progress, infos.get(url))
+        console.print(f"[cyan]Added {len(download_ids)} downloads to scheduler queue[/]")
+        if not scheduler.is_running:
+            await scheduler.start()
+
+        try:
+            with progress:
+                # Each download is reported the moment it finishes
+                async for download in scheduler.as_completed(download_ids):
+                    if download.status == DownloadStatus.FAILED:
+                        console.print(f"[bold red]Failed: {download.url}[/] {download.error_message or ''}")
+                    elif download.status == DownloadStatus.CANCELLED:
+                        console.print(f"[yellow]Cancelled:[/] {download.url}")
+        finally:
+            for download_id in download_ids:
+                self._scheduled_context.pop(download_id, None)
+
+        # Report in input order
+        downloaded_files = [scheduler.downloads[i].result for i in download_ids if scheduler.downloads[i].result]
         self._report_download_results(downloaded_files, console)
         return downloaded_files
+
+    def _cached_sizes(self, ydl: Any, urls: List[str],
+                      infos: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, int]:
+        """Expected sizes of the URLs whose extracted info is known.
+
+        Info comes from ``infos`` (already extracted) or the info cache.
+        Formats picked in an earlier run give exact sizes; otherwise the
+        duration at the listed bitrate (1 Mbit/s if none) is close enough
+        to order downloads by.
+        """
+        sizes = {}
+        for url in urls:
+            info = (infos or {}).get(url) or self._load_cached_info(self._info_cache_key(ydl, url))
+            if not info:
+                continue
+            size = self._estimated_media_size(info) or int((info.get("duration") or 0) * (info.get("tbr") or 1000) * 125)
+            if size:
+                sizes[url] = size
+        return sizes
+
+    @staticmethod
+    def _deadline(options: Dict[str, Any]) -> Optional[datetime]:
+        """Wanted-by time from the ``deadline`` option (datetime or ISO string)"""
+        deadline = options.get("deadline")
+        if isinstance(deadline, str):
+            try:
+                return datetime.fromisoformat(deadline)
+            except ValueError:
+                logging.warning(f"Ignoring invalid deadline {deadline!r}")
+                return None
+        return deadline if isinstance(deadline, datetime) else None
+
+    def _report_throttled(self, url: str, error: BaseException) -> Optional[float]:
+        """Have the scheduler back off the host of ``url`` after a 429.
+
+        The origin's ``Retry-After`` is looked up on the HTTP error yt-dlp
+        wrapped; returns the backoff, or None without a scheduler.
+        """
+        if not self.advanced_scheduler:
+            return None
+        retry_after = None
+        exc: Optional[BaseException] = error.exc_info[1] if getattr(error, "exc_info", None) else error
+        for _ in range(5):  # DownloadError -> ExtractorError -> HTTPError
+            if exc is None:
+                break
+            headers = getattr(getattr(exc, "response", None), "headers", None)
+            if headers is not None:
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                break
+            exc = getattr(exc, "cause", None) or exc.__cause__
+        return self.advanced_scheduler.report_throttled(url, retry_after)
+
+    async def _run_scheduled_download(self, download: "ScheduledDownload") -> Optional[str]:
+        """Scheduler executor: download one scheduled URL and return the final file"""
+        scheduler = self.advanced_scheduler
+        context = self._scheduled_context.get(download.id)
+        if context is not None:
+            ydl_opts, console, progress, info = context
+        else:
+            # Scheduled directly on the scheduler rather than through a batch
+            ydl_opts, console, progress, info = self._setup_download_options(download.options), Console(), None, None
+        loop = asyncio.get_running_loop()
+
+        def on_progress(downloaded: int, total: Optional[int]) -> None:
+            # Called from yt-dlp's thread
+            loop.call_soon_threadsafe(scheduler.update_progress, download, downloaded, total)
+
+        # The slot is freed once the file is queued for processing, as in a batch
+        async with self.batch_engine.slot():
+            finishing = await self._fetch_single_file(
+                download.url, ydl_opts, download.options, console, progress, info,
+                bandwidth=scheduler.bandwidth_manager.get_limiter(download.id), on_progress=on_progress)
+        return await finishing if finishing is not None else None
     
-    async def _process_downloads_sequentially(self, urls: List[str], options: Dict[str, Any]) -> List[str]:
-        """Process downloads sequentially (fallback method)"""
+    async def download_leased(self, url: str, options: Dict[str, Any],
+                              on_progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Optional[str]:
+        """Distributed worker job runner: download one URL leased from a coordinator.
+
+        Returns the final file (None on failure); ``on_progress`` is called on
+        the event loop as bytes arrive.
+        """
+        loop = asyncio.get_running_loop()
+
+        def report(downloaded: int, total: Optional[int]) -> None:
+            # Called from yt-dlp's thread
+            if on_progress is not None:
+                loop.call_soon_threadsafe(on_progress, downloaded, total)
+
+        finishing = await self._fetch_single_file(
+            url, self._setup_download_options(options), options, Console(), on_progress=report)
+        return await finishing if finishing is not None else None
+
+    async def _process_downloads_batch(self, urls: List[str], options: Dict[str, Any]) -> List[str]:
+        """Process downloads concurrently, up to the ``max_concurrent`` limit.
+
+        Playlists are expanded into their entries as the batch runs, with the
+        next ``playlist_lookahead`` entries extracted while earlier ones
+        download (0 hands the URLs to yt-dlp as they are). Each download
+        also waits for the scheduler's per-host limits and 429 backoff.
+        """
         ydl_opts = self._setup_download_options(options)
-        downloaded_files = []
         console = Console()
-
+        progress = self._media_progress(console)
         total = len(urls)
-        for idx, url in enumerate(urls, 1):
-            try:
-                if total > 1:
-                    console.print(f"\n[bold cyan][{idx}/{total}][/] {url}")
-                else:
-                    console.print(f"[cyan]Downloading:[/] {url}")
-
-                file_path = await self._download_single_file(url, ydl_opts, options, console)
+        started = [0]
+
+        expander = self._playlist_expander(ydl_opts, options)
+        source: Any = urls if expander is None else expander.expand(urls)
+
+        async def download_one(item: Any) -> Optional[str]:
+            started[0] += 1
+            url, info = item, None
+            if isinstance(item, PlaylistEntry):
+                if item.error is not None:
+                    raise item.error
+                url, info = item.url, item.info
+            if total > 1 or getattr(item, "playlist", None):
+                position = f"{started[0]}/{total}" if expander is None else str(started[0])
+                console.print(f"\n[bold cyan][{position}][/] {url}")
+            else:
+                console.print(f"[cyan]Downloading:[/] {url}")
+            # Frees the download slot once the file is queued for processing
+            async with self._host_slot(url, ydl_opts, info) as host:
+                finishing = await self._fetch_single_file(url, ydl_opts, options, console, progress, info,
+                                                          on_progress=self._autotune_progress())
+            if self.advanced_scheduler:
+                self.advanced_scheduler.record_transfer(ok=finishing is not None)
+            if finishing is not None and host is not None:
+                self.advanced_scheduler.hosts.succeeded(host)
+            return finishing
+
+        def report(result: BatchResult) -> None:
+            if result.error is not None:
+                console.print(f"[bold red]Error downloading {result.url}: {str(result.error)}[/]")
+                logging.error(f"Download error for {result.url}: {str(result.error)}")
+            elif result.status == "cancelled":
+                console.print(f"[yellow]Cancelled:[/] {result.url}")
 
-                if file_path:
-                    downloaded_files.append(file_path)
-            except Exception as e:
-                console.print(f"[bold red]Error downloading {url}: {str(e)}[/]")
-                logging.error(f"Download error for {url}: {str(e)}")
+        try:
+            with progress:
+                results = await self.batch_engine.run(source, download_one, on_result=report,
+                                                      is_success=lambda task: task is not None)
+                # Downloads are done; wait for processing still running on their files
+                finished = await asyncio.gather(*(r.result for r in results if r.ok), return_exceptions=True)
+        finally:
+            if expander is not None:
+                expander.close()
+        if expander is not None and expander.skipped:
+            console.print(f"[dim]Skipped {expander.skipped} playlist entries already downloaded (download archive)[/]")
 
+        # Report in input order, whatever order the downloads finished in
+        downloaded_files = [path for path in finished if isinstance(path, str)]
         self._report_download_results(downloaded_files, console)
         return downloaded_files
-    
+
+    def _host_slot(self, url: str, ydl_opts: Dict[str, Any], info: Optional[Dict[str, Any]] = None) -> Any:
+        """Hold a batch download to the scheduler's per-host and per-extractor
+        limits, spacing and 429 backoff; yields the host (None without a scheduler)"""
+        scheduler = self.advanced_scheduler
+        if not scheduler:
+            return nullcontext()
+        extractor = None
+        if scheduler.hosts.extractor_limits:
+            extractor = (info or {}).get("extractor_key")
+            if not extractor:
+                # Read off the URL (nothing is extracted)
+                with self.ydl_pool.checkout(ydl_opts) as ydl:
+                    media = resolve_media_id(ydl, url)
+                extractor = media[0] if media else None
+        return scheduler.host_gate.slot(url, extractor)
+
+    def _autotune_progress(self) -> Optional[Callable[[int, Optional[int]], None]]:
+        """Progress callback feeding one batch download's bytes and time to
+        first byte to the scheduler's autotuner (None when not tuning)"""
+        scheduler = self.advanced_scheduler
+        if not scheduler or scheduler.autotuner is None:
+            return None
+        loop = asyncio.get_running_loop()
+        started: Optional[float] = time.monotonic()
+        seen = 0
+
+        def record(downloaded: int) -> None:
+            nonlocal started, seen
+            first_byte = None
+            if downloaded and started is not None:
+                first_byte, started = time.monotonic() - started, None
+            scheduler.record_transfer(downloaded - seen, first_byte)
+            seen = downloaded
+
+        def on_progress(downloaded: int, total: Optional[int]) -> None:
+            # Called from yt-dlp's thread
+            loop.call_soon_threadsafe(record, downloaded)
+
+        return on_progress
+
+    def _playlist_expander(self, ydl_opts: Dict[str, Any], options: Dict[str, Any]) -> Optional[PlaylistExpander]:
+        """Expander turning playlists into their entries, or None with ``playlist_lookahead`` 0.
+
+        Entries in the download archive are skipped unless ``ignore_archive``
+        is set, and extracted info goes through the info cache.
+        """
+        lookahead = self.config.get("playlist_lookahead", 3)
+        if lookahead <= 0:
+            return None
+        archive = None if options.get("ignore_archive") else self.download_archive
+        return PlaylistExpander(
+            self.ydl_pool, ydl_opts, lookahead, extraction_pool=self.extraction_pool,
+            skip=archive.has_entry if archive is not None else None,
+            lookup=lambda ydl, url: self._load_cached_info(self._info_cache_key(ydl, url)),
+            store=lambda ydl, url, info: self._store_info(ydl, self._info_cache_key(ydl, url), info),
+        )
+
     async def _download_progress_callback(self, task_id: str, progress_data: Dict[str, Any]) -> None:
         """Callback for download progress updates from scheduler"""
         if self.performance_monitor:
@@ -1285,24 +2370,69 @@ class AsyncDownloadManager:
                     pass
                 console.print(f"  [dim]{os.path.basename(fp)}{size_str}[/]")
     
-    async def _download_single_file(self, url: str, ydl_opts: Dict[str, Any], options: Dict[str, Any], console: Console) -> Optional[str]:
+    async def _download_single_file(self, url: str, ydl_opts: Dict[str, Any], options: Dict[str, Any], console: Console,
+                                    progress: Optional[Progress] = None,
+                                    info: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """Download a single file with all processing options"""
+        finishing = await self._fetch_single_file(url, ydl_opts, options, console, progress, info)
+        return await finishing if finishing is not None else None
+
+    async def _fetch_single_file(self, url: str, ydl_opts: Dict[str, Any], options: Dict[str, Any], console: Console,
+                                 progress: Optional[Progress] = None,
+                                 info: Optional[Dict[str, Any]] = None,
+                                 bandwidth: Optional[BandwidthLimiter] = None,
+                                 on_progress: Optional[Callable[[int, Optional[int]], None]] = None
+                                 ) -> Optional["asyncio.Task[str]"]:
+        """Download a file and hand it to post-processing.
+
+        Returns as soon as the file is queued for processing (waiting only if
+        the processing queue is full) with a task resolving to the final path,
+        or None if the download failed. ``bandwidth`` and ``on_progress`` are
+        passed on to ``_download_single_url``.
+        """
         # Try P2P download first if enabled
         file_path = await self._try_p2p_download(url, options, console)
+        traditional = not file_path
           # Fall back to traditional download if P2P failed
-        if not file_path:
+        if traditional:
             console.print("[blue]Using traditional download method[/]")
-            file_path = await self._download_single_url(url, ydl_opts, console, options)
-            
-            # Apply audio processing for traditional downloads
-            if file_path and self._needs_audio_processing(options):
-                console.print(f"[yellow]Processing audio for:[/] {file_path}")
-                await self._process_audio_async(file_path, options)
-        
+            file_path = await self._download_single_url(url, ydl_opts, console, options, progress, info,
+                                                        bandwidth=bandwidth, on_progress=on_progress)
+        if not file_path:
+            return None
+
+        processing = None
+        # Audio processing applies to traditional downloads only
+        process_audio = traditional and self._needs_audio_processing(options)
+        if process_audio or self._should_upscale_video(options, file_path):
+            processing = await self.postprocess_pool.submit(
+                lambda: self._post_process(file_path, options, console, process_audio))
+        return asyncio.ensure_future(self._finish_download(file_path, processing, options, console))
+
+    async def _post_process(self, file_path: str, options: Dict[str, Any], console: Console,
+                            process_audio: bool) -> str:
+        """CPU-heavy processing of a finished download (runs in the post-processing pool)"""
+        # Check if upscaling is requested and applicable
+        if self._should_upscale_video(options, file_path):
+            upscaled_file = await self._apply_video_upscaling(file_path, options, console)
+            if upscaled_file:
+                file_path = upscaled_file
+        if process_audio:
+            console.print(f"[yellow]Processing audio for:[/] {file_path}")
+            await self._process_audio_async(file_path, options)
+        return file_path
+
+    async def _finish_download(self, file_path: str, processing: Optional["asyncio.Future[str]"],
+                               options: Dict[str, Any], console: Console) -> str:
+        """Wait for post-processing, then share the final file if requested"""
+        if processing is not None:
+            try:
+                file_path = await processing or file_path
+            except Exception as e:
+                console.print(f"[red]Post-processing failed for {os.path.basename(file_path)}:[/] {e}")
+
         # Handle P2P sharing if requested
-        if file_path:
-            await self._handle_p2p_sharing(file_path, options, console)
-        
+        await self._handle_p2p_sharing(file_path, options, console)
         return file_path
     
     async def _try_p2p_download(self, url: str, options: Dict[str, Any], console: Console) -> Optional[str]:
@@ -1420,6 +2550,11 @@ class AsyncDownloadManager:
             "quiet": options.get("quiet", False),
         })
 
+        # yt-dlp's own read loop enforces the per-download cap smoothly; the
+        # shared hierarchy is applied on top through the progress hook
+        if self.config.get("per_download_bandwidth_limit"):
+            ydl_opts["ratelimit"] = self.config["per_download_bandwidth_limit"]
+
         # Configure format-specific options
         self._configure_format_options(ydl_opts, options)
 
@@ -1523,36 +2658,70 @@ class AsyncDownloadManager:
             else:
                 ydl_opts["format"] = DEFAULT_VIDEO_FORMAT
     
-    async def _download_single_url(self, url: str, ydl_opts: Dict[str, Any], console: Console, options: Dict[str, Any]) -> Optional[str]:
-        """Download a single URL with the given options."""
+    def _media_progress(self, console: Console, transient: bool = True) -> Progress:
+        """Progress display for yt-dlp downloads (one task per download)"""
+        return Progress(
+            SpinnerColumn(),
+            TextColumn("[bold blue]{task.description}"),
+            BarColumn(bar_width=30),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TextColumn("•"),
+            TransferSpeedColumn(),
+            TextColumn("•"),
+            TimeElapsedColumn(),
+            console=console,
+            transient=transient,
+        )
+
+    async def _download_single_url(self, url: str, ydl_opts: Dict[str, Any], console: Console,
+                                   options: Dict[str, Any], progress: Optional[Progress] = None,
+                                   info: Optional[Dict[str, Any]] = None,
+                                   bandwidth: Optional[BandwidthLimiter] = None,
+                                   on_progress: Optional[Callable[[int, Optional[int]], None]] = None) -> Optional[str]:
+        """Download a single URL with the given options.
+
+        yt-dlp runs in a worker thread so several downloads can share the loop;
+        pass a started ``progress`` to draw into a display shared by a batch,
+        and ``info`` when the URL was already extracted (playlist lookahead).
+        ``bandwidth`` is the limiter node to throttle under (the global one by
+        default) and ``on_progress(downloaded, total)`` is called from yt-dlp's
+        thread as bytes arrive.
+        """
+        parent_limiter = bandwidth or self.bandwidth_limiter
+        limiter = parent_limiter.child(self.config.get("per_download_bandwidth_limit", 0), name=url)
+        disk_key = None
+        # Set when the awaiting task is cancelled; the hook then aborts yt-dlp
+        cancelled = threading.Event()
+        own_progress = progress is None
+        if own_progress:
+            progress = self._media_progress(console)
+        _task_id = [None]
         try:
             import yt_dlp
 
-            # Use Rich progress bar instead of flooding console with print statements
-            progress = Progress(
-                SpinnerColumn(),
-                TextColumn("[bold blue]{task.description}"),
-                BarColumn(bar_width=30),
-                TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-                TextColumn("•"),
-                TransferSpeedColumn(),
-                TextColumn("•"),
-                TimeElapsedColumn(),
-                console=console,
-                transient=True,
-            )
-
-            _task_id = [None]
+            _seen_bytes: Dict[str, int] = {}
 
             def progress_hook(d):
+                if cancelled.is_set():
+                    raise yt_dlp.utils.DownloadCancelled(f"Download of {url} was cancelled")
                 if d['status'] == 'downloading':
                     total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
                     downloaded = d.get('downloaded_bytes', 0)
 
+                    # Hooks run inside yt-dlp's read loop: blocking here throttles it
+                    key = d.get('filename', '')
+                    delta = downloaded - _seen_bytes.get(key, 0)
+                    _seen_bytes[key] = downloaded
+                    if delta > 0 and limiter.is_limited:
+                        limiter.acquire_sync(delta)
+
                     if _task_id[0] is None and total > 0:
-                        _task_id[0] = progress.add_task("Downloading", total=total)
+                        name = os.path.basename(key) if not own_progress else "Downloading"
+                        _task_id[0] = progress.add_task(name[:40] or "Downloading", total=total)
                     if _task_id[0] is not None:
                         progress.update(_task_id[0], completed=downloaded)
+                    if on_progress is not None:
+                        on_progress(downloaded, total or None)
 
                 elif d['status'] == 'finished':
                     if _task_id[0] is not None:
@@ -1560,15 +2729,45 @@ class AsyncDownloadManager:
                     filename = os.path.basename(d.get('filename', 'unknown'))
                     console.print(f"[green]Download completed:[/] {filename}")
 
-            ydl_opts["progress_hooks"] = [progress_hook]
+            # Per-download copy: the batch shares one options dict between workers
+            ydl_opts = {**ydl_opts, "progress_hooks": [progress_hook]}
+            if "concurrent_fragment_downloads" in ydl_opts:
+                # Read per download: the scheduler's autotuner may have moved it
+                ydl_opts["concurrent_fragment_downloads"] = self.config.get(
+                    "concurrent_fragment_downloads", ydl_opts["concurrent_fragment_downloads"])
+            loop = asyncio.get_running_loop()
 
-            with progress:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            async def in_thread(call: Callable[[], Any]) -> Any:
+                future = loop.run_in_executor(None, call)
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # A thread cannot be interrupted: make the next hook call
+                    # abort it, and keep the YoutubeDL checked out until it has
+                    cancelled.set()
+                    await asyncio.gather(future, return_exceptions=True)
+                    raise
+
+            with progress if own_progress else nullcontext():
+                with self.ydl_pool.checkout(ydl_opts) as ydl:
                     try:
-                        # Extract info first to get filename and validate URL
-                        info = ydl.extract_info(url, download=False)
+                        # Extract info first to get filename and validate URL; a
+                        # cached or prefetched extraction skips the extractor entirely
+                        cache_key = self._info_cache_key(ydl, url)
+                        if info is None:
+                            info = self._load_cached_info(cache_key)
+                        from_cache = info is not None
+                        if not from_cache and self.extraction_pool is not None:
+                            # Extraction is CPU-bound: worker processes scale past the GIL
+                            info = await self.extraction_pool.extract(url, ydl_opts)
+                            if is_playlist(info):
+                                info = None
+                        if not from_cache and not info:
+                            info = await in_thread(lambda: ydl.extract_info(url, download=False))
                         if not info:
                             raise DownloadError("Failed to extract media information. The URL may be invalid or unsupported.")
+                        if not from_cache:
+                            self._store_info(ydl, cache_key, info)
 
                         title = info.get('title', 'Unknown')
                         console.print(f"[cyan]Title:[/] {title}")
@@ -1577,11 +2776,30 @@ class AsyncDownloadManager:
                         fmt = info.get('format', info.get('format_id', 'N/A'))
                         console.print(f"[dim]Format: {fmt}[/]")
 
-                        # Download the media
-                        ydl.download([url])
+                        # Refuse media the volume cannot hold next to active downloads
+                        disk_key = ydl.prepare_filename(info)
+                        try:
+                            await self._reserve_disk_space(disk_key, disk_key, self._estimated_media_size(info))
+                        except InsufficientDiskSpaceError as e:
+                            console.print(f"[red]Not enough disk space:[/] {e}")
+                            return None
+
+                        # Download from the extracted info: the extractor does not run again
+                        try:
+                            extracted = info
+                            info = await in_thread(lambda: ydl.process_ie_result(extracted, download=True)) or info
+                        except yt_dlp.utils.DownloadError:
+                            if not from_cache:
+                                raise
+                            # Cached or prefetched media URLs may have expired: extract afresh once
+                            logging.info(f"Cached info for {url} is stale, extracting again")
+                            self.download_cache.invalidate(cache_key)
+                            info = await in_thread(lambda: ydl.extract_info(url, download=True))
+                            self._store_info(ydl, cache_key, info)
 
                         # Get the downloaded filename
                         downloaded_file = ydl.prepare_filename(info)
+                        self._archive_download(info, url)
 
                         # For audio extractions, the extension may have changed
                         if options.get("audio_only"):
@@ -1590,14 +2808,12 @@ class AsyncDownloadManager:
                             if os.path.exists(alt_path):
                                 downloaded_file = alt_path
 
-                        # Check if upscaling is requested and applicable
-                        if self._should_upscale_video(options, downloaded_file):
-                            upscaled_file = await self._apply_video_upscaling(downloaded_file, options, console)
-                            if upscaled_file:
-                                return upscaled_file
-
                         return downloaded_file
 
+                    except yt_dlp.utils.DownloadCancelled:
+                        console.print(f"[yellow]Download cancelled:[/] {url}")
+                        return None
+
                     except yt_dlp.utils.DownloadError as e:
                         error_msg = str(e)
                         # Provide user-friendly error messages for common failures
@@ -1607,6 +2823,10 @@ class AsyncDownloadManager:
                             console.print(f"[red]Video unavailable:[/] It may be private, deleted, or region-locked")
                         elif "HTTP Error 403" in error_msg:
                             console.print(f"[red]Access denied:[/] The content requires authentication or is geo-restricted")
+                        elif "HTTP Error 429" in error_msg:
+                            backoff = self._report_throttled(url, e)
+                            console.print(f"[red]Rate limited:[/] The site is throttling downloads"
+                                          + (f", backing off for {backoff:.0f}s" if backoff else ""))
                         elif "format" in error_msg.lower():
                             console.print(f"[red]Format error:[/] The requested quality may not be available. Try without --resolution")
                         else:
@@ -1633,6 +2853,50 @@ class AsyncDownloadManager:
             )
             console.print(f"[red]Error downloading {url}:[/] {str(e)}")
             return None
+        finally:
+            limiter.close()
+            if disk_key:
+                self.disk_ledger.release(disk_key)
+            if not own_progress and _task_id[0] is not None:
+                progress.remove_task(_task_id[0])
+
+    @staticmethod
+    def _info_cache_key(ydl: Any, url: str) -> str:
+        """Cache key for a URL's extracted info.
+
+        The extractor and media id are read off the URL where possible, so
+        different URLs for the same media share one entry; other URLs are
+        keyed by their normalized form.
+        """
+        media = resolve_media_id(ydl, url)
+        canonical = f"{media[0]}:{media[1]}" if media else canonical_url(url)
+        return hashlib.sha256(f"info:{canonical}".encode()).hexdigest()
+
+    def _load_cached_info(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Extracted info cached by an earlier run, if still fresh"""
+        if not self.config.get("info_cache_ttl", 1800):
+            return None
+        cached = self.download_cache.get(cache_key)
+        if not isinstance(cached, dict) or not isinstance(cached.get("info"), dict):
+            return None
+        # yt-dlp annotates the dict while processing it; keep the cached copy pristine
+        return copy.deepcopy(cached["info"])
+
+    def _store_info(self, ydl: Any, cache_key: str, info: Optional[Dict[str, Any]]) -> None:
+        """Cache extracted info for retries and re-runs (media URLs expire, hence the TTL)"""
+        ttl = self.config.get("info_cache_ttl", 1800)
+        if not ttl or not info:
+            return
+        try:
+            self.download_cache.set(cache_key, {"info": ydl.sanitize_info(info)}, ttl=ttl)
+        except Exception as e:
+            logging.debug(f"Could not cache extracted info: {e}")
+
+    @staticmethod
+    def _estimated_media_size(info: Dict[str, Any]) -> int:
+        """Expected bytes on disk for extracted media (0 if yt-dlp does not know)"""
+        formats = info.get("requested_formats") or [info]
+        return sum(int(f.get("filesize") or f.get("filesize_approx") or 0) for f in formats)
 
     async def start_p2p_server(self) -> bool:
         """Start P2P server for peer-to-peer downloads"""
@@ -1858,10 +3122,16 @@ class AsyncDownloadManager:
                 logging.error(f"Failed to initialize performance monitor: {e}")
                 self.performance_monitor = None
             
-        # Initialize advanced scheduler if not already provided        if not self.advanced_scheduler:
+        # Initialize advanced scheduler if not already provided
+        if not self.advanced_scheduler:
             try:
                 from .advanced_scheduler import AdvancedScheduler
-                self.advanced_scheduler = AdvancedScheduler(self.config)
+                # Scheduled downloads run on this manager, under its global bandwidth cap
+                self.advanced_scheduler = AdvancedScheduler(self.config, self._run_scheduled_download,
+                                                            self.bandwidth_limiter,
+                                                            performance_monitor=self.performance_monitor)
+                # One limit for batches and scheduled downloads, whoever changes it
+                self.advanced_scheduler.on_concurrency_change(self.batch_engine.set_limit)
                 logging.info("Advanced scheduler system initialized")
             except ImportError:
                 logging.warning("Advanced scheduler not available")
@@ -1929,6 +3199,7 @@ class AsyncDownloadManager:
                 current_concurrent = self.config.get("max_concurrent", 3)
                 new_concurrent = max(1, current_concurrent - 1)
                 self.config["max_concurrent"] = new_concurrent
+                self.advanced_scheduler.set_concurrency(new_concurrent)
                 optimizations_applied.append(f"Reduced concurrent downloads to {new_concurrent}")
                 
         # Apply memory optimization
@@ -0,0 +1,205 @@
+"""
+Playlist Expansion for Snatch Media Downloader
+
+Turns URLs into a lazy stream of ready-to-download info dicts. Playlists and
+channels are read with yt-dlp's flat extraction (``process=False``), which
+lists entries page by page without resolving them; full extraction of the
+next ``lookahead`` entries then runs in a background executor, so resolving
+item N+1 overlaps with downloading item N instead of every download waiting
+on its own extraction.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (Any, AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Optional, Set, Tuple)
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_TYPES = ("playlist", "multi_video")
+REFERENCE_TYPES = ("url", "url_transparent")
+
+# An entry still to resolve and the playlist fields it inherits
+Stub = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+@dataclass
+class PlaylistEntry:
+    """One media item produced by the expander"""
+    url: str
+    info: Optional[Dict[str, Any]] = None
+    error: Optional[BaseException] = None
+    playlist: Optional[str] = None
+    playlist_index: Optional[int] = None
+
+
+def iter_entries(entries: Any, page_size: int = 50) -> Iterator[Any]:
+    """Iterate playlist entries lazily, whatever container the extractor used.
+
+    Extractors return lists, generators or yt-dlp ``PagedList`` objects; the
+    latter are fetched one page at a time instead of all up front.
+    """
+    if entries is None:
+        return
+    if hasattr(entries, "getslice"):
+        size = getattr(entries, "_pagesize", None) or page_size
+        start = 0
+        while True:
+            page = entries.getslice(start, start + size)
+            if not page:
+                return
+            yield from page
+            if len(page) < size:
+                return
+            start += len(page)
+    else:
+        yield from entries
+
+
+class PlaylistExpander:
+    """Streams ready info dicts for URLs, resolving entries ahead of the consumer.
+
+    ``lookup(ydl, url)`` and ``store(ydl, url, info)`` let the caller plug in
+    its extraction cache, and an ``extraction_pool`` moves full extraction
+    into worker processes. Flat entries for which ``skip(entry)`` is true
+    (already downloaded, say) are dropped before anything is extracted.
+    Entries of nested playlists (a channel's tabs, say) are queued as they
+    are discovered.
+    """
+
+    def __init__(self, ydl_pool: Any, ydl_opts: Dict[str, Any], lookahead: int = 3,
+                 lookup: Optional[Callable[[Any, str], Optional[Dict[str, Any]]]] = None,
+                 store: Optional[Callable[[Any, str, Dict[str, Any]], None]] = None,
+                 extraction_pool: Any = None,
+                 skip: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.ydl_pool = ydl_pool
+        self.ydl_opts = ydl_opts
+        self.extraction_pool = extraction_pool
+        self.skip = skip
+        self.skipped = 0
+        self.lookahead = max(1, int(lookahead))
+        self.lookup = lookup
+        self.store = store
+        self._resolver = ThreadPoolExecutor(max_workers=self.lookahead, thread_name_prefix="snatch-extract")
+        # Paging through a playlist is sequential; one thread keeps it off the loop
+        self._pager = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snatch-playlist")
+        self._seen_playlists: Set[str] = set()
+
+    @staticmethod
+    def _entry_url(entry: Dict[str, Any]) -> str:
+        return entry.get("webpage_url") or entry.get("original_url") or entry.get("url") or entry.get("id") or ""
+
+    def _walk(self, playlist: Dict[str, Any], release: Optional[Callable[[], None]]) -> Iterator[Stub]:
+        """Flat entries of ``playlist``; ``release`` returns the instance paging it."""
+        title = playlist.get("title") or playlist.get("id")
+        try:
+            for index, entry in enumerate(iter_entries(playlist.get("entries")), 1):
+                if entry:
+                    yield entry, {"playlist": title, "playlist_id": playlist.get("id"),
+                                  "playlist_title": playlist.get("title"), "playlist_index": index}
+        finally:
+            if release is not None:
+                release()
+
+    def _resolve(self, stub: Stub) -> Tuple[str, Any]:
+        """Fully extract one entry (worker thread).
+
+        Returns ``("video", info)`` or ``("playlist", iterator of stubs)``. A
+        playlist keeps its YoutubeDL checked out until its entries have been
+        read, since lazy entry lists page through the extractor that made them.
+        """
+        entry, extra = stub
+        checkout = self.ydl_pool.checkout(self.ydl_opts)
+        ydl = checkout.__enter__()
+        handed_over = False
+        try:
+            result = entry
+            if entry.get("_type", "video") in REFERENCE_TYPES:
+                url = entry["url"]
+                if self.lookup is not None:
+                    cached = self.lookup(ydl, url)
+                    if cached is not None:
+                        cached.update({k: v for k, v in extra.items() if v is not None})
+                        return "video", cached
+                if self.extraction_pool is not None:
+                    info = self.extraction_pool.extract_sync(url, self.ydl_opts)
+                    if info and info.get("_type") not in PLAYLIST_TYPES:
+                        info.update({k: v for k, v in extra.items() if v is not None})
+                        if self.store is not None:
+                            self.store(ydl, url, info)
+                        return "video", info
+                # Playlists are always listed in-process: lazy entries cannot leave a worker
+                result = ydl.extract_info(url, ie_key=entry.get("ie_key"), download=False, process=False)
+                if not result:
+                    raise ValueError(f"No media information for {url}")
+            if result.get("_type") in PLAYLIST_TYPES:
+                key = result.get("webpage_url") or result.get("id") or ""
+                if key and key in self._seen_playlists:
+                    return "playlist", iter(())
+                self._seen_playlists.add(key)
+                handed_over = True
+                return "playlist", self._walk(result, lambda: checkout.__exit__(None, None, None))
+            info = ydl.process_ie_result(result, download=False, extra_info=extra)
+            if self.store is not None and entry.get("_type") in REFERENCE_TYPES:
+                self.store(ydl, entry["url"], info)
+            return "video", info
+        except BaseException as e:
+            checkout.__exit__(type(e), e, e.__traceback__)
+            handed_over = True
+            raise
+        finally:
+            if not handed_over:
+                checkout.__exit__(None, None, None)
+
+    async def expand(self, urls: Iterable[str]) -> AsyncIterator[PlaylistEntry]:
+        """Yield one entry per media item, in discovery order.
+
+        Up to ``lookahead`` entries are being extracted while the consumer
+        works on the ones already yielded. Entries that fail to extract are
+        yielded with ``error`` set instead of stopping the stream.
+        """
+        loop = asyncio.get_running_loop()
+        end = object()
+        sources: List[Iterator[Stub]] = [(({"_type": "url", "url": url}, {}) for url in urls)]
+        pending: Deque[Tuple[Stub, asyncio.Future]] = deque()
+        try:
+            while True:
+                while len(pending) < self.lookahead and sources:
+                    stub = await loop.run_in_executor(self._pager, next, sources[-1], end)
+                    if stub is end:
+                        sources.pop()
+                        continue
+                    if self.skip is not None and stub[1] and self.skip(stub[0]):
+                        self.skipped += 1
+                        continue
+                    pending.append((stub, loop.run_in_executor(self._resolver, self._resolve, stub)))
+                if not pending:
+                    return
+                (entry, extra), future = pending.popleft()
+                try:
+                    kind, result = await future
+                except Exception as e:
+                    logger.debug(f"Extraction failed for {self._entry_url(entry)}: {e}")
+                    yield PlaylistEntry(self._entry_url(entry), error=e, playlist=extra.get("playlist"),
+                                        playlist_index=extra.get("playlist_index"))
+                    continue
+                if kind == "playlist":
+                    sources.append(result)
+                    continue
+                yield PlaylistEntry(self._entry_url(result) or self._entry_url(entry), info=result,
+                                    playlist=extra.get("playlist"), playlist_index=extra.get("playlist_index"))
+        finally:
+            for _, future in pending:
+                future.cancel()
+            for source in sources:
+                close = getattr(source, "close", None)
+                if close is not None:
+                    await loop.run_in_executor(self._pager, close)
+
+    def close(self) -> None:
+        """Stop the executors; extractions already running finish in the background."""
+        self._resolver.shutdown(wait=False, cancel_futures=True)
+        self._pager.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,335 @@
+"""
+Per-host Politeness for Snatch Media Downloader
+
+Keeps one big crawl from taking every download slot and tripping an
+origin's rate limiting. Queued downloads are kept in one priority heap per
+host, and the hosts' best entries in a heap of their own; dispatch takes
+turns among hosts of equal rank, parking any host that is at its
+concurrency cap (or whose extractor is), still inside its minimum spacing
+between starts, or backing off after HTTP 429 responses until that clears.
+Downloads that are not queued here (the plain batch path) are held to the
+same caps, spacing and backoff by a ``HostGate``.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Ready entries as the scheduler builds them: (policy rank, submitted, seq, download)
+Entry = Tuple[Any, float, int, Any]
+
+
+def host_of(url: str) -> str:
+    """Politeness key of a URL: its lowercase host without ``www.``"""
+    try:
+        host = (urlparse(url).hostname or "").lower()
+    except ValueError:
+        host = ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delay or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+@dataclass
+class HostState:
+    """Queue and politeness state of one host"""
+    name: str
+    ready: List[Entry] = field(default_factory=list)
+    active: int = 0
+    next_start: float = 0.0  # earliest start allowed by the spacing
+    backoff_until: float = 0.0
+    throttles: int = 0  # 429s since the last success
+    # Where the host waits for dispatch: "" (no work), "heads", "waiting"
+    # (spacing or backoff), "host_cap" or "extractor_cap"
+    where: str = ""
+    turn: int = -1  # its place among hosts of equal rank
+    parked_on: str = ""  # the extractor it waits for, under "extractor_cap"
+
+
+class HostQueues:
+    """Per-host ready heaps with round-robin, politeness-aware dispatch.
+
+    ``per_host`` caps simultaneous downloads per host (``host_limits``
+    overrides it per host, 0 = no cap); ``extractor_limits`` caps downloads
+    per yt-dlp extractor across hosts. ``min_interval`` (or a per-host value
+    in ``host_intervals``) is the minimum time between two starts on a host.
+    Within the best rank present, hosts take turns. ``pop`` is amortized
+    O(log n): a blocked host leaves the heap of host heads until its cap
+    frees or its spacing/backoff runs out. An idle host's state, throttle
+    count included, is kept until its spacing and backoff have run out,
+    then dropped on a later ``pop``.
+    """
+
+    def __init__(self, per_host: int = 0, host_limits: Optional[Dict[str, int]] = None,
+                 extractor_limits: Optional[Dict[str, int]] = None, min_interval: float = 0.0,
+                 host_intervals: Optional[Dict[str, float]] = None,
+                 backoff_base: float = 30.0, backoff_max: float = 900.0):
+        self.per_host = per_host
+        self.host_limits = {host_of(f"//{h}") or h: n for h, n in (host_limits or {}).items()}
+        self.extractor_limits = {k.lower(): n for k, n in (extractor_limits or {}).items()}
+        self.min_interval = min_interval
+        self.host_intervals = {host_of(f"//{h}") or h: s for h, s in (host_intervals or {}).items()}
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hosts: Dict[str, HostState] = {}
+        self.extractor_active: Dict[str, int] = {}
+        self._heads: List[Tuple[Any, int, str]] = []  # (head rank, turn, host)
+        self._waiting: List[Tuple[float, int, str]] = []  # (eligible at, turn, host)
+        self._host_capped: Set[str] = set()
+        self._extractor_capped: Dict[str, Set[str]] = {}
+        self._turns = itertools.count()
+        self._lingering: Set[str] = set()  # idle hosts still spacing or backing off
+        # Called whenever a running download finishes and may free a cap
+        self.listeners: List[Callable[[], None]] = []
+        self._size = 0
+        # When a host blocked only by spacing or backoff becomes eligible
+        self.next_wakeup: Optional[float] = None
+
+    def __len__(self) -> int:
+        """Entries held, including ones the scheduler has since dropped"""
+        return self._size
+
+    def _state(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(host)
+        return state
+
+    def push(self, host: str, entry: Entry) -> None:
+        state = self._state(host)
+        heapq.heappush(state.ready, entry)
+        self._size += 1
+        if not state.where:
+            self._schedule(state, next(self._turns))
+        elif state.ready[0] is entry:
+            if state.where == "heads":
+                heapq.heappush(self._heads, (entry[0], state.turn, host))  # the older item goes stale
+            elif state.where == "extractor_cap":
+                # The new head may use another extractor
+                self._extractor_capped[state.parked_on].discard(host)
+                self._schedule(state, state.turn)
+
+    def _schedule(self, state: HostState, turn: int) -> None:
+        """Put a host with work on the heads heap"""
+        state.where = "heads"
+        state.turn = turn
+        heapq.heappush(self._heads, (state.ready[0][0], turn, state.name))
+
+    def _park(self, state: HostState, extractor: Optional[str], eligible_at: float) -> None:
+        """Hold a blocked host off the heads heap until it may start again"""
+        limit = self._limit(state.name)
+        if eligible_at != float("inf"):
+            state.where = "waiting"
+            heapq.heappush(self._waiting, (eligible_at, state.turn, state.name))
+        elif limit and state.active >= limit:
+            state.where = "host_cap"
+            self._host_capped.add(state.name)
+        else:
+            state.where = "extractor_cap"
+            state.parked_on = extractor.lower()
+            self._extractor_capped.setdefault(state.parked_on, set()).add(state.name)
+
+    def _unpark(self, host: str) -> None:
+        state = self.hosts.get(host)
+        if state is None or state.where not in ("host_cap", "extractor_cap"):
+            return
+        if state.ready:
+            self._schedule(state, state.turn)
+        else:
+            state.where = ""
+
+    def _limit(self, host: str) -> int:
+        return self.host_limits.get(host, self.per_host)
+
+    def _eligible_at(self, state: HostState, extractor: Optional[str], now: float) -> float:
+        """When the host's next download may start (inf while at a cap)"""
+        limit = self._limit(state.name)
+        if limit and state.active >= limit:
+            return float("inf")
+        if extractor:
+            cap = self.extractor_limits.get(extractor.lower(), 0)
+            if cap and self.extractor_active.get(extractor.lower(), 0) >= cap:
+                return float("inf")
+        return max(state.next_start, state.backoff_until)
+
+    def eligible_at(self, host: str, extractor: Optional[str] = None) -> float:
+        """When a download on ``host`` may start outside the queue (inf while at a cap)"""
+        state = self.hosts.get(host) or HostState(host)
+        return self._eligible_at(state, extractor, time.time())
+
+    def pop(self, is_live: Callable[[Entry], bool], now: Optional[float] = None) -> Optional[Entry]:
+        """Next entry allowed to start, or None; dead entries are discarded on the way"""
+        now = time.time() if now is None else now
+        if self._lingering:
+            self._prune(now)
+        while self._waiting and self._waiting[0][0] <= now:
+            _, turn, host = heapq.heappop(self._waiting)
+            state = self.hosts.get(host)
+            if state is not None and state.where == "waiting" and state.turn == turn:
+                self._schedule(state, turn)
+        entry = None
+        while self._heads:
+            rank, turn, host = heapq.heappop(self._heads)
+            state = self.hosts.get(host)
+            if state is None or state.where != "heads" or state.turn != turn:
+                continue  # stale
+            while state.ready and not is_live(state.ready[0]):
+                heapq.heappop(state.ready)
+                self._size -= 1
+            if not state.ready:
+                state.where = ""
+                continue
+            head = state.ready[0]
+            if head[0] != rank:
+                heapq.heappush(self._heads, (head[0], turn, host))
+                continue
+            eligible_at = self._eligible_at(state, getattr(head[3], "extractor", None), now)
+            if eligible_at > now:
+                self._park(state, getattr(head[3], "extractor", None), eligible_at)
+                continue
+            entry = heapq.heappop(state.ready)
+            self._size -= 1
+            if state.ready:
+                # A fresh turn, so hosts of equal rank take turns
+                self._schedule(state, next(self._turns))
+            else:
+                state.where = ""
+            break
+        while self._waiting and not self._is_waiting(self._waiting[0]):
+            heapq.heappop(self._waiting)
+        self.next_wakeup = self._waiting[0][0] if self._waiting else None
+        return entry
+
+    def _is_waiting(self, item: Tuple[float, int, str]) -> bool:
+        state = self.hosts.get(item[2])
+        return state is not None and state.where == "waiting" and state.turn == item[1]
+
+    def started(self, host: str, extractor: Optional[str], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        state = self._state(host)
+        state.active += 1
+        state.next_start = now + self.host_intervals.get(host, self.min_interval)
+        if extractor:
+            key = extractor.lower()
+            self.extractor_active[key] = self.extractor_active.get(key, 0) + 1
+
+    def finished(self, host: str, extractor: Optional[str], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        state = self._state(host)
+        state.active = max(0, state.active - 1)
+        if host in self._host_capped:
+            self._host_capped.discard(host)
+            self._unpark(host)
+        if extractor:
+            key = extractor.lower()
+            self.extractor_active[key] = max(0, self.extractor_active.get(key, 0) - 1)
+            for parked in self._extractor_capped.pop(key, ()):
+                self._unpark(parked)
+        if not state.active and not state.ready:
+            self._lingering.add(host)
+            self._prune(now)
+        for listener in list(self.listeners):
+            listener()
+
+    def _prune(self, now: float) -> None:
+        """Forget lingering hosts that are idle with no spacing or backoff left"""
+        for host in list(self._lingering):
+            state = self.hosts.get(host)
+            if state is not None and (state.active or state.ready):
+                self._lingering.discard(host)  # busy again
+            elif state is None or max(state.next_start, state.backoff_until) <= now:
+                self._lingering.discard(host)
+                self.hosts.pop(host, None)
+
+    def throttled(self, host: str, retry_after: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Back off ``host`` after a 429; returns the backoff in seconds.
+
+        ``Retry-After`` is honored when the origin sent one; otherwise the
+        backoff doubles with each 429 since the host's last success.
+        """
+        now = time.time() if now is None else now
+        state = self._state(host)
+        state.throttles += 1
+        if retry_after is None:
+            retry_after = min(self.backoff_max, self.backoff_base * 2 ** (state.throttles - 1))
+        state.backoff_until = max(state.backoff_until, now + retry_after)
+        if not state.active and not state.ready:
+            self._lingering.add(host)  # forgotten once the backoff runs out
+        logger.warning(f"{host} is rate limiting downloads, backing off for {retry_after:.0f}s")
+        return retry_after
+
+    def succeeded(self, host: str) -> None:
+        state = self.hosts.get(host)
+        if state is not None:
+            state.throttles = 0
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        now = time.time() if now is None else now
+        return {
+            state.name: {
+                "queued": len(state.ready),
+                "active": state.active,
+                "limit": self._limit(state.name),
+                "backoff_remaining": round(max(0.0, state.backoff_until - now), 1),
+            }
+            for state in self.hosts.values()
+        }
+
+
+class HostGate:
+    """Holds downloads that bypass a ``HostQueues``' queue to its limits.
+
+    ``slot`` waits until the URL's host (and extractor) is under its cap and
+    past its spacing and backoff, then counts the download as running there
+    until the block exits. Hosts do not take turns: waiters are woken in no
+    particular order when a download finishes, and recheck.
+    """
+
+    def __init__(self, queues: HostQueues):
+        self.queues = queues
+        self._released = asyncio.Event()
+        queues.listeners.append(self._on_release)
+
+    def _on_release(self) -> None:
+        released, self._released = self._released, asyncio.Event()
+        released.set()
+
+    @asynccontextmanager
+    async def slot(self, url: str, extractor: Optional[str] = None) -> AsyncIterator[str]:
+        """Run the block as a download on the host of ``url``; yields the host"""
+        host = host_of(url)
+        while True:
+            eligible_at = self.queues.eligible_at(host, extractor)
+            delay = eligible_at - time.time()
+            if delay <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._released.wait(), None if eligible_at == float("inf") else delay)
+            except asyncio.TimeoutError:
+                pass
+        self.queues.started(host, extractor)
+        try:
+            yield host
+        finally:
+            self.queues.finished(host, extractor)
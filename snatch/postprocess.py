@@ -0,0 +1,113 @@
+"""
+Post-processing Pool for Snatch Media Downloader
+
+Audio enhancement and video upscaling are CPU-bound (FFmpeg, librosa) while
+downloads wait on the network. This pool runs post-processing jobs on their
+own CPU-sized set of worker threads, each job on a private event loop (the
+audio processor does blocking numpy work inside coroutines), so the download
+that produced a file can hand it over and move on. ``submit`` blocks once too
+much work is waiting, which keeps downloads from racing arbitrarily far
+ahead of processing and piling up unprocessed files.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .batch import ConcurrencyLimit
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers() -> int:
+    """Half the cores: FFmpeg and numpy use more than one thread per job"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class PostProcessPool:
+    """Bounded pool for post-processing jobs with submit-side backpressure.
+
+    At most ``workers`` jobs run at once and at most ``max_queued`` more wait
+    for a worker; further ``submit`` calls wait until one finishes.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queued: Optional[int] = None):
+        self.workers = max(1, int(workers or default_workers()))
+        self.max_queued = max(0, int(self.workers * 2 if max_queued is None else max_queued))
+        self._admission = ConcurrencyLimit(self.workers + self.max_queued)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+    @property
+    def pending(self) -> int:
+        """Jobs accepted and not finished yet (running or queued)"""
+        return self._admission.active
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="snatch-postprocess")
+        return self._executor
+
+    def _run(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        self.running += 1
+        try:
+            return asyncio.run(job())
+        finally:
+            self.running -= 1
+
+    async def submit(self, job: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        """Queue ``job`` (a coroutine function) and return a future for its result.
+
+        Waits first if the pool already holds ``workers + max_queued`` jobs.
+        """
+        if self._admission.active >= self._admission.limit:
+            self.backpressure_waits += 1
+            started = time.monotonic()
+            await self._admission.acquire()
+            self.backpressure_seconds += time.monotonic() - started
+        else:
+            await self._admission.acquire()
+        try:
+            future = asyncio.wrap_future(self._pool().submit(self._run, job))
+        except BaseException:
+            self._admission.release()
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: "asyncio.Future[Any]") -> None:
+        self._admission.release()
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            if not future.cancelled():
+                logger.error(f"Post-processing job failed: {future.exception()}")
+        else:
+            self.completed += 1
+
+    async def run(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Submit ``job`` and wait for its result"""
+        return await (await self.submit(job))
+
+    def close(self) -> None:
+        """Stop accepting work; jobs already running finish in the background."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": max(0, self.pending - self.running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+        }
@@ -0,0 +1,161 @@
+"""
+Durable Scheduler Queue for Snatch Media Downloader
+
+Keeps the advanced scheduler's downloads in an SQLite database so a restart
+or crash loses neither the backlog nor retry state. The scheduler still
+dispatches from its in-memory heaps; this store is written through in
+batches (one transaction per batch of changes) and read back on startup.
+The database runs in WAL mode with ``synchronous=NORMAL``: commits do not
+wait for fsync, readers never block the writer, and a crash can lose at most
+the last few commits, never corrupt the file.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path, PurePath
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Statuses recovered into the queue on startup; "downloading" rows were in
+# flight when the process stopped and are queued again as "pending"
+UNFINISHED = ("pending", "paused", "downloading")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    scheduled_time REAL,
+    created_at REAL NOT NULL,
+    options TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS downloads_queue ON downloads (status, priority, scheduled_time, created_at);
+CREATE INDEX IF NOT EXISTS downloads_scheduled ON downloads (scheduled_time) WHERE scheduled_time IS NOT NULL;
+"""
+
+COLUMNS = ("id", "url", "status", "priority", "scheduled_time", "created_at", "options", "data")
+
+
+def _encode_value(value: Any) -> Dict[str, str]:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, PurePath):
+        return {"__path__": str(value)}
+    raise TypeError(f"{type(value).__name__} values cannot be stored in the scheduler queue")
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__path__" in obj:
+            return Path(obj["__path__"])
+    return obj
+
+
+def encode_options(options: Dict[str, Any]) -> str:
+    """JSON for a download's options; datetimes and paths come back as such.
+
+    Raises ValueError for any other value JSON cannot hold.
+    """
+    try:
+        return json.dumps(options, default=_encode_value)
+    except TypeError as e:
+        raise ValueError(str(e)) from e
+
+
+def decode_options(text: str) -> Dict[str, Any]:
+    return json.loads(text, object_hook=_decode_value)
+
+
+class SchedulerStore:
+    """SQLite-backed record of scheduled downloads.
+
+    Records are dicts with the indexed columns (``id``, ``url``, ``status``,
+    ``priority``, ``scheduled_time`` and ``created_at`` as timestamps) plus
+    ``options`` (see ``encode_options``) and ``data``, a JSON-serializable
+    dict with everything else.
+    A batch usually shares one options dict, so each distinct one is encoded
+    once per save.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def save(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update ``records`` in a single transaction; returns the count"""
+        encoded: Dict[int, str] = {}
+
+        def options_json(options: Dict[str, Any]) -> str:
+            key = id(options)
+            if key not in encoded:
+                encoded[key] = encode_options(options)
+            return encoded[key]
+
+        records = list(records)  # keeps each options dict alive while its id is cached
+        rows = [(r["id"], r["url"], r["status"], r["priority"], r.get("scheduled_time"), r["created_at"],
+                 options_json(r.get("options") or {}),
+                 json.dumps(r["data"], default=str) if r.get("data") else "{}")
+                for r in records]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO downloads (id, url, status, priority, scheduled_time, created_at, options, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "url = excluded.url, status = excluded.status, priority = excluded.priority, "
+                    "scheduled_time = excluded.scheduled_time, options = excluded.options, "
+                    "data = excluded.data", rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    @staticmethod
+    def _record(row: tuple) -> Dict[str, Any]:
+        record = dict(zip(COLUMNS, row))
+        record["options"] = decode_options(record["options"])
+        record["data"] = json.loads(record["data"])
+        return record
+
+    def load(self, download_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE id = ?",
+                                     (download_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """Unfinished downloads in queue order, with in-flight ones reset to pending"""
+        placeholders = ", ".join("?" * len(UNFINISHED))
+        with self._lock:
+            self._conn.execute("UPDATE downloads SET status = 'pending' WHERE status = 'downloading'")
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE status IN ({placeholders}) "
+                "ORDER BY priority, scheduled_time, created_at", UNFINISHED).fetchall()
+        return [self._record(row) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        with self._lock:
+            if status is None:
+                return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM downloads WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -24,6 +24,7 @@ from colorama import Fore, Style, init
 
 from .progress import SpinnerAnimation
 from .common_utils import ensure_dir, safe_file_write, safe_json_read, compute_file_hash
+from .chunk_engine import verify_manifest
 from .defaults import DOWNLOAD_SESSIONS_FILE
 from .logging_config import setup_logging
 from .error_handler import EnhancedErrorHandler, handle_errors, ErrorCategory, ErrorSeverity
@@ -185,8 +186,11 @@ class AsyncSessionManager:
         converted_data['metadata'] = self._convert_metadata(session_data, 
             converted_data['downloaded_bytes'] / converted_data['total_size'] * 100 if converted_data['total_size'] > 0 else 0)
             
-        # Add resume data for resilience
+        # Add resume data for resilience, keeping any persisted chunk bitmap
         converted_data['resume_data'] = self._create_resume_data(converted_data)
+        chunk_state = (session_data.get('resume_data') or {}).get('chunk_state')
+        if chunk_state:
+            converted_data['resume_data']['chunk_state'] = chunk_state
         
         return converted_data
         
@@ -201,7 +205,9 @@ class AsyncSessionManager:
                 file_stats = os.stat(file_path)
                 resume_data['file_size'] = file_stats.st_size
                 resume_data['file_mtime'] = file_stats.st_mtime
-                resume_data['partial_file_hash'] = compute_file_hash(file_path, 'md5')
+                # Files with a download manifest are verified from it instead
+                if not (session_data.get('metadata') or {}).get('manifest'):
+                    resume_data['partial_file_hash'] = compute_file_hash(file_path, 'md5')
             except (OSError, IOError) as e:
                 logger.error(f"Failed to get file stats for resume data: {str(e)}")
                 
@@ -290,7 +296,7 @@ class AsyncSessionManager:
         # Preserve other fields from the session data
         for key, value in session_data.items():
             if key not in ['url', 'file_path', 'start_time', 'last_updated', 'total_size', 
-                          'downloaded_bytes', 'chunks_downloaded', 'status', 'metadata']:
+                          'downloaded_bytes', 'chunks_downloaded', 'status', 'metadata', 'resume_data']:
                 metadata[f"legacy_{key}"] = value
                 
         return metadata
@@ -371,14 +377,18 @@ class AsyncSessionManager:
                 
         return False
 
-    async def _save_sessions_async(self) -> None:
-        """Save sessions to disk atomically using async IO with backup rotation."""
+    async def _save_sessions_async(self, force: bool = False) -> None:
+        """Save sessions to disk atomically using async IO with backup rotation.
+
+        Args:
+            force: Save even if the last save was within the auto-save interval.
+        """
         if not self._sessions:
             return
             
         async with self.save_lock:
             # Skip if last save was too recent
-            if time.time() - self.last_save < self.auto_save_interval:
+            if not force and time.time() - self.last_save < self.auto_save_interval:
                 return
                 
             # Convert sessions to serializable format
@@ -540,6 +550,76 @@ class AsyncSessionManager:
                 if chunk_hash not in session.resume_data['chunks_downloaded']:
                     session.resume_data['chunks_downloaded'].append(chunk_hash)
                     
+    def update_chunk_state(self, url: str, chunk_state: Dict[str, Any], downloaded_bytes: int,
+                           total_size: Optional[int] = None, file_path: Optional[str] = None,
+                           status: Optional[str] = None,
+                           manifest: Optional[Dict[str, Any]] = None) -> None:
+        """Record the chunk completion state of a segmented download.
+
+        The state (completion bitmap, per-chunk SHA-256s and origin validators)
+        is stored under ``resume_data['chunk_state']`` so an interrupted
+        download can later fetch only its missing ranges. A finished download's
+        verification ``manifest`` is kept in ``metadata['manifest']``.
+        """
+        now = datetime.now()
+        with self.lock:
+            session = self._sessions.get(url)
+            if session is None:
+                session = DownloadSession(
+                    url=url,
+                    file_path=file_path or '',
+                    total_size=total_size or 0,
+                    downloaded_bytes=0,
+                    start_time=now,
+                    last_updated=now,
+                    status=SESSION_STATUS_DOWNLOADING,
+                )
+                self._sessions[url] = session
+
+            if total_size is not None:
+                session.total_size = total_size
+            if file_path:
+                session.file_path = file_path
+            if status:
+                session.status = status
+            session.downloaded_bytes = downloaded_bytes
+            session.last_updated = now
+            session.resume_data['downloaded_bytes'] = downloaded_bytes
+            session.resume_data['last_position'] = downloaded_bytes
+            session.resume_data['chunk_state'] = chunk_state
+            if manifest is not None:
+                session.metadata['manifest'] = manifest
+
+    def get_manifest(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the verification manifest of a finished download, if any."""
+        with self.lock:
+            session = self._sessions.get(url)
+            if session is None:
+                return None
+            return session.metadata.get('manifest')
+
+    def get_chunk_state(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the persisted chunk completion state for a download, if any."""
+        with self.lock:
+            session = self._sessions.get(url)
+            if session is None:
+                return None
+            return session.resume_data.get('chunk_state')
+
+    def clear_chunk_state(self, url: str) -> None:
+        """Forget the chunk completion state, e.g. after the origin file changed."""
+        with self.lock:
+            session = self._sessions.get(url)
+            if session is not None:
+                session.resume_data.pop('chunk_state', None)
+                session.downloaded_bytes = 0
+                session.resume_data['downloaded_bytes'] = 0
+                session.resume_data['last_position'] = 0
+
+    async def flush(self) -> None:
+        """Write sessions to disk now, bypassing the auto-save interval."""
+        await self._save_sessions_async(force=True)
+
     def get_session(self, url: str) -> Optional[DownloadSession]:
         """Get session info thread-safely."""
         with self.lock:
@@ -696,12 +776,18 @@ class AsyncSessionManager:
         with self.lock:
             return [s for s in self._sessions.values() if predicate(s)]
     
-    def verify_file_integrity(self, url: str) -> Tuple[bool, Optional[str]]:
+    def verify_file_integrity(self, url: str,
+                              ranges: Optional[List[Tuple[int, int]]] = None) -> Tuple[bool, Optional[str]]:
         """
         Verify the integrity of a downloaded file using checksums in session data.
         
+        Downloads with a manifest are checked without reading the file when its
+        size and mtime are unchanged; otherwise (or for the given ``ranges``)
+        only the affected manifest chunks are re-hashed.
+        
         Args:
             url: The download URL
+            ranges: Suspect byte ranges (inclusive) to re-hash from the manifest
             
         Returns:
             Tuple[bool, Optional[str]]: (is_valid, error_message)
@@ -714,12 +800,16 @@ class AsyncSessionManager:
             if not session.file_path or not os.path.exists(session.file_path):
                 return False, "File not found"
                 
-            # Check if we have a checksum in metadata
             checksum = session.metadata.get('checksum')
+            algorithm = session.metadata.get('checksum_algorithm', 'sha256')
+            manifest = session.metadata.get('manifest')
+            if manifest and (not checksum or (algorithm == 'sha256' and manifest.get('sha256'))):
+                return self._verify_with_manifest(session.file_path, manifest, checksum, ranges)
+                
+            # Check if we have a checksum in metadata
             if not checksum:
                 return True, None  # No checksum to verify against
                 
-            algorithm = session.metadata.get('checksum_algorithm', 'sha256')
             computed = compute_file_hash(session.file_path, algorithm)
             
             if not computed:
@@ -729,6 +819,29 @@ class AsyncSessionManager:
                 return False, f"Checksum mismatch: expected {checksum}, got {computed}"
                 
             return True, None
+
+    def _verify_with_manifest(self, file_path: str, manifest: Dict[str, Any], checksum: Optional[str],
+                              ranges: Optional[List[Tuple[int, int]]]) -> Tuple[bool, Optional[str]]:
+        """Verify a file against its download manifest, re-reading as little as possible."""
+        stat = os.stat(file_path)
+        if stat.st_size != manifest.get('total_size'):
+            return False, f"Size mismatch: expected {manifest.get('total_size')}, got {stat.st_size}"
+        if checksum and checksum.lower() != manifest['sha256'].lower():
+            return False, f"Checksum mismatch: expected {checksum}, got {manifest['sha256']}"
+
+        unchanged = (stat.st_size == manifest.get('file_size')
+                     and stat.st_mtime == manifest.get('file_mtime'))
+        if unchanged and ranges is None:
+            return True, None
+
+        try:
+            bad = verify_manifest(file_path, manifest, ranges)
+        except OSError as e:
+            return False, f"Failed to re-hash file: {e}"
+        if bad:
+            listed = ", ".join(f"{start}-{end}" for start, end in bad[:10])
+            return False, f"Checksum mismatch in {len(bad)} chunk(s): {listed}"
+        return True, None
                 
     def get_session_stats(self) -> Dict[str, Any]:
         """Get detailed statistics about current sessions."""
@@ -812,7 +925,7 @@ class SessionManager:
         error_log_path = "logs/snatch_errors.log"
         self.error_handler = EnhancedErrorHandler(log_file=error_log_path)
 
-    def _run_async_save(self) -> None:
+    def _run_async_save(self, force: bool = False) -> None:
         """Safely run async save from sync context without crashing if an event loop is already running."""
         try:
             loop = asyncio.get_running_loop()
@@ -821,10 +934,10 @@ class SessionManager:
 
         if loop and loop.is_running():
             # Already in an async context — schedule save as a fire-and-forget task
-            loop.create_task(self._async_manager._save_sessions_async())
+            loop.create_task(self._async_manager._save_sessions_async(force=force))
         else:
             # No event loop running — safe to use asyncio.run()
-            self._run_async_save()
+            asyncio.run(self._async_manager._save_sessions_async(force=force))
         
     def update_session(self, url: str, percentage: float, **metadata) -> None:
         """Update session state synchronously.
@@ -875,6 +988,62 @@ class SessionManager:
         # Trigger sync save
         self._run_async_save()
         
+    def update_chunk_state(self, url: str, chunk_state: Dict[str, Any], downloaded_bytes: int,
+                           total_size: Optional[int] = None, file_path: Optional[str] = None,
+                           status: Optional[str] = None,
+                           manifest: Optional[Dict[str, Any]] = None) -> None:
+        """Record the chunk completion state of a segmented download synchronously.
+
+        Args:
+            url: The download URL.
+            chunk_state: Completion bitmap, chunk hashes and origin validators.
+            downloaded_bytes: Bytes covered by completed chunks.
+            total_size: Total file size in bytes.
+            file_path: Path where the file will be downloaded.
+            status: Optional new session status.
+            manifest: Verification manifest of the finished download.
+        """
+        self._async_manager.update_chunk_state(
+            url, chunk_state, downloaded_bytes,
+            total_size=total_size, file_path=file_path, status=status, manifest=manifest
+        )
+        self._run_async_save()
+
+    def get_manifest(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the verification manifest of a finished download.
+
+        Args:
+            url: The download URL.
+
+        Returns:
+            Manifest dict or None if the download has none.
+        """
+        return self._async_manager.get_manifest(url)
+
+    def get_chunk_state(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the persisted chunk completion state for a download.
+
+        Args:
+            url: The download URL.
+
+        Returns:
+            Chunk state dict or None if the download has none.
+        """
+        return self._async_manager.get_chunk_state(url)
+
+    def clear_chunk_state(self, url: str) -> None:
+        """Forget the chunk completion state for a download.
+
+        Args:
+            url: The download URL.
+        """
+        self._async_manager.clear_chunk_state(url)
+        self._run_async_save(force=True)
+
+    def flush(self) -> None:
+        """Write sessions to disk now, bypassing the auto-save interval."""
+        self._run_async_save(force=True)
+
     def get_session(self, url: str) -> Optional[Dict[str, Any]]:
         """Get session data synchronously.
         
@@ -0,0 +1,183 @@
+"""
+YoutubeDL Instance Pool for Snatch Media Downloader
+
+Building a ``yt_dlp.YoutubeDL`` loads extractors, a cookie jar and HTTP
+handlers, and its request director keeps connections warm between requests.
+The pool keeps long-lived instances per option fingerprint, hands one out per
+download and resets its per-download state when it comes back, so a batch of
+short clips stops paying that setup (and a TLS handshake) for every URL.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Options that are per download rather than part of an instance's identity
+PER_USE_OPTIONS = ("progress_hooks", "postprocessor_hooks")
+
+
+def options_fingerprint(opts: Dict[str, Any]) -> str:
+    """Stable key for the options an instance was built with (hooks excluded)."""
+    shared = {k: v for k, v in opts.items() if k not in PER_USE_OPTIONS}
+    encoded = json.dumps(shared, sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _default_factory(opts: Dict[str, Any]) -> Any:
+    import yt_dlp
+    return yt_dlp.YoutubeDL(opts)
+
+
+class YoutubeDLPool:
+    """Checkout pool of reusable YoutubeDL instances keyed by option fingerprint.
+
+    An instance is used by one download at a time. At most ``max_idle``
+    instances are kept per fingerprint and ``max_keys`` fingerprints overall
+    (least recently used ones are closed first); an instance is retired after
+    ``max_uses`` downloads so cookie jars and caches do not grow forever.
+    """
+
+    def __init__(self, max_idle: int = 4, max_keys: int = 8, max_uses: int = 500,
+                 factory: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.max_idle = max(0, max_idle)
+        self.max_keys = max(1, max_keys)
+        self.max_uses = max(1, max_uses)
+        self._factory = factory or _default_factory
+        self._idle: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._uses: Dict[int, int] = {}  # id(instance) -> completed checkouts
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def checkout(self, opts: Dict[str, Any]) -> Iterator[Any]:
+        """Borrow an instance configured with ``opts`` for one download.
+
+        Progress and postprocessor hooks in ``opts`` are attached for this use
+        only. The instance is returned to the pool afterwards unless the
+        download failed with something other than a yt-dlp error.
+        """
+        key = options_fingerprint(opts)
+        ydl = self._acquire(key, opts)
+        hooks = self._attach_hooks(ydl, opts)
+        reusable = True
+        try:
+            yield ydl
+        except BaseException as e:
+            reusable = self._is_reusable_after(e)
+            raise
+        finally:
+            self._detach_hooks(ydl, hooks)
+            self._release(key, ydl, reusable)
+
+    def _acquire(self, key: str, opts: Dict[str, Any]) -> Any:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self.reused += 1
+                return idle.pop()
+        # Created outside the lock: loading extractors takes a while
+        base = {k: v for k, v in opts.items() if k not in PER_USE_OPTIONS}
+        ydl = self._factory(base)
+        with self._lock:
+            self.created += 1
+            self._uses[id(ydl)] = 0
+        return ydl
+
+    def _release(self, key: str, ydl: Any, reusable: bool) -> None:
+        reusable = reusable and self._reset(ydl)
+        evicted: List[Any] = []
+        with self._lock:
+            uses = self._uses.get(id(ydl), 0) + 1
+            self._uses[id(ydl)] = uses
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if reusable and uses < self.max_uses and len(idle) < self.max_idle:
+                idle.append(ydl)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_keys:
+                _, instances = self._idle.popitem(last=False)
+                evicted.extend(instances)
+            if not idle:
+                self._idle.pop(key, None)
+            for instance in evicted:
+                self._uses.pop(id(instance), None)
+        for instance in evicted:
+            self._close(instance)
+
+    @staticmethod
+    def _attach_hooks(ydl: Any, opts: Dict[str, Any]) -> Dict[str, List[Callable]]:
+        hooks = {name: list(opts.get(name) or []) for name in PER_USE_OPTIONS}
+        for hook in hooks["progress_hooks"]:
+            ydl.add_progress_hook(hook)
+        for hook in hooks["postprocessor_hooks"]:
+            ydl.add_postprocessor_hook(hook)
+        return hooks
+
+    @staticmethod
+    def _detach_hooks(ydl: Any, hooks: Dict[str, List[Callable]]) -> None:
+        """Remove exactly the hooks attached for the finished download."""
+        def _remove(registry: List[Callable], hook: Callable) -> None:
+            if hook in registry:
+                registry.remove(hook)
+
+        for hook in hooks["progress_hooks"]:
+            _remove(getattr(ydl, "_progress_hooks", []), hook)
+        for hook in hooks["postprocessor_hooks"]:
+            _remove(getattr(ydl, "_postprocessor_hooks", []), hook)
+            for pps in getattr(ydl, "_pps", {}).values():
+                for pp in pps:
+                    _remove(getattr(pp, "_progress_hooks", []), hook)
+
+    @staticmethod
+    def _reset(ydl: Any) -> bool:
+        """Clear per-download counters; False if the instance cannot be reused."""
+        try:
+            ydl._download_retcode = 0
+            ydl._num_downloads = 0
+            ydl._num_videos = 0
+            ydl._playlist_level = 0
+            ydl._playlist_urls = set()
+            ydl.save_cookies()
+            return True
+        except Exception as e:
+            logger.debug(f"Not reusing YoutubeDL instance: {e}")
+            return False
+
+    @staticmethod
+    def _is_reusable_after(error: BaseException) -> bool:
+        try:
+            from yt_dlp.utils import YoutubeDLError
+        except ImportError:
+            return False
+        return isinstance(error, YoutubeDLError)
+
+    @staticmethod
+    def _close(ydl: Any) -> None:
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"Error closing YoutubeDL instance: {e}")
+
+    def close(self) -> None:
+        """Close every idle instance; ones still checked out come back as usual."""
+        with self._lock:
+            instances = [ydl for idle in self._idle.values() for ydl in idle]
+            self._idle.clear()
+            for ydl in instances:
+                self._uses.pop(id(ydl), None)
+        for ydl in instances:
+            self._close(ydl)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            idle = sum(len(v) for v in self._idle.values())
+            return {"created": self.created, "reused": self.reused, "idle": idle, "keys": len(self._idle)}
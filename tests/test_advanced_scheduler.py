@@ -0,0 +1,268 @@
+"""Tests for the advanced download scheduler."""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from snatch.advanced_scheduler import AdvancedScheduler, DownloadStatus, Priority, ScheduledDownload
+from snatch.bandwidth import BandwidthLimiter
+
+
+async def _drain(scheduler):
+    """Run the queue to completion without the scheduler loop"""
+    while scheduler.queue_size or scheduler.active_downloads:
+        await scheduler._process_queue()
+        await asyncio.gather(*list(scheduler.active_downloads.values()), return_exceptions=True)
+
+
+@pytest.fixture
+def config():
+    # Test URLs share no host; politeness has its own tests
+    return {"max_concurrent_downloads": 2, "retry_delay_base": 0, "max_bandwidth_mbps": 10.0,
+            "per_host_concurrency": 0}
+
+
+class TestScheduledExecution:
+    async def test_executor_result_completes_download(self, config):
+        async def executor(download):
+            return f"/tmp/{download.url}.mp4"
+
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        await _drain(scheduler)
+
+        info = await scheduler.get_download_info(download_id)
+        assert info["status"] == "completed" and info["result"] == "/tmp/a.mp4"
+        assert scheduler.get_status()["completed_downloads"] == 1
+
+    async def test_failures_are_retried_then_given_up(self, config):
+        config["scheduler_max_retries"] = 2
+        attempts = []
+
+        async def executor(download):
+            attempts.append(download.url)
+            return None
+
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        await _drain(scheduler)
+
+        assert attempts == ["a"] * 3
+        assert scheduler.downloads[download_id].status == DownloadStatus.FAILED
+        assert download_id in scheduler.failed_downloads
+
+    async def test_higher_priority_starts_first(self, config):
+        config["max_concurrent_downloads"] = 1
+        started = []
+
+        async def executor(download):
+            started.append(download.url)
+            return download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        await scheduler.schedule_download("low", {}, Priority.LOW)
+        await scheduler.schedule_download("urgent", {}, Priority.URGENT)
+        await _drain(scheduler)
+        assert started == ["urgent", "low"]
+
+    async def test_progress_updates_reach_callbacks(self, config):
+        seen = []
+
+        async def executor(download):
+            scheduler.update_progress(download, 50, 100)
+            await asyncio.sleep(0)
+            return "done"
+
+        async def on_progress(download):
+            seen.append(download.progress)
+
+        scheduler = AdvancedScheduler(config, executor)
+        scheduler.on_progress_update(on_progress)
+        download_id = await scheduler.schedule_download("a", {})
+        await _drain(scheduler)
+
+        assert seen == [0.5]
+        assert scheduler.downloads[download_id].downloaded_size == 50
+
+    async def test_allocations_hang_off_parent_only_while_active(self, config):
+        parent = BandwidthLimiter(0, name="global")
+        grandparents = []
+
+        async def executor(download):
+            grandparents.append(scheduler.bandwidth_manager.get_limiter(download.id).parent.parent)
+            return "done"
+
+        scheduler = AdvancedScheduler(config, executor, bandwidth_parent=parent)
+        await scheduler.schedule_download("a", {})
+        await _drain(scheduler)
+
+        assert grandparents == [parent]
+        assert parent.children == []
+
+    async def test_lone_download_may_use_the_whole_cap(self, config):
+        scheduler = AdvancedScheduler(config)
+        manager = scheduler.bandwidth_manager
+        cap = 10.0 * 1024 * 1024
+        await manager.allocate_bandwidth("a", cap / 2)
+        assert manager.get_limiter("a").bucket.rate == cap
+
+        await manager.allocate_bandwidth("b", cap / 2)
+        assert [manager.get_limiter(i).bucket.rate for i in "ab"] == [cap / 2, cap / 2]
+        await manager.release_bandwidth("b")
+        assert manager.get_limiter("a").bucket.rate == cap
+
+
+class TestEventDrivenLoop:
+    async def _wait_for(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            await asyncio.sleep(0.005)
+
+    async def test_enqueue_and_completion_wake_the_loop(self, config):
+        config["max_concurrent_downloads"] = 1
+        started = {}
+
+        async def executor(download):
+            started[download.url] = time.monotonic()
+            return download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        await scheduler.start()
+        try:
+            await asyncio.sleep(0.01)  # loop is idle now
+            queued_at = time.monotonic()
+            await scheduler.schedule_download("a", {})
+            await scheduler.schedule_download("b", {})
+            await self._wait_for(lambda: len(scheduler.completed_downloads) == 2)
+        finally:
+            await scheduler.stop()
+        # No polling interval between enqueue, completion and the next start
+        assert started["b"] - queued_at < 0.2
+
+    async def test_delayed_download_starts_when_due(self, config):
+        started = []
+
+        async def executor(download):
+            started.append(time.monotonic())
+            return download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        await scheduler.start()
+        try:
+            due = time.monotonic() + 0.1
+            await scheduler.schedule_download("later", {}, scheduled_time=datetime.now() + timedelta(seconds=0.1))
+            await self._wait_for(lambda: started)
+        finally:
+            await scheduler.stop()
+        assert due - 0.01 <= started[0] < due + 0.2
+
+    async def test_cancelled_and_paused_entries_are_skipped(self, config):
+        config["max_concurrent_downloads"] = 1
+        started = []
+
+        async def executor(download):
+            started.append(download.url)
+            return download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        ids = [await scheduler.schedule_download(url, {}) for url in ("a", "b", "c")]
+        assert await scheduler.cancel_download(ids[0])
+        assert await scheduler.pause_download(ids[1])
+        await _drain(scheduler)
+        assert started == ["c"]
+
+        assert await scheduler.resume_download(ids[1])
+        await _drain(scheduler)
+        assert started == ["c", "b"]
+
+    async def test_dispatch_cost_does_not_grow_with_queue(self, config):
+        async def executor(download):
+            return download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        for i in range(100_000):
+            scheduler._enqueue(ScheduledDownload(id=f"dl{i}", url=str(i), options={},
+                                                 priority=Priority((i % 5) + 1)))
+        started = time.perf_counter()
+        for _ in range(1000):
+            assert scheduler._pop_ready() is not None
+        # A linear scan per start would take seconds here
+        assert time.perf_counter() - started < 0.5
+        assert scheduler.queue_size == 99_000
+
+
+class TestCompletionStream:
+    async def test_as_completed_yields_in_finish_order(self, config):
+        config.update(scheduler_max_retries=0, max_concurrent_downloads=3)
+
+        async def executor(download):
+            await asyncio.sleep({"slow": 0.1, "fast": 0.01}.get(download.url, 0.05))
+            return None if download.url == "bad" else download.url
+
+        scheduler = AdvancedScheduler(config, executor)
+        ids = [await scheduler.schedule_download(url, {}) for url in ("slow", "bad", "fast")]
+        await scheduler.start()
+        try:
+            finished = [d async for d in scheduler.as_completed(ids)]
+        finally:
+            await scheduler.stop()
+
+        assert [d.url for d in finished] == ["fast", "bad", "slow"]
+        assert [d.status for d in finished] == [DownloadStatus.COMPLETED, DownloadStatus.FAILED,
+                                                DownloadStatus.COMPLETED]
+
+    async def test_future_resolves_on_cancel_and_after_the_fact(self, config):
+        async def executor(download):
+            await asyncio.sleep(10)
+
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        future = scheduler.download_future(download_id)
+        await scheduler._process_queue()
+        assert not future.done()
+
+        await scheduler.cancel_download(download_id)
+        download = await asyncio.wait_for(future, timeout=1)
+        assert download.status == DownloadStatus.CANCELLED
+        # Asked for after finishing: already resolved
+        assert scheduler.download_future(download_id).result() is download
+
+    async def test_cancel_tolerates_finishing_during_the_await(self, config):
+        async def executor(download):
+            await asyncio.sleep(10)
+
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        await scheduler._process_queue()
+
+        async def release_bandwidth(download_id):
+            # The download wraps up while the cancel waits here
+            scheduler.active_downloads.pop(download_id)
+
+        scheduler.bandwidth_manager.release_bandwidth = release_bandwidth
+        assert await scheduler.cancel_download(download_id)
+        assert download_id not in scheduler.active_downloads
+
+    async def test_retried_download_resolves_once_retries_are_used(self, config):
+        config["scheduler_max_retries"] = 1
+        attempts = []
+
+        async def executor(download):
+            attempts.append(download.url)
+            return None if len(attempts) == 1 else "ok"
+
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        future = scheduler.download_future(download_id)
+        await _drain(scheduler)
+        assert future.result().status == DownloadStatus.COMPLETED and len(attempts) == 2
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, Priority.NORMAL), (1, Priority.URGENT), ("high", Priority.HIGH),
+    ("4", Priority.LOW), (9, Priority.BACKGROUND), ("bogus", Priority.NORMAL),
+])
+def test_priority_from_value(value, expected):
+    assert Priority.from_value(value) is expected
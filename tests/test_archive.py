@@ -0,0 +1,85 @@
+"""Tests for the persistent download archive."""
+import json
+import os
+
+from snatch.archive import DownloadArchive, canonical_url, resolve_media_id
+
+
+INFO = {"extractor_key": "Youtube", "id": "abc123", "webpage_url": "https://www.youtube.com/watch?v=abc123"}
+
+
+class _IE:
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def suitable(self, url):
+        return url.startswith(self.prefix)
+
+    def get_temp_id(self, url):
+        return url[len(self.prefix):] or None
+
+
+class _YDL:
+    _ies = {"Generic": _IE(""), "Youtube": _IE("https://youtu.be/")}
+
+
+class TestDownloadArchive:
+    def test_record_and_lookup(self, temp_dir):
+        archive = DownloadArchive(os.path.join(temp_dir, "archive.txt"))
+        assert archive.record(INFO, ["https://youtu.be/abc123#t=3"]) == 3
+
+        assert archive.has_media("Youtube", "abc123")
+        assert archive.has_url("HTTPS://WWW.YOUTUBE.COM/watch?v=abc123")
+        assert archive.has_url("https://youtu.be/abc123")
+        assert not archive.has_media("Youtube", "other")
+        # Recording again adds nothing
+        assert archive.record(INFO) == 0
+
+    def test_persists_in_ytdlp_line_format(self, temp_dir):
+        path = os.path.join(temp_dir, "archive.txt")
+        DownloadArchive(path).record(INFO)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert "youtube abc123" in lines
+
+        reopened = DownloadArchive(path)
+        assert reopened.existed and reopened.has_media("Youtube", "abc123")
+
+    def test_reads_existing_ytdlp_archive(self, temp_dir):
+        path = os.path.join(temp_dir, "archive.txt")
+        with open(path, "w") as f:
+            f.write("youtube abc123\nvimeo 42\n")
+        archive = DownloadArchive(path)
+        assert archive.has_entry({"ie_key": "Vimeo", "id": "42", "url": "https://vimeo.com/42"})
+
+    def test_has_entry_by_url(self, temp_dir):
+        archive = DownloadArchive(os.path.join(temp_dir, "archive.txt"))
+        archive.record({"webpage_url": "https://example.com/a"})
+        assert archive.has_entry({"_type": "url", "url": "https://example.com/a"})
+        assert not archive.has_entry({"_type": "url", "url": "https://example.com/b"})
+
+    def test_import_directory_needs_sidecar_and_media(self, temp_dir):
+        media_dir = os.path.join(temp_dir, "video", "nested")
+        os.makedirs(media_dir)
+        for stem, info, with_media in [("Kept", INFO, True),
+                                       ("Deleted", {"extractor_key": "Youtube", "id": "gone"}, False)]:
+            with open(os.path.join(media_dir, f"{stem}.info.json"), "w") as f:
+                json.dump(info, f)
+            if with_media:
+                open(os.path.join(media_dir, f"{stem}.mp4"), "w").close()
+        open(os.path.join(media_dir, "broken.info.json"), "w").close()
+        open(os.path.join(media_dir, "broken.mp4"), "w").close()
+
+        archive = DownloadArchive(os.path.join(temp_dir, "archive.txt"))
+        assert archive.import_directory(os.path.join(temp_dir, "video")) == 2
+        assert archive.has_media("Youtube", "abc123")
+        assert not archive.has_media("Youtube", "gone")
+
+
+def test_resolve_media_id_skips_generic():
+    assert resolve_media_id(_YDL(), "https://youtu.be/xyz") == ("Youtube", "xyz")
+    assert resolve_media_id(_YDL(), "https://example.com/xyz") is None
+
+
+def test_canonical_url():
+    assert canonical_url(" HTTPS://Example.COM/Path?q=1#frag ") == "https://example.com/Path?q=1"
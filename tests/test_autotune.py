@@ -0,0 +1,138 @@
+"""Tests for the concurrency autotuner."""
+from types import SimpleNamespace
+
+from snatch.advanced_scheduler import AdvancedScheduler
+from snatch.autotune import ConcurrencyAutotuner
+
+
+class _Monitor:
+    cpu_threshold = 80.0
+    memory_threshold = 85.0
+
+    def __init__(self):
+        self.cpu = 10.0
+        self.memory = 10.0
+
+    def get_current_metrics(self):
+        return SimpleNamespace(cpu_percent=self.cpu, memory_percent=self.memory)
+
+
+def _tuner(monitor=None, **kwargs):
+    tuner = ConcurrencyAutotuner(interval=1.0, hold_intervals=1, monitor=monitor, **kwargs)
+    applied = {}
+    tuner.add_knob("downloads", 4, 1, 10, lambda n: applied.__setitem__("downloads", n))
+    return tuner, applied
+
+
+def _interval(tuner, now, nbytes, ok=1, failed=0, latency=None):
+    """Feed one interval's signals and evaluate at its end"""
+    tuner.record_bytes(nbytes)
+    for _ in range(ok):
+        tuner.record_result(True)
+    for _ in range(failed):
+        tuner.record_result(False)
+    if latency is not None:
+        tuner.record_latency(latency)
+    return tuner.evaluate(now)
+
+
+class TestConcurrencyAutotuner:
+    def test_increases_while_throughput_improves(self):
+        tuner, applied = _tuner()
+        tuner._reset_window(0.0)
+        _interval(tuner, 1.0, 1000)  # probe 4 -> 5
+        _interval(tuner, 2.0, 1200)  # +20%: keep, probe 6
+        _interval(tuner, 3.0, 1400)
+
+        assert tuner.limits()["downloads"] == 7 and applied["downloads"] == 7
+        assert tuner.decisions[-1].reason.startswith("throughput +")
+
+    def test_plateau_reverts_the_probe_and_holds(self):
+        tuner, applied = _tuner()
+        tuner._reset_window(0.0)
+        _interval(tuner, 1.0, 1000)  # probe 4 -> 5
+        decisions = _interval(tuner, 2.0, 1010)
+
+        assert [(d.old, d.new, d.reason) for d in decisions] == [(5, 4, "throughput plateaued")]
+        assert _interval(tuner, 3.0, 1000) == []  # holding
+        assert tuner.limits()["downloads"] == 4
+
+    def test_failures_cut_multiplicatively(self):
+        tuner, applied = _tuner()
+        tuner._reset_window(0.0)
+        decisions = _interval(tuner, 1.0, 1000, ok=1, failed=3)
+
+        assert applied["downloads"] == 2
+        assert "3/4 downloads failed" in decisions[0].reason
+
+    def test_resource_ceiling_overrides_throughput(self):
+        monitor = _Monitor()
+        tuner, applied = _tuner(monitor)
+        tuner._reset_window(0.0)
+        _interval(tuner, 1.0, 1000)  # probe 4 -> 5
+        monitor.cpu = 95.0
+        decisions = _interval(tuner, 2.0, 5000)
+
+        assert applied["downloads"] == 2 and decisions[0].reason == "CPU at 95%"
+
+    def test_rising_time_to_first_byte_backs_off(self):
+        tuner, applied = _tuner(latency_factor=2.0)
+        tuner._reset_window(0.0)
+        _interval(tuner, 1.0, 1000, latency=0.5)  # baseline, probe 4 -> 5
+        decisions = _interval(tuner, 2.0, 2000, latency=2.0)
+
+        assert applied["downloads"] == 2 and "first byte" in decisions[0].reason
+
+    def test_idle_intervals_change_nothing(self):
+        tuner, applied = _tuner()
+        tuner._reset_window(0.0)
+        assert tuner.evaluate(1.0) == [] and applied == {}
+
+    def test_knobs_are_probed_in_turn_within_bounds(self):
+        tuner = ConcurrencyAutotuner(interval=1.0, hold_intervals=0)
+        tuner.add_knob("a", 2, 1, 2, lambda n: None)  # already at its maximum
+        tuner.add_knob("b", 2, 1, 8, lambda n: None)
+        tuner._reset_window(0.0)
+        decisions = _interval(tuner, 1.0, 1000)
+
+        assert [d.knob for d in decisions] == ["b"]
+
+
+class TestSchedulerIntegration:
+    def test_disabled_by_default(self):
+        scheduler = AdvancedScheduler({})
+        assert scheduler.autotuner is None
+
+    async def test_limits_and_reasons_are_reported(self):
+        config = {"autotune_concurrency": True, "max_concurrent": 2,
+                  "autotune_limits": {"max_concurrent_chunks": (2, 4)}}
+        scheduler = AdvancedScheduler(config)
+        tuner = scheduler.autotuner
+        tuner._reset_window(0.0)
+        tuner.record_bytes(1000)
+        tuner.evaluate(1.0)
+
+        # The first knob was probed and applied where downloads read it
+        assert scheduler.max_concurrent == 3 and config["max_concurrent"] == 3
+        status = await scheduler.get_queue_status()
+        autotune = status["autotune"]
+        assert autotune["limits"] == {"max_concurrent": 3, "max_concurrent_chunks": 4,
+                                      "concurrent_fragment_downloads": 8}
+        assert autotune["decisions"][0]["reason"] == "probing for more throughput"
+        assert config["max_concurrent_chunks"] == 4  # clamped into its bounds
+
+    def test_chunk_and_fragment_limits_are_written_to_config(self):
+        config = {"autotune_concurrency": True, "max_concurrent_chunks": 8}
+        scheduler = AdvancedScheduler(config)
+        scheduler.autotuner.knobs["max_concurrent_chunks"].apply(5)
+        assert config["max_concurrent_chunks"] == 5
+
+    def test_progress_feeds_bytes_and_first_byte_latency(self):
+        scheduler = AdvancedScheduler({"autotune_concurrency": True})
+        download = SimpleNamespace(id="d", downloaded_size=0, estimated_size=None, progress=0.0)
+        scheduler._awaiting_first_byte["d"] = 0.0
+        scheduler.update_progress(download, 100)
+        scheduler.update_progress(download, 250)
+
+        assert scheduler.autotuner._bytes == 250
+        assert len(scheduler.autotuner._latencies) == 1
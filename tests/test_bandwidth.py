@@ -0,0 +1,89 @@
+"""Tests for the hierarchical token-bucket bandwidth limiter."""
+import time
+
+import pytest
+
+from snatch.bandwidth import MIN_BURST, BandwidthLimiter, TokenBucket
+
+
+class TestTokenBucket:
+    def test_unlimited_never_waits(self):
+        bucket = TokenBucket(0)
+        assert bucket.reserve(10 * 1024 * 1024) == 0.0
+        assert bucket.consumed == 10 * 1024 * 1024
+
+    def test_burst_then_wait_proportional_to_debt(self):
+        bucket = TokenBucket(1024 * 1024)
+        assert bucket.burst == 256 * 1024
+        assert bucket.reserve(256 * 1024) == 0.0
+        assert bucket.reserve(512 * 1024) == pytest.approx(0.5, abs=0.01)
+
+    def test_small_rates_keep_a_minimum_burst(self):
+        assert TokenBucket(1024).burst == MIN_BURST
+
+
+class TestBandwidthLimiter:
+    def test_child_is_charged_against_parent(self):
+        parent = BandwidthLimiter(100 * 1024, name="global")
+        child = parent.child(0, name="download")
+        wait = child.reserve(MIN_BURST * 2)
+        assert wait > 0
+        assert parent.bucket.consumed == child.bucket.consumed == MIN_BURST * 2
+
+    def test_is_limited_looks_at_ancestors(self):
+        assert not BandwidthLimiter(0).child().is_limited
+        assert BandwidthLimiter(1000).child().is_limited
+        assert BandwidthLimiter(0).child(1000).is_limited
+
+    def test_new_children_split_capacity_evenly(self):
+        parent = BandwidthLimiter(1_000_000)
+        a, b = parent.child(), parent.child()
+        assert a.bucket.rate == pytest.approx(500_000)
+        assert b.bucket.rate == pytest.approx(500_000)
+
+    def test_unused_allocation_is_redistributed(self):
+        parent = BandwidthLimiter(1_000_000)
+        busy, idle = parent.child(), parent.child()
+        busy.bucket.consumed += 500_000  # ran at its full 500 KB/s for a second
+        parent._rebalance_locked(time.monotonic() + 1.0)
+        assert idle.bucket.rate == pytest.approx(50_000)  # floor share
+        assert busy.bucket.rate == pytest.approx(950_000)
+        assert busy.bucket.rate + idle.bucket.rate == pytest.approx(1_000_000)
+
+    def test_child_ceiling_is_respected_and_rest_shared(self):
+        parent = BandwidthLimiter(1_000_000)
+        capped = parent.child(200_000)
+        free = parent.child()
+        assert capped.bucket.rate == pytest.approx(200_000)
+        assert free.bucket.rate == pytest.approx(800_000)
+
+    def test_leftover_a_capped_child_cannot_take_goes_to_the_rest(self):
+        parent = BandwidthLimiter(1_000_000)
+        capped, a, b = parent.child(300_000), parent.child(), parent.child()
+        for child in (capped, a, b):
+            child.bucket.consumed += 100_000  # each wants ~150 KB/s
+        parent._rebalance_locked(time.monotonic() + 1.0)
+        assert capped.bucket.rate == pytest.approx(300_000)
+        assert a.bucket.rate == pytest.approx(350_000, rel=1e-3)
+        assert b.bucket.rate == pytest.approx(350_000, rel=1e-3)
+
+    def test_uncapped_parent_applies_child_ceilings(self):
+        parent = BandwidthLimiter(0)
+        a, b = parent.child(300_000), parent.child()
+        assert a.bucket.rate == 300_000
+        assert b.bucket.rate == 0
+
+    def test_close_returns_share_to_siblings(self):
+        parent = BandwidthLimiter(1_000_000)
+        a, b = parent.child(), parent.child()
+        b.close()
+        assert parent.children == [a]
+        assert a.bucket.rate == pytest.approx(1_000_000)
+        assert b.parent is None
+
+    async def test_acquire_paces_transfer(self):
+        limiter = BandwidthLimiter(1024 * 1024).child()
+        start = time.monotonic()
+        for _ in range(8):
+            await limiter.acquire(64 * 1024)  # 512 KiB: burst covers 256 KiB
+        assert time.monotonic() - start >= 0.2
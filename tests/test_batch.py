@@ -0,0 +1,192 @@
+"""Tests for the bounded-concurrency batch engine."""
+import asyncio
+import time
+
+import pytest
+
+from snatch.batch import BatchEngine, ConcurrencyLimit
+
+
+class _Tracker:
+    """Worker that records how many calls overlap"""
+
+    def __init__(self, delay=0.01, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.running = 0
+        self.peak = 0
+        self.started = []
+
+    async def __call__(self, url):
+        self.started.append(url)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay(url) if callable(self.delay) else self.delay)
+            if url in self.fail:
+                raise RuntimeError(f"boom {url}")
+            return f"file-{url}"
+        finally:
+            self.running -= 1
+
+
+class TestBatchEngine:
+    async def test_limit_bounds_concurrency_and_results_are_ordered(self):
+        worker = _Tracker()
+        results = await BatchEngine(3).run([str(i) for i in range(20)], worker)
+
+        assert worker.peak == 3
+        assert [r.url for r in results] == [str(i) for i in range(20)]
+        assert all(r.ok and r.result == f"file-{r.url}" for r in results)
+
+    async def test_urls_are_consumed_lazily(self):
+        consumed = []
+
+        def urls():
+            for i in range(1000):
+                consumed.append(i)
+                yield str(i)
+
+        engine = BatchEngine(2)
+        stream = engine.stream(urls(), _Tracker(delay=0))
+        await stream.__anext__()
+        # Only the window (plus the refill after the first result) was pulled
+        assert len(consumed) <= 3
+        await stream.aclose()
+
+    async def test_results_stream_in_completion_order(self):
+        worker = _Tracker(delay=lambda url: 0.05 if url == "slow" else 0)
+        seen = []
+        results = await BatchEngine(2).run(["slow", "fast"], worker, on_result=lambda r: seen.append(r.url))
+
+        assert seen == ["fast", "slow"]
+        assert [r.url for r in results] == ["slow", "fast"]
+
+    async def test_failures_are_reported_not_raised(self):
+        results = await BatchEngine(2).run(["a", "b"], _Tracker(fail={"a"}))
+
+        assert results[0].status == "failed" and isinstance(results[0].error, RuntimeError)
+        assert results[1].ok
+
+    async def test_falsy_results_count_as_failed(self):
+        async def worker(url):
+            return None
+
+        results = await BatchEngine(2).run(["a"], worker)
+        assert results[0].status == "failed" and results[0].error is None
+
+    async def test_cancel_running_and_queued_urls(self):
+        engine = BatchEngine(1)
+        worker = _Tracker(delay=lambda url: 10 if url == "hang" else 0)
+
+        async def cancel_soon():
+            await asyncio.sleep(0.05)
+            assert engine.cancel("hang")
+            assert engine.cancel("queued")
+
+        canceller = asyncio.ensure_future(cancel_soon())
+        results = await asyncio.wait_for(engine.run(["hang", "queued", "ok"], worker), timeout=5)
+        await canceller
+
+        assert [r.status for r in results] == ["cancelled", "cancelled", "completed"]
+        assert "queued" not in worker.started
+
+    async def test_cancel_counts_even_if_worker_swallows_it(self):
+        engine = BatchEngine(1)
+
+        async def stubborn(url):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                return False
+
+        async def cancel_soon():
+            await asyncio.sleep(0.05)
+            engine.cancel("a")
+
+        canceller = asyncio.ensure_future(cancel_soon())
+        results = await asyncio.wait_for(engine.run(["a"], stubborn), timeout=5)
+        await canceller
+        assert results[0].status == "cancelled"
+
+    async def test_cancel_without_running_batch(self):
+        assert BatchEngine(1).cancel("a") is False
+
+    async def test_limit_is_shared_between_batches(self):
+        engine = BatchEngine(2)
+        worker = _Tracker(delay=0.02)
+
+        await asyncio.gather(
+            engine.run([f"a{i}" for i in range(6)], worker),
+            engine.run([f"b{i}" for i in range(6)], worker),
+        )
+        assert worker.peak == 2
+
+    async def test_max_in_flight_narrows_one_batch(self):
+        worker = _Tracker()
+        await BatchEngine(4).run([str(i) for i in range(8)], worker, max_in_flight=2)
+        assert worker.peak == 2
+
+    async def test_async_source_does_not_hold_back_results(self):
+        seen = []
+
+        async def slow_source():
+            yield "a"
+            await asyncio.sleep(0.2)
+            yield "b"
+
+        async def worker(url):
+            return url
+
+        async def on_result(result):
+            seen.append((result.url, time.monotonic()))
+
+        started = time.monotonic()
+        results = await BatchEngine(2).run(slow_source(), worker, on_result=on_result)
+
+        assert [r.url for r in results] == ["a", "b"]
+        # "a" was reported while the source was still producing "b"
+        assert seen[0][0] == "a" and seen[0][1] - started < 0.1
+
+
+class TestConcurrencyLimit:
+    async def test_raising_limit_wakes_waiters(self):
+        limit = ConcurrencyLimit(1)
+        await limit.acquire()
+        waiter = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        limit.set_limit(2)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limit.active == 2
+
+    async def test_released_slot_goes_to_the_oldest_waiter(self):
+        limit = ConcurrencyLimit(1)
+        await limit.acquire()
+        order = []
+
+        async def take(name):
+            await limit.acquire()
+            order.append(name)
+            limit.release()
+
+        first = asyncio.ensure_future(take("first"))
+        await asyncio.sleep(0)
+        limit.release()
+        # Asks before the woken waiter gets to run
+        await take("late")
+        await first
+        assert order == ["first", "late"] and limit.active == 0
+
+    async def test_cancelled_waiter_passes_its_slot_on(self):
+        limit = ConcurrencyLimit(1)
+        await limit.acquire()
+        first = asyncio.ensure_future(limit.acquire())
+        second = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        limit.release()
+        first.cancel()  # handed the slot, cancelled before it ran
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, timeout=1)
+        assert limit.active == 1
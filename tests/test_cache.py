@@ -68,3 +68,11 @@ class TestDownloadCache:
         assert stats["memory_entries"] == 1
         assert stats["max_memory_entries"] == 10
         assert stats["cache_ttl"] == 3600
+
+    def test_entry_ttl_expires_despite_reads(self, cache):
+        with patch("snatch.cache.time.time", return_value=1000.0):
+            cache.set("key1", {"data": "test"}, ttl=60)
+        with patch("snatch.cache.time.time", return_value=1050.0):
+            assert cache.get("key1") == {"data": "test"}
+        with patch("snatch.cache.time.time", return_value=1061.0):
+            assert cache.get("key1") is None
@@ -0,0 +1,380 @@
+"""Tests for the chunk engine primitives."""
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from snatch.chunk_engine import (
+    AdaptiveChunkSizer, ChunkBitmap, DiskSpaceLedger, HedgePolicy, MemoryBudget, MirrorPool, PartFile, RangePlanner,
+    RangeWriter, SequentialDigest, SlidingWindow, build_manifest, verify_manifest
+)
+
+
+class TestPartFile:
+    def test_preallocates_to_total_size(self, temp_dir):
+        path = os.path.join(temp_dir, "file.part")
+        with PartFile(path, 4096):
+            pass
+        assert os.path.getsize(path) == 4096
+
+    def test_out_of_order_writes(self, temp_dir):
+        path = os.path.join(temp_dir, "file.part")
+        with PartFile(path, 9) as part:
+            part.write_at(6, b"ghi")
+            part.write_at(0, b"abc")
+            part.write_at(3, b"def")
+        with open(path, "rb") as f:
+            assert f.read() == b"abcdefghi"
+
+    def test_resume_keeps_existing_data(self, temp_dir):
+        path = os.path.join(temp_dir, "file.part")
+        with PartFile(path, 6) as part:
+            part.write_at(0, b"abc")
+        part = PartFile(path, 6)
+        part.open(resume=True)
+        part.write_at(3, b"def")
+        part.close()
+        with open(path, "rb") as f:
+            assert f.read() == b"abcdef"
+
+    @pytest.mark.skipif(not hasattr(os, "posix_fallocate"), reason="needs posix_fallocate")
+    def test_preallocation_reserves_blocks(self, temp_dir):
+        path = os.path.join(temp_dir, "file.part")
+        with PartFile(path, 1024 * 1024) as part:
+            if not part.preallocated:
+                pytest.skip("filesystem does not support fallocate")
+        assert PartFile.allocated_bytes(path) == 1024 * 1024
+
+    def test_unknown_size_grows_with_writes(self, temp_dir):
+        path = os.path.join(temp_dir, "file.part")
+        with PartFile(path) as part:
+            assert os.path.getsize(path) == 0
+            part.write_at(0, b"abcdef")
+            part.truncate(3)
+        with open(path, "rb") as f:
+            assert f.read() == b"abc"
+
+
+class TestSlidingWindow:
+    async def test_refills_as_soon_as_a_slot_frees(self):
+        window = SlidingWindow(2)
+        order = []
+
+        async def job(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+            return name
+
+        window.submit(job("slow", 0.2), "slow")
+        window.submit(job("fast", 0.01), "fast")
+        assert not window.has_capacity()
+
+        finished = await window.wait_next()
+        assert [tag for tag, _ in finished] == ["fast"]
+        assert window.has_capacity()
+
+        window.submit(job("next", 0.01), "next")
+        while window:
+            await window.wait_next()
+        assert order == ["fast", "next", "slow"]
+
+    async def test_discard_frees_slot_and_timeout_returns_empty(self):
+        window = SlidingWindow(1)
+        task = window.submit(asyncio.sleep(10), "slow")
+        assert await window.wait_next(timeout=0.01) == []
+        assert window.items() == [("slow", task)]
+        window.discard(task)
+        assert window.has_capacity() and not window
+        await window.cancel_all()
+        assert task.cancelled()
+
+    async def test_cancel_all(self):
+        window = SlidingWindow(1)
+        task = window.submit(asyncio.sleep(10), "sleeper")
+        await window.cancel_all()
+        assert task.cancelled()
+        assert not window
+
+
+class TestChunkBitmap:
+    def test_missing_runs_and_completed_bytes(self):
+        bitmap = ChunkBitmap(total_size=10 * 100 + 50, block_size=100)
+        assert bitmap.num_blocks == 11
+        for index in (0, 1, 4, 10):
+            bitmap.mark(index)
+        assert bitmap.missing_runs() == [(200, 399), (500, 999)]
+        assert bitmap.completed_bytes() == 350
+        assert not bitmap.is_complete
+
+    def test_completed_prefix(self):
+        bitmap = ChunkBitmap(10, 4)
+        assert bitmap.completed_prefix() == 0
+        bitmap.mark(0)
+        bitmap.mark(2)
+        assert bitmap.completed_prefix() == 4
+        bitmap.mark(1)
+        assert bitmap.completed_prefix() == 10
+
+    def test_mark_range_covers_whole_blocks_only(self):
+        bitmap = ChunkBitmap(total_size=1000, block_size=100)
+        bitmap.mark_range(50, 349)
+        assert [bitmap.is_set(i) for i in range(4)] == [False, True, True, False]
+        bitmap.mark_range(900, 999)
+        assert bitmap.is_set(9)
+
+    def test_round_trip(self):
+        bitmap = ChunkBitmap(total_size=5000, block_size=64)
+        for index in range(0, bitmap.num_blocks, 3):
+            bitmap.mark(index)
+        restored = ChunkBitmap.from_dict(bitmap.to_dict())
+        assert restored.to_dict() == bitmap.to_dict()
+        assert restored.completed_blocks == bitmap.completed_blocks
+
+    def test_from_dict_rejects_garbage(self):
+        assert ChunkBitmap.from_dict(None) is None
+        assert ChunkBitmap.from_dict({"bits": "AA=="}) is None
+        assert ChunkBitmap.from_dict({"total_size": 5000, "block_size": 64, "bits": "AA=="}) is None
+
+
+class TestRangePlanner:
+    def test_carves_block_aligned_ranges_from_runs(self):
+        planner = RangePlanner([(0, 4095), (8192, 9999)], block_size=1024)
+        assert planner.remaining_bytes == 4096 + 1808
+        assert planner.next_range(2500) == (0, 2047)
+        assert planner.next_range(8192) == (2048, 4095)
+        assert planner.next_range(1024) == (8192, 9215)
+        assert planner.next_range(4096) == (9216, 9999)
+        assert not planner and planner.remaining_bytes == 0
+        assert planner.next_range(1024) is None
+
+    def test_requeue(self):
+        planner = RangePlanner([(0, 2047)], block_size=1024)
+        start, end = planner.next_range(1024)
+        planner.requeue(start, end)
+        assert planner.next_range(1024) == (0, 1023)
+        assert planner.remaining_bytes == 1024
+
+    def test_claim_splits_run(self):
+        planner = RangePlanner([(0, 4095)], block_size=1024)
+        assert planner.claim(1024, 2047)
+        assert not planner.claim(1024, 2047)
+        assert planner.remaining_bytes == 3072
+        assert planner.next_range(4096) == (0, 1023)
+        assert planner.next_range(4096) == (2048, 4095)
+
+
+class TestAdaptiveChunkSizer:
+    def _sizer(self, **kwargs):
+        defaults = dict(initial=1024 * 1024, minimum=256 * 1024, maximum=16 * 1024 * 1024)
+        defaults.update(kwargs)
+        return AdaptiveChunkSizer(**defaults)
+
+    def test_grows_toward_ceiling_on_fast_link(self):
+        sizer = self._sizer()
+        for _ in range(10):
+            # 1 MiB in 10 ms after a 5 ms TTFB: ~100 MiB/s per connection
+            sizer.record_success(sizer.current_size, 0.005, sizer.current_size / (100 * 1024 * 1024) + 0.005)
+        assert sizer.current_size == 16 * 1024 * 1024
+        assert all(d["to"] <= d["from"] * 2 for d in sizer.decisions)
+
+    def test_high_ttfb_forces_larger_ranges(self):
+        sizer = self._sizer(initial=256 * 1024)
+        for _ in range(10):
+            # 1 MiB/s but 1 s to first byte: ranges must amortize the wait
+            sizer.record_success(256 * 1024, 1.0, 1.25)
+        assert sizer.current_size >= 8 * 1024 * 1024
+
+    def test_shrinks_on_errors_and_slow_links(self):
+        sizer = self._sizer(initial=4 * 1024 * 1024)
+        sizer.record_failure()
+        assert sizer.current_size == 2 * 1024 * 1024
+        for _ in range(10):
+            sizer.record_success(64 * 1024, 0.001, 1.0)  # 64 KiB/s
+        assert sizer.current_size == 256 * 1024
+        assert sizer.snapshot()["errors"] == 1
+
+    def test_disabled_keeps_fixed_size(self):
+        sizer = self._sizer(enabled=False)
+        sizer.record_success(1024 * 1024, 0.001, 0.01)
+        sizer.record_failure()
+        assert sizer.current_size == 1024 * 1024
+        assert sizer.snapshot()["samples"] == 1
+
+    def test_tail_is_spread_over_connections(self):
+        sizer = self._sizer(initial=8 * 1024 * 1024)
+        assert sizer.next_size(remaining=4 * 1024 * 1024, parallelism=8) == 512 * 1024
+        assert sizer.next_size(remaining=100, parallelism=8) == 256 * 1024
+
+
+class TestHedgePolicy:
+    def _policy(self):
+        policy = HedgePolicy(factor=3.0, min_delay=0.5, min_samples=3)
+        for _ in range(3):
+            policy.record(1024 * 1024, 0.05, 0.15)  # ~10 MiB/s, 50 ms TTFB
+        return policy
+
+    def test_needs_samples_before_hedging(self):
+        policy = HedgePolicy(min_samples=3)
+        policy.record(1024, 0.01, 0.02)
+        assert policy.expected_seconds(1024) is None
+        assert not policy.is_straggler(1024, 0, 100.0)
+
+    def test_stalled_range_is_straggler(self):
+        policy = self._policy()
+        assert policy.expected_seconds(1024 * 1024) == pytest.approx(0.15)
+        assert not policy.is_straggler(1024 * 1024, 0, 0.3)  # within min_delay
+        assert policy.is_straggler(1024 * 1024, 0, 1.0)
+        assert policy.is_straggler(1024 * 1024, 1024, 1.0)  # crawling
+
+    def test_nearly_done_range_is_not_hedged(self):
+        policy = self._policy()
+        assert not policy.is_straggler(1024 * 1024, 1024 * 1024 - 1024, 1.0)
+
+
+class TestMirrorPool:
+    def test_pick_weights_by_throughput(self):
+        pool = MirrorPool(["a", "b"])
+        pool.record_success("a", 3 * 1024 * 1024, 1.0)
+        pool.record_success("b", 1024 * 1024, 1.0)
+        picks = []
+        for _ in range(8):
+            mirror = pool.pick()
+            mirror.in_flight += 1
+            picks.append(mirror.url)
+        assert picks.count("a") == 6 and picks.count("b") == 2
+
+    def test_unmeasured_mirror_gets_tried(self):
+        pool = MirrorPool(["a", "b"])
+        pool.record_success("a", 1024, 1.0)
+        pool.get("a").in_flight = 1
+        assert pool.pick().url == "b"
+
+    def test_demoted_and_disabled_mirrors(self):
+        pool = MirrorPool(["a", "b", "c"], cooldown=60)
+        pool.demote("a", "boom")
+        pool.disable("b", "size mismatch")
+        assert pool.pick().url == "c"
+        assert pool.pick(exclude="c").url == "c"  # only healthy mirror left
+        assert not pool.has_alternative("c")
+        pool.disable("c", "gone")
+        assert pool.pick().url == "a"  # demoted mirrors are the last resort
+        assert [m["state"] for m in pool.snapshot()] == ["demoted", "disabled", "disabled"]
+
+
+class TestMemoryBudget:
+    async def test_acquire_waits_for_release(self):
+        budget = MemoryBudget(100)
+        assert budget.try_acquire(80)
+        assert not budget.try_acquire(30)
+        waiter = asyncio.ensure_future(budget.acquire(30))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        budget.release(80)
+        await waiter
+        assert budget.in_use == 30 and budget.peak == 80 and budget.waits == 1
+
+    async def test_cancelled_waiter_does_not_leak(self):
+        budget = MemoryBudget(10)
+        budget.try_acquire(10)
+        waiter = asyncio.ensure_future(budget.acquire(5))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        budget.release(10)
+        assert budget.in_use == 0
+        assert budget.try_acquire(10)
+
+    def test_oversized_request_is_clamped(self):
+        budget = MemoryBudget(10)
+        assert budget.try_acquire(1000)
+        assert budget.in_use == 10
+
+
+class TestDiskSpaceLedger:
+    def _ledger(self, free, headroom=0):
+        return DiskSpaceLedger(headroom=headroom, free_space=lambda path: free, poll_interval=0.01)
+
+    def test_reservations_count_against_free_space(self, temp_dir):
+        ledger = self._ledger(1000, headroom=100)
+        path = os.path.join(temp_dir, "a.part")
+        assert ledger.try_reserve("a", path, 600)
+        assert not ledger.try_reserve("b", path, 400)
+        assert ledger.try_reserve("b", path, 300)
+        ledger.release("a")
+        assert ledger.available(path) == 600
+        assert ledger.snapshot()["reserved"] == 300
+
+    async def test_acquire_waits_for_release_or_refuses(self, temp_dir):
+        ledger = self._ledger(1000)
+        path = os.path.join(temp_dir, "a.part")
+        assert await ledger.acquire("a", path, 800)
+        assert not await ledger.acquire("b", path, 500)
+
+        waiter = asyncio.ensure_future(ledger.acquire("b", path, 500, timeout=5))
+        await asyncio.sleep(0.02)
+        assert not waiter.done()
+        ledger.release("a")
+        assert await waiter
+        assert ledger.snapshot() == {"reserved": 500, "active": 1, "waits": 1, "refused": 1}
+
+
+class TestRangeWriter:
+    async def test_streams_at_offsets_and_releases_budget(self, temp_dir):
+        path = os.path.join(temp_dir, "f.part")
+        budget = MemoryBudget(1024)
+        with PartFile(path, 12) as pf:
+            writer = RangeWriter(pf, 4, budget, flush_size=4)
+            for piece in (b"ab", b"cd", b"ef"):
+                await writer.write(piece)
+            await writer.flush()
+        with open(path, "rb") as f:
+            assert f.read() == b"\0" * 4 + b"abcdef" + b"\0" * 2
+        assert budget.in_use == 0 and budget.peak == 4
+
+    async def test_writers_sharing_tight_budget_do_not_deadlock(self, temp_dir):
+        path = os.path.join(temp_dir, "f.part")
+        budget = MemoryBudget(8)
+        with PartFile(path, 64) as pf:
+            async def fill(offset, byte):
+                writer = RangeWriter(pf, offset, budget, flush_size=1024)
+                for _ in range(8):
+                    await writer.write(byte * 4)
+                    await asyncio.sleep(0)
+                await writer.flush()
+
+            await asyncio.wait_for(asyncio.gather(fill(0, b"a"), fill(32, b"b")), timeout=5)
+        with open(path, "rb") as f:
+            assert f.read() == b"a" * 32 + b"b" * 32
+        assert budget.peak <= 8 and budget.in_use == 0
+
+
+class TestManifest:
+    async def test_sequential_digest_matches_whole_file_hash(self, temp_dir):
+        payload = os.urandom(50_000)
+        path = os.path.join(temp_dir, "f.part")
+        with PartFile(path, len(payload)) as pf:
+            digest = SequentialDigest(pf, read_size=4096, step=8192)
+            # Second half lands first: nothing can be hashed until the prefix fills
+            pf.write_at(25_000, payload[25_000:])
+            digest.advance_to(0)
+            pf.write_at(0, payload[:25_000])
+            digest.advance_to(25_000)
+            assert await digest.finish(len(payload)) == hashlib.sha256(payload).hexdigest()
+
+    def test_verify_manifest_finds_corrupt_ranges(self, temp_dir):
+        payload = os.urandom(3000)
+        path = os.path.join(temp_dir, "f.bin")
+        with open(path, "wb") as f:
+            f.write(payload)
+        hashes = {f"{s}-{s + 999}": hashlib.sha256(payload[s:s + 1000]).hexdigest() for s in (2000, 0, 1000)}
+        manifest = build_manifest(len(payload), hashes, file_path=path)
+        assert [c[0] for c in manifest["chunks"]] == [0, 1000, 2000]
+        assert manifest["file_size"] == 3000
+        assert verify_manifest(path, manifest) == []
+
+        with open(path, "r+b") as f:
+            f.seek(1500)
+            f.write(b"X")
+        assert verify_manifest(path, manifest) == [(1000, 1999)]
+        assert verify_manifest(path, manifest, ranges=[(0, 10)]) == []
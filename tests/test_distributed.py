@@ -0,0 +1,193 @@
+"""Tests for the distributed coordinator/worker mode."""
+import asyncio
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+from snatch.distributed import Coordinator, CoordinatorClient, DistributedError, DistributedWorker
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+async def coordinator():
+    config = {"distributed_lease_ttl": 1.0, "retry_delay_base": 0, "scheduler_max_retries": 0,
+              "per_host_concurrency": 0}
+    instance = Coordinator(config)
+    await instance.serve("127.0.0.1", 0)
+    yield instance
+    await instance.close()
+
+
+def _runner(delay=0.0, seen=None, fail=()):
+    async def run(url, options, on_progress):
+        if seen is not None:
+            seen.append(url)
+        on_progress(10, 100)
+        await asyncio.sleep(delay)
+        if url in fail:
+            raise RuntimeError(f"{url} is private")
+        return f"/downloads/{url}.mp4"
+    return run
+
+
+async def _wait_finished(client, ids, timeout=15):
+    return [await asyncio.wait_for(client.download(i, wait=timeout), timeout + 5) for i in ids]
+
+
+async def _start_workers(coordinator, count, runner, slots=2):
+    workers = [DistributedWorker(coordinator.url, runner, slots=slots, worker_id=f"w{i}", lease_wait=0.5)
+               for i in range(count)]
+    tasks = [asyncio.create_task(w.run()) for w in workers]
+    while len(coordinator.workers) < count:
+        await asyncio.sleep(0.01)
+    return workers, tasks
+
+
+async def _stop_workers(workers, tasks):
+    for worker in workers:
+        worker.stop()
+    await asyncio.wait_for(asyncio.gather(*tasks), 10)
+
+
+class TestCoordinator:
+    async def test_workers_run_submitted_downloads(self, coordinator):
+        workers, tasks = await _start_workers(coordinator, 2, _runner(0.01, fail={"bad"}))
+        client = CoordinatorClient(coordinator.url)
+        ids = await client.submit(["a", "b", "c", "bad"], {"format": "best"})
+        results = await _wait_finished(client, ids)
+
+        assert [r["status"] for r in results] == ["completed"] * 3 + ["failed"]
+        assert results[0]["result"] == "/downloads/a.mp4"
+        assert "private" in results[3]["error_message"]
+        status = await client.status()
+        assert sum(w["completed"] for w in status["workers"].values()) == 3
+        assert status["queue"]["completed_downloads"] == 3
+        await _stop_workers(workers, tasks)
+
+    async def test_capacity_follows_workers_joining_and_leaving(self, coordinator):
+        assert coordinator.scheduler.max_concurrent == 0
+        workers, tasks = await _start_workers(coordinator, 2, _runner(), slots=3)
+        assert coordinator.scheduler.max_concurrent == 6
+
+        workers[0].stop()
+        await asyncio.wait_for(tasks[0], 5)
+        assert coordinator.scheduler.max_concurrent == 3 and list(coordinator.workers) == ["w1"]
+        await _stop_workers(workers[1:], tasks[1:])
+
+    def test_autotuner_leaves_capacity_to_the_workers(self):
+        instance = Coordinator({"autotune_concurrency": True})
+        assert "max_concurrent" not in instance.scheduler.autotuner.knobs
+
+    async def test_leaving_worker_hands_back_its_leases(self, coordinator):
+        client = CoordinatorClient(coordinator.url)
+        await client.request("POST", "/join", {"worker": "gone", "slots": 1})
+        ids = await client.submit(["a"])
+        _, leased = await client.request("POST", "/lease", {"worker": "gone", "wait": 1})
+        assert [job["id"] for job in leased["jobs"]] == ids
+
+        await client.request("POST", "/leave", {"worker": "gone"})
+        seen = []
+        workers, tasks = await _start_workers(coordinator, 1, _runner(seen=seen))
+        assert (await _wait_finished(client, ids))[0]["status"] == "completed"
+        assert seen == ["a"]
+        await _stop_workers(workers, tasks)
+
+    async def test_idle_lease_waits_out_its_timeout(self, coordinator):
+        client = CoordinatorClient(coordinator.url)
+        await client.request("POST", "/join", {"worker": "idle", "slots": 1})
+        ids = await client.submit(["a"])
+        while not coordinator._waiting:
+            await asyncio.sleep(0.01)
+        # Cancelled while waiting for a worker: its entry must not count as work
+        await coordinator.scheduler.cancel_download(ids[0])
+        await asyncio.sleep(0)
+
+        started = time.monotonic()
+        _, leased = await client.request("POST", "/lease", {"worker": "idle", "wait": 0.5})
+        assert leased["jobs"] == []
+        assert time.monotonic() - started >= 0.45
+
+    async def test_expired_lease_is_requeued_and_stale_result_rejected(self, coordinator):
+        client = CoordinatorClient(coordinator.url)
+        await client.request("POST", "/join", {"worker": "stuck", "slots": 1})
+        ids = await client.submit(["a"])
+        await client.request("POST", "/lease", {"worker": "stuck", "wait": 1})
+
+        seen = []
+        workers, tasks = await _start_workers(coordinator, 1, _runner(seen=seen))
+        # No heartbeats from "stuck": after the lease TTL another worker gets the job
+        assert (await _wait_finished(client, ids))[0]["status"] == "completed"
+        assert seen == ["a"]
+        status, body = await client.request("POST", "/complete", {"worker": "w0", "id": ids[0], "result": "late"})
+        assert status == 409 and body == {"accepted": False}
+        await _stop_workers(workers, tasks)
+
+    async def test_killed_worker_process_loses_its_lease(self, coordinator, tmp_path):
+        script = tmp_path / "worker.py"
+        script.write_text(textwrap.dedent(f"""
+            import asyncio, sys
+            sys.path.insert(0, {str(REPO)!r})
+            from snatch.distributed import DistributedWorker
+
+            async def hang(url, options, on_progress):
+                print("started", flush=True)
+                await asyncio.sleep(3600)
+
+            asyncio.run(DistributedWorker(sys.argv[1], hang, slots=1, worker_id="doomed", lease_wait=0.5).run())
+        """))
+        process = await asyncio.create_subprocess_exec(sys.executable, str(script), coordinator.url,
+                                                       stdout=subprocess.PIPE)
+        try:
+            client = CoordinatorClient(coordinator.url)
+            ids = await client.submit(["a"])
+            assert await asyncio.wait_for(process.stdout.readline(), 15) == b"started\n"
+            assert coordinator.leases[ids[0]].worker == "doomed"
+        finally:
+            process.kill()
+            await process.wait()
+
+        workers, tasks = await _start_workers(coordinator, 1, _runner())
+        assert (await _wait_finished(client, ids))[0]["status"] == "completed"
+        assert "doomed" not in coordinator.workers
+        await _stop_workers(workers, tasks)
+
+    async def test_token_is_required_when_configured(self):
+        instance = Coordinator({"distributed_token": "secret"})
+        await instance.serve("127.0.0.1", 0)
+        try:
+            with pytest.raises(DistributedError, match="token"):
+                await CoordinatorClient(instance.url).submit(["a"])
+            assert len(await CoordinatorClient(instance.url, token="secret").submit(["a"])) == 1
+        finally:
+            await instance.close()
+
+    async def test_public_bind_requires_a_token(self):
+        with pytest.raises(ValueError, match="distributed_token"):
+            await Coordinator({}).serve("0.0.0.0", 0)
+        instance = Coordinator({"distributed_token": "secret"})
+        try:
+            assert await instance.serve("0.0.0.0", 0)
+        finally:
+            await instance.close()
+
+    async def test_throughput_scales_with_workers(self, coordinator):
+        client = CoordinatorClient(coordinator.url)
+
+        async def run_batch(count):
+            workers, tasks = await _start_workers(coordinator, count, _runner(0.05))
+            started = time.monotonic()
+            ids = await client.submit([f"u{i}" for i in range(24)])
+            await _wait_finished(client, ids)
+            elapsed = time.monotonic() - started
+            await _stop_workers(workers, tasks)
+            return elapsed
+
+        one = await run_batch(1)
+        four = await run_batch(4)
+        # 24 jobs of 50ms on 2 slots: ~0.6s on one worker, ~0.15s on four
+        assert four < one / 2.5
@@ -0,0 +1,65 @@
+"""Tests for the extraction process pool."""
+import os
+
+import pytest
+
+from snatch.extract_pool import ExtractionPool, is_playlist
+
+
+def _pid_job(url, opts):
+    return {"id": url, "pid": os.getpid(), "opts": opts}
+
+
+def _failing_job(url, opts):
+    if url == "crash":
+        os._exit(1)
+    raise ValueError(f"cannot extract {url}")
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def make(**kwargs):
+        pool = ExtractionPool(**kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+class TestExtractionPool:
+    async def test_returns_plain_info_from_a_worker(self, pool_factory):
+        pool = pool_factory(workers=2, job=_pid_job)
+        info = await pool.extract("abc", {"quiet": True, "progress_hooks": [print], "logger": lambda m: m})
+
+        assert info["id"] == "abc" and info["pid"] != os.getpid()
+        # Hooks and callables stay in the parent
+        assert info["opts"] == {"quiet": True}
+
+    def test_workers_are_recycled(self, pool_factory):
+        pool = pool_factory(workers=1, max_jobs=2, job=_pid_job)
+        pids = {pool.extract_sync(str(i), {})["pid"] for i in range(6)}
+        assert len(pids) >= 3
+
+    async def test_extraction_errors_propagate(self, pool_factory):
+        pool = pool_factory(workers=1, job=_failing_job)
+        with pytest.raises(ValueError):
+            await pool.extract("abc", {})
+
+    async def test_broken_pool_falls_back_and_recovers(self, pool_factory):
+        pool = pool_factory(workers=1, job=_failing_job)
+        assert await pool.extract("crash", {}) is None
+        assert pool.snapshot()["fallbacks"] == 1
+        # The next job gets a fresh pool
+        with pytest.raises(ValueError):
+            await pool.extract("abc", {})
+        assert pool.snapshot()["generations"] == 2
+
+
+def test_is_playlist():
+    assert is_playlist({"_type": "playlist"})
+    assert not is_playlist({"id": "x"})
+    assert not is_playlist(None)
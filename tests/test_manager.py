@@ -1,5 +1,8 @@
 """Tests for the download manager module."""
 import asyncio
+import os
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -59,3 +62,912 @@ class TestConnectionPooling:
         assert client.connector._limit == 30
         assert client.connector._limit_per_host == 10
         await client.close()
+
+
+def _make_range_app(payload, delays=None, etag='"v1"', requests=None, stall_once=False,
+                    fail_ranges=False):
+    """Build an aiohttp app serving ``payload`` with Range/If-Range support.
+
+    ``delays`` maps a range start offset to seconds to stall before replying
+    (only on the first request for that offset with ``stall_once``);
+    requested range starts are appended to ``requests`` when given, and
+    ``fail_ranges`` answers every range request with a 503.
+    """
+    from aiohttp import web
+
+    delays = delays or {}
+
+    async def handler(request):
+        headers = {"ETag": etag} if etag else {}
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if not range_header or (if_range and if_range != etag):
+            return web.Response(body=payload, headers=headers)
+        start, end = range_header.replace("bytes=", "").split("-")
+        start, end = int(start), int(end)
+        if requests is not None:
+            requests.append(start)
+        if fail_ranges:
+            return web.Response(status=503)
+        await asyncio.sleep(delays.pop(start, 0) if stall_once else delays.get(start, 0))
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(payload)}"
+        return web.Response(status=206, body=payload[start:end + 1], headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/file", handler)
+    return app
+
+
+def _make_stream_app(payload, ranges=False, chunked=False, drop_once_at=None, seen=None):
+    """Build an aiohttp app for origins the range engine cannot use.
+
+    Without ``ranges`` the Range header is ignored; with it a range is always
+    answered up to the end of the file with an unknown (``*``) total.
+    ``chunked`` omits Content-Length, ``drop_once_at`` cuts the first 200
+    response off after that many bytes, and each GET's Range header is
+    appended to ``seen`` when given.
+    """
+    from aiohttp import web
+
+    dropped = []
+
+    async def handler(request):
+        range_header = request.headers.get("Range")
+        if seen is not None:
+            seen.append(range_header)
+        response = web.StreamResponse(headers={"ETag": '"v1"'})
+        start = 0
+        if ranges and range_header:
+            start = int(range_header.replace("bytes=", "").split("-")[0])
+            response.set_status(206)
+            response.headers["Content-Range"] = f"bytes {start}-{len(payload) - 1}/*"
+        body = payload[start:]
+        if chunked:
+            response.enable_chunked_encoding()
+        else:
+            response.content_length = len(body)
+        await response.prepare(request)
+        if drop_once_at is not None and not dropped and response.status == 200:
+            dropped.append(True)
+            await response.write(body[:drop_once_at])
+            await asyncio.sleep(0.05)
+            request.transport.close()
+            return response
+        await response.write(body)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/file", handler)
+    return app
+
+
+@pytest.fixture
+async def range_server():
+    """Start a local Range-capable HTTP server; yields a factory taking the app."""
+    from aiohttp.test_utils import TestServer
+
+    servers = []
+
+    async def _start(app):
+        server = TestServer(app)
+        await server.start_server()
+        servers.append(server)
+        return str(server.make_url("/file"))
+
+    yield _start
+    for server in servers:
+        await server.close()
+
+
+class TestSlidingWindowDownload:
+    """Test the sliding-window chunk engine in AsyncDownloadManager.download."""
+
+    async def test_download_reassembles_file(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(5 * 1024 + 123)
+        url = await range_server(_make_range_app(payload))
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            result = await mgr.download(url, output)
+
+        assert result == output
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        assert not os.path.exists(output + ".part")
+
+    async def test_slow_range_does_not_block_others(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(8 * 1024)
+        url = await range_server(_make_range_app(payload, delays={1024: 0.3}))
+        mock_config["max_concurrent_chunks"] = 2
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+
+        completed = []
+        original = mgr._fetch_chunk_to_file
+
+        async def _record(url_, chunk, *args, **kwargs):
+            ok = await original(url_, chunk, *args, **kwargs)
+            completed.append(chunk.start)
+            return ok
+
+        mgr._fetch_chunk_to_file = _record
+        output = os.path.join(temp_dir, "out.bin")
+        async with mgr:
+            await mgr.download(url, output)
+
+        # The stalled range finishes last while the other slot keeps cycling
+        assert completed[-1] == 1024
+        with open(output, "rb") as f:
+            assert f.read() == payload
+
+    async def test_straggling_range_is_hedged(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(16 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, delays={1024: 30}, requests=requests, stall_once=True))
+        mock_config.update(max_concurrent_chunks=4, adaptive_chunk_sizing=False,
+                           hedge_min_delay=0.1, hedge_check_interval=0.05)
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await asyncio.wait_for(mgr.download(url, output), timeout=10)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        # The stalled range was duplicated and the duplicate won
+        assert requests.count(1024) == 2
+        assert mgr.get_transfer_stats(url)["hedging"] == {"hedged": 1, "hedge_wins": 1}
+
+    async def test_range_size_adapts_to_measured_throughput(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(64 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, requests=requests))
+        mock_config["max_concurrent_chunks"] = 1
+        mock_config["max_chunk_size"] = 16 * 1024
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download(url, output)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        # A fast local link grows ranges from 1 KiB up to the configured ceiling
+        assert len(requests) < 64
+        sizing = mgr.get_transfer_stats(url)["chunk_sizing"]
+        assert sizing["chunk_size"] == 16 * 1024
+        assert sizing["decisions"] and sizing["throughput_bps"] > 0
+
+
+class TestBitmapResume:
+    """Test out-of-order resume from the persisted completion bitmap."""
+
+    def _session_manager(self, temp_dir):
+        from snatch.session import AsyncSessionManager
+        return AsyncSessionManager(os.path.join(temp_dir, "sessions.json"))
+
+    def _seed_partial(self, sm, url, output, payload, done_blocks, block, etag='"v1"'):
+        from snatch.chunk_engine import ChunkBitmap
+        bitmap = ChunkBitmap(len(payload), block)
+        with open(output + ".part", "wb") as f:
+            f.write(b"\0" * len(payload))
+            for index in done_blocks:
+                start, end = bitmap.block_range(index)
+                f.seek(start)
+                f.write(payload[start:end + 1])
+                bitmap.mark(index)
+        sm.update_chunk_state(
+            url,
+            {"bitmap": bitmap.to_dict(), "chunk_hashes": {}, "validator": {"etag": etag}},
+            bitmap.completed_bytes(),
+            total_size=len(payload),
+        )
+
+    async def test_resume_fetches_only_missing_ranges(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(6 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, requests=requests))
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager = self._session_manager(temp_dir)
+        output = os.path.join(temp_dir, "out.bin")
+        self._seed_partial(mgr.session_manager, url, output, payload, done_blocks=[0, 2, 5], block=1024)
+
+        async with mgr:
+            assert await mgr.download(url, output) == output
+
+        assert sorted(requests) == [1024, 3 * 1024, 4 * 1024]
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        state = mgr.session_manager.get_chunk_state(url)
+        assert len(state["chunk_hashes"]) == 3
+
+    async def test_download_records_verification_manifest(self, mock_config, temp_dir, range_server):
+        import hashlib
+        payload = os.urandom(40 * 1024)
+        url = await range_server(_make_range_app(payload))
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 4096
+        mgr.session_manager = self._session_manager(temp_dir)
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download(url, output)
+
+        manifest = mgr.session_manager.get_manifest(url)
+        assert manifest["sha256"] == hashlib.sha256(payload).hexdigest()
+        assert sum(end - start + 1 for start, end, _ in manifest["chunks"]) == len(payload)
+
+        # Unchanged file: verified from metadata without re-reading it
+        with patch("snatch.session.verify_manifest") as rehash:
+            assert mgr.session_manager.verify_file_integrity(url) == (True, None)
+            rehash.assert_not_called()
+
+        # Modified file: only the chunk holding the bad byte is reported
+        with open(output, "r+b") as f:
+            f.seek(10_000)
+            f.write(bytes([payload[10_000] ^ 0xFF]))
+        os.utime(output, (0, 0))
+        ok, message = mgr.session_manager.verify_file_integrity(url)
+        assert not ok and message.startswith("Checksum mismatch in 1 chunk(s)")
+
+    async def test_changed_etag_restarts_from_scratch(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(4 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, etag='"v2"', requests=requests))
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager = self._session_manager(temp_dir)
+        output = os.path.join(temp_dir, "out.bin")
+        self._seed_partial(mgr.session_manager, url, output, os.urandom(4 * 1024), done_blocks=[0, 1], block=1024)
+
+        async with mgr:
+            assert await mgr.download(url, output) == output
+
+        assert sorted(requests) == [0, 1024, 2048, 3072]
+        with open(output, "rb") as f:
+            assert f.read() == payload
+
+    async def test_if_range_mismatch_raises_origin_changed(self, mock_config, temp_dir):
+        from aiohttp.test_utils import TestServer
+        from snatch.manager import DownloadChunk, OriginChangedError
+
+        payload = os.urandom(2048)
+        server = TestServer(_make_range_app(payload, etag='"v2"'))
+        await server.start_server()
+        try:
+            mgr = _make_manager(mock_config)
+            async with mgr:
+                with pytest.raises(OriginChangedError):
+                    await mgr._download_chunk(str(server.make_url("/file")), DownloadChunk(0, 1023), if_range='"v1"')
+        finally:
+            await server.close()
+
+
+class TestMirrorDownload:
+    """Test spreading ranges across equivalent mirror URLs."""
+
+    def _manager(self, mock_config):
+        mock_config.update(max_concurrent_chunks=4, adaptive_chunk_sizing=False, hedge_requests=False)
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        return mgr
+
+    async def test_ranges_spread_across_mirrors(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(32 * 1024)
+        seen_a, seen_b = [], []
+        url_a = await range_server(_make_range_app(payload, requests=seen_a))
+        url_b = await range_server(_make_range_app(payload, requests=seen_b))
+        mgr = self._manager(mock_config)
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download([url_a, url_b], output)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        assert seen_a and seen_b
+        assert len(seen_a) + len(seen_b) == 32
+        assert [m["url"] for m in mgr.get_transfer_stats(url_a)["mirrors"]] == [url_a, url_b]
+
+    async def test_mismatched_mirror_is_disabled(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(8 * 1024)
+        seen_bad = []
+        url = await range_server(_make_range_app(payload))
+        bad = await range_server(_make_range_app(payload + b"x", requests=seen_bad))
+        other_etag = await range_server(_make_range_app(payload, etag='"v2"', requests=seen_bad))
+        mgr = self._manager(mock_config)
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download(url, output, mirrors=[bad, other_etag])
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        assert seen_bad == []
+        states = {m["url"]: m["state"] for m in mgr.get_transfer_stats(url)["mirrors"]}
+        assert states == {url: "active", bad: "disabled", other_etag: "disabled"}
+
+    async def test_failing_mirror_is_demoted(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(16 * 1024)
+        url = await range_server(_make_range_app(payload))
+        broken = await range_server(_make_range_app(payload, fail_ranges=True))
+        mgr = self._manager(mock_config)
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download([broken, url], output)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        mirrors = {m["url"]: m for m in mgr.get_transfer_stats(broken)["mirrors"]}
+        assert mirrors[broken]["state"] == "demoted" and mirrors[broken]["bytes"] == 0
+        assert mirrors[url]["bytes"] == len(payload)
+
+
+class TestMemoryBoundedDownload:
+    """Test that streamed range writes stay within the shared memory budget."""
+
+    async def test_in_flight_bytes_stay_within_budget(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(2 * 1024 * 1024)
+        url = await range_server(_make_range_app(payload))
+        mock_config.update(max_concurrent_chunks=8, max_buffer_memory=128 * 1024,
+                           write_buffer_size=64 * 1024, adaptive_chunk_sizing=False)
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 256 * 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download(url, output)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        memory = mgr.get_transfer_stats(url)["memory"]
+        assert 0 < memory["peak"] <= 128 * 1024
+        assert memory["in_use"] == 0
+
+
+class TestBandwidthLimitedDownload:
+    """Test that the bandwidth limiter paces the chunk read loop."""
+
+    async def test_global_limit_paces_download(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(128 * 1024)
+        url = await range_server(_make_range_app(payload))
+        mock_config.update(global_bandwidth_limit=256 * 1024, hedge_requests=False)
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 16 * 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        start = time.monotonic()
+        async with mgr:
+            await mgr.download(url, output)
+        elapsed = time.monotonic() - start
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        # 64 KiB burst, then the remaining 64 KiB at 256 KiB/s
+        assert elapsed >= 0.2
+        assert mgr.get_transfer_stats(url)["bandwidth"]["consumed"] == len(payload)
+        assert mgr.bandwidth_limiter.children == []
+
+
+class TestDiskAdmission:
+    """Test preallocation and free-space admission in AsyncDownloadManager.download."""
+
+    async def test_download_refused_when_volume_would_overflow(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(64 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, requests=requests))
+        mock_config["disk_space_headroom"] = 0
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        mgr.disk_ledger._free_space = lambda path: 100 * 1024
+        # Another download already holds most of the volume
+        assert mgr.disk_ledger.try_reserve("other", temp_dir + "/other.part", 50 * 1024)
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            assert await mgr.download(url, output) is None
+
+        assert requests == [0]  # only the probe
+        assert not os.path.exists(output + ".part")
+        assert mgr.disk_ledger.snapshot()["active"] == 1
+
+    async def test_reservation_released_after_download(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(64 * 1024)
+        url = await range_server(_make_range_app(payload))
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 16 * 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        output = os.path.join(temp_dir, "out.bin")
+
+        async with mgr:
+            await mgr.download(url, output)
+
+        with open(output, "rb") as f:
+            assert f.read() == payload
+        assert mgr.disk_ledger.snapshot()["active"] == 0
+        assert mgr.get_transfer_stats(url)["preallocated"] == hasattr(os, "posix_fallocate")
+
+
+class _FakeYoutubeDL:
+    """Stand-in for yt_dlp.YoutubeDL recording extractor and processing calls."""
+
+    calls = []
+    output_dir = ""
+
+    def __init__(self, params=None):
+        self.params = params or {}
+        self._ies = {}
+        self._progress_hooks = []
+
+    def add_progress_hook(self, hook):
+        self._progress_hooks.append(hook)
+
+    def save_cookies(self):
+        pass
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=True):
+        self.calls.append(("extract", download))
+        return {"id": "abc", "title": "Clip", "ext": "mp4", "filesize": 1024,
+                "formats": [{"format_id": "18", "url": "https://cdn.example/18"}]}
+
+    def process_ie_result(self, info, download=True, extra_info=None):
+        self.calls.append(("process", download))
+        info["_processed"] = True
+        return info
+
+    def prepare_filename(self, info):
+        return os.path.join(self.output_dir, f"{info['title']}.{info['ext']}")
+
+    @staticmethod
+    def sanitize_info(info):
+        return dict(info)
+
+
+class TestSingleExtraction:
+    """Test that the yt-dlp path extracts each URL once and reuses cached info."""
+
+    async def test_extracted_info_is_processed_and_cached(self, mock_config, temp_dir):
+        from rich.console import Console
+        from snatch.cache import DownloadCache
+
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.output_dir = temp_dir
+        with patch("snatch.cache.CACHE_DIR", temp_dir), patch("yt_dlp.YoutubeDL", _FakeYoutubeDL):
+            mgr = _make_manager(mock_config)
+            mgr.download_cache = DownloadCache()
+            console = Console(quiet=True)
+            url = "https://example.com/watch?v=abc"
+
+            first = await mgr._download_single_url(url, {}, console, {})
+            # A retry (or re-run) skips the extractor entirely
+            second = await mgr._download_single_url(url + "#t=5", {}, console, {})
+
+        assert first == second == os.path.join(temp_dir, "Clip.mp4")
+        assert _FakeYoutubeDL.calls == [("extract", False), ("process", True), ("process", True)]
+        # Both downloads ran on one pooled instance
+        assert mgr.ydl_pool.snapshot() == {"created": 1, "reused": 1, "idle": 1, "keys": 1}
+        cached = mgr.download_cache.get(mgr._info_cache_key(_FakeYoutubeDL(), url))
+        assert "_processed" not in cached["info"]
+
+
+class TestDownloadArchive:
+    """Test that finished media are archived and skipped on re-runs."""
+
+    async def test_rerun_skips_archived_urls_before_extraction(self, mock_config, temp_dir):
+        from rich.console import Console
+
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.output_dir = temp_dir
+        mock_config["info_cache_ttl"] = 0
+        mock_config["download_archive"] = os.path.join(temp_dir, "archive.txt")
+        url = "https://example.com/watch?v=abc"
+        with patch("yt_dlp.YoutubeDL", _FakeYoutubeDL):
+            mgr = _make_manager(mock_config)
+            assert await mgr._download_single_url(url, {}, Console(quiet=True), {})
+
+            rerun = _make_manager(mock_config)
+            with patch.object(rerun, "_prepare_download_environment"), \
+                    patch.object(rerun, "_process_downloads") as process:
+                assert await rerun.download_with_options([url + "#again"], {}) == []
+                process.assert_not_called()
+
+                await rerun.download_with_options([url, "https://example.com/new"], {})
+                process.assert_called_once_with(["https://example.com/new"], {})
+
+                await rerun.download_with_options([url], {"ignore_archive": True})
+                assert process.call_args.args[0] == [url]
+
+
+class TestBatchDownloads:
+    """Test that batches run concurrently under the configured limit."""
+
+    async def test_ytdlp_downloads_overlap_in_threads(self, mock_config, temp_dir):
+        from rich.console import Console
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        class _OverlappingYoutubeDL(_FakeYoutubeDL):
+            def process_ie_result(self, info, download=True):
+                # Only passes if both downloads are inside yt-dlp at once
+                barrier.wait()
+                return super().process_ie_result(info, download)
+
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.output_dir = temp_dir
+        mock_config["info_cache_ttl"] = 0
+        with patch("yt_dlp.YoutubeDL", _OverlappingYoutubeDL):
+            mgr = _make_manager(mock_config)
+            console = Console(quiet=True)
+            results = await asyncio.gather(
+                mgr._download_single_url("https://example.com/a", {}, console, {}),
+                mgr._download_single_url("https://example.com/b", {}, console, {}),
+            )
+        assert results == [os.path.join(temp_dir, "Clip.mp4")] * 2
+
+    async def test_batch_respects_limit_and_reports_in_order(self, mock_config):
+        mock_config["max_concurrent"] = 2
+        mock_config["playlist_lookahead"] = 0
+        mgr = _make_manager(mock_config)
+        running = {"now": 0, "peak": 0}
+
+        async def fake_download(url, ydl_opts, console, options, progress=None, info=None, **kwargs):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.05 if url.endswith("0") else 0.01)
+            running["now"] -= 1
+            return None if url.endswith("3") else f"/tmp/{url[-1]}.mp4"
+
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_try_p2p_download", return_value=None), \
+                patch.object(mgr, "_download_single_url", side_effect=fake_download), \
+                patch.object(mgr, "_report_download_results") as report, \
+                patch.object(mgr.batch_engine, "run", wraps=mgr.batch_engine.run) as run:
+            files = await mgr._process_downloads([f"https://example.com/{i}" for i in range(6)], {})
+
+        run.assert_called_once()
+        assert running["peak"] == 2
+        assert files == ["/tmp/0.mp4", "/tmp/1.mp4", "/tmp/2.mp4", "/tmp/4.mp4", "/tmp/5.mp4"]
+        report.assert_called_once()
+
+    async def test_batch_honors_per_host_limits(self, mock_config):
+        mock_config.update(max_concurrent=4, playlist_lookahead=0, per_host_concurrency=1)
+        mgr = _make_manager(mock_config)
+        running, peak = {}, {}
+
+        async def fake_download(url, ydl_opts, console, options, progress=None, info=None, **kwargs):
+            host = url.split("/")[2]
+            running[host] = running.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), running[host])
+            await asyncio.sleep(0.01)
+            running[host] -= 1
+            return f"/tmp/{host}-{url[-1]}.mp4"
+
+        urls = [f"https://{host}.example/{i}" for i in range(3) for host in ("a", "b")]
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_try_p2p_download", return_value=None), \
+                patch.object(mgr, "_download_single_url", side_effect=fake_download), \
+                patch.object(mgr, "_report_download_results"):
+            files = await mgr._process_downloads(urls, {})
+
+        assert len(files) == 6
+        assert peak == {"a.example": 1, "b.example": 1}
+        assert mgr.advanced_scheduler.hosts.hosts == {}
+
+    async def test_batch_feeds_the_autotuner(self, mock_config):
+        mock_config.update(max_concurrent=2, playlist_lookahead=0, autotune_concurrency=True)
+        mgr = _make_manager(mock_config)
+
+        async def fake_download(url, ydl_opts, console, options, progress=None, info=None,
+                                on_progress=None, **kwargs):
+            await asyncio.to_thread(on_progress, 100, 300)
+            await asyncio.to_thread(on_progress, 300, 300)
+            return None if url.endswith("bad") else f"/tmp/{url}.mp4"
+
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_try_p2p_download", return_value=None), \
+                patch.object(mgr, "_download_single_url", side_effect=fake_download), \
+                patch.object(mgr, "_report_download_results"):
+            await mgr._process_downloads(["a", "b", "bad"], {})
+        await asyncio.sleep(0)  # progress handed over from the download threads
+
+        tuner = mgr.advanced_scheduler.autotuner
+        assert tuner._bytes == 900
+        assert len(tuner._latencies) == 3
+        assert (tuner._ok, tuner._failed) == (2, 1)
+
+    async def test_downloads_continue_while_files_are_post_processed(self, mock_config):
+        mock_config["max_concurrent"] = 1
+        mock_config["playlist_lookahead"] = 0
+        mock_config["postprocess_workers"] = 2
+        mgr = _make_manager(mock_config)
+        downloaded = []
+        processing_started = threading.Event()
+
+        async def fake_download(url, ydl_opts, console, options, progress=None, info=None, **kwargs):
+            downloaded.append(url)
+            return f"/tmp/{url[-1]}.mp4"
+
+        async def slow_audio(file_path, options):
+            processing_started.set()
+            # Blocking work, as the audio processor does inside its coroutines
+            time.sleep(0.2)
+
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_try_p2p_download", return_value=None), \
+                patch.object(mgr, "_download_single_url", side_effect=fake_download), \
+                patch.object(mgr, "_needs_audio_processing", return_value=True), \
+                patch.object(mgr, "_process_audio_async", side_effect=slow_audio), \
+                patch.object(mgr, "_report_download_results"), \
+                patch.object(mgr.batch_engine, "run", wraps=mgr.batch_engine.run) as run:
+            started = time.monotonic()
+            files = await mgr._process_downloads([f"https://example.com/{i}" for i in range(3)], {})
+            elapsed = time.monotonic() - started
+
+        run.assert_called_once()
+
+        assert files == ["/tmp/0.mp4", "/tmp/1.mp4", "/tmp/2.mp4"]
+        assert processing_started.is_set()
+        # Three 200ms jobs on two workers, with downloads not waiting for any of them
+        assert elapsed < 0.55
+        assert mgr.postprocess_pool.snapshot()["completed"] == 3
+        mgr.postprocess_pool.close()
+
+
+    async def test_playlist_entries_download_from_prefetched_info(self, mock_config, temp_dir):
+        class _PlaylistYoutubeDL(_FakeYoutubeDL):
+            def extract_info(self, url, ie_key=None, download=True, process=True):
+                self.calls.append(("extract", url))
+                if url.endswith("list"):
+                    return {"_type": "playlist", "id": "list", "title": "List",
+                            "entries": ({"_type": "url", "url": f"https://example.com/v{i}"} for i in range(3))}
+                return {"id": url[-2:], "title": url[-2:], "ext": "mp4"}
+
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.output_dir = temp_dir
+        mock_config["info_cache_ttl"] = 0
+        with patch("yt_dlp.YoutubeDL", _PlaylistYoutubeDL):
+            mgr = _make_manager(mock_config)
+            with patch.object(mgr, "_setup_download_options", return_value={}), \
+                    patch.object(mgr, "_report_download_results"), \
+                    patch.object(mgr.batch_engine, "run", wraps=mgr.batch_engine.run) as run:
+                files = await mgr._process_downloads(["https://example.com/list", "https://example.com/v3"], {})
+
+        run.assert_called_once()
+        assert sorted(files) == [os.path.join(temp_dir, f"v{i}.mp4") for i in range(4)]
+        # Every URL was extracted once, by the expander; downloads reused its info
+        extracted = [c for c in _FakeYoutubeDL.calls if c[0] == "extract"]
+        assert len(extracted) == 5
+        assert [c for c in _FakeYoutubeDL.calls if c == ("process", True)] == [("process", True)] * 4
+
+    async def test_batch_download_runs_the_requested_workers(self, mock_config):
+        from snatch.manager import DownloadManager
+        del mock_config["max_concurrent"]
+        mgr = DownloadManager(mock_config, session_manager=MagicMock(), download_cache=MagicMock(),
+                              file_organizer=MagicMock(), download_stats=MagicMock())
+        running, peak = [0], [0]
+
+        async def download(url, **kwargs):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return True
+
+        with patch.object(mgr, "download", side_effect=download):
+            assert await mgr.batch_download([str(i) for i in range(12)], max_concurrent=6) == [True] * 12
+            assert peak[0] == 6
+            peak[0] = 0
+            await mgr.batch_download([str(i) for i in range(40)])
+        assert peak[0] == DownloadManager.DEFAULT_BATCH_WORKERS
+
+
+class TestScheduledDownloads:
+    """Test that the advanced scheduler drives real manager downloads."""
+
+    async def test_scheduler_runs_downloads_with_progress_and_bandwidth(self, mock_config):
+        from snatch.advanced_scheduler import Priority
+        mock_config.update(max_concurrent=2, retry_delay_base=0, scheduler_max_retries=0, playlist_lookahead=0)
+        mgr = _make_manager(mock_config)
+        scheduler = mgr.advanced_scheduler
+        limiters = {}
+
+        async def fake_download(url, ydl_opts, console, options, progress=None, info=None,
+                                bandwidth=None, on_progress=None):
+            limiters[url] = bandwidth
+            on_progress(512, 1024)
+            await asyncio.sleep(0.01)
+            return None if url.endswith("1") else f"/tmp/{url[-1]}.mp4"
+
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_try_p2p_download", return_value=None), \
+                patch.object(mgr, "_download_single_url", side_effect=fake_download), \
+                patch.object(mgr, "_report_download_results"):
+            try:
+                files = await asyncio.wait_for(mgr._process_downloads(
+                    [f"https://example.com/{i}" for i in range(3)], {"priority": 2}), timeout=10)
+            finally:
+                await scheduler.stop()
+
+        assert files == ["/tmp/0.mp4", "/tmp/2.mp4"]
+        assert all(limiter is not None for limiter in limiters.values())
+        downloads = list(scheduler.downloads.values())
+        assert {d.priority for d in downloads} == {Priority.HIGH}
+        assert all(d.downloaded_size == 512 and d.estimated_size == 1024 for d in downloads)
+        assert mgr.bandwidth_limiter.children == []
+
+    async def test_scheduled_playlist_is_expanded_without_archived_entries(self, mock_config, temp_dir):
+        class _PlaylistYoutubeDL(_FakeYoutubeDL):
+            def extract_info(self, url, ie_key=None, download=True, process=True):
+                self.calls.append(("extract", url))
+                if url.endswith("list"):
+                    return {"_type": "playlist", "id": "list", "title": "List",
+                            "entries": [{"_type": "url", "url": f"https://example.com/v{i}"} for i in range(3)]}
+                return {"id": url[-2:], "title": url[-2:], "ext": "mp4"}
+
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.output_dir = temp_dir
+        mock_config.update(info_cache_ttl=0, retry_delay_base=0, scheduler_max_retries=0)
+        archive = MagicMock(has_entry=lambda entry: entry["url"].endswith("v1"))
+        with patch("yt_dlp.YoutubeDL", _PlaylistYoutubeDL):
+            mgr = _make_manager(mock_config)
+            with patch.object(mgr, "_setup_download_options", return_value={}), \
+                    patch.object(mgr, "download_archive", archive), \
+                    patch.object(mgr, "_report_download_results"):
+                try:
+                    files = await asyncio.wait_for(
+                        mgr._process_downloads(["https://example.com/list"], {"priority": 2}), timeout=10)
+                finally:
+                    await mgr.advanced_scheduler.stop()
+
+        assert files == [os.path.join(temp_dir, f"v{i}.mp4") for i in (0, 2)]
+        # The archived entry was never extracted, and downloads reused the expander's info
+        assert [c[1] for c in _FakeYoutubeDL.calls if c[0] == "extract"] == [
+            "https://example.com/list", "https://example.com/v0", "https://example.com/v2"]
+
+    async def test_scheduler_and_batches_share_one_limit(self, mock_config):
+        mock_config["max_concurrent"] = 3
+        mgr = _make_manager(mock_config)
+        assert mgr.advanced_scheduler.max_concurrent == mgr.batch_engine.limit == 3
+
+        mgr.advanced_scheduler.set_concurrency(1)
+        assert mgr.batch_engine.limit == 1
+        with patch.object(mgr, "_process_downloads_batch", return_value=[]) as batch:
+            await mgr._process_downloads(["https://example.com/a", "https://example.com/b"], {})
+        batch.assert_called_once()
+
+    def test_rate_limit_backs_off_host_with_retry_after(self, mock_config):
+        import yt_dlp
+
+        class _HTTPError(Exception):
+            response = MagicMock(headers={"Retry-After": "42"})
+
+        cause = _HTTPError("HTTP Error 429: Too Many Requests")
+        wrapped = yt_dlp.utils.ExtractorError("HTTP Error 429", cause=cause)
+        error = yt_dlp.utils.DownloadError("ERROR: HTTP Error 429", exc_info=(type(wrapped), wrapped, None))
+        mgr = _make_manager(mock_config)
+
+        assert mgr._report_throttled("https://www.busy.example/v/1", error) == 42
+        assert mgr.advanced_scheduler.hosts.snapshot()["busy.example"]["backoff_remaining"] > 41
+
+    def test_sizes_are_estimated_from_cached_info(self, mock_config):
+        mgr = _make_manager(mock_config)
+        cached = {
+            "picked": {"info": {"requested_formats": [{"filesize": 700}, {"filesize_approx": 300}]}},
+            "listed": {"info": {"duration": 10, "tbr": 800}},
+        }
+        mgr.download_cache.get.side_effect = cached.get
+
+        with patch.object(mgr, "_info_cache_key", side_effect=lambda ydl, url: url):
+            sizes = mgr._cached_sizes(None, ["picked", "listed", "uncached"])
+
+        assert sizes == {"picked": 1000, "listed": 10 * 800 * 125}
+
+    async def test_leased_download_reports_progress_and_final_file(self, mock_config):
+        mgr = _make_manager(mock_config)
+        seen = []
+
+        async def fake_fetch(url, ydl_opts, options, console, progress=None, info=None,
+                             bandwidth=None, on_progress=None):
+            await asyncio.to_thread(on_progress, 256, 1024)  # from yt-dlp's thread
+
+            async def finish():
+                return "/tmp/final.mp4"
+            return asyncio.create_task(finish())
+
+        with patch.object(mgr, "_setup_download_options", return_value={}), \
+                patch.object(mgr, "_fetch_single_file", side_effect=fake_fetch):
+            result = await mgr.download_leased("https://example.com/v", {},
+                                               on_progress=lambda *args: seen.append(args))
+            await asyncio.sleep(0)
+
+        assert result == "/tmp/final.mp4" and seen == [(256, 1024)]
+
+
+class TestStreamingFallback:
+    """Test single-connection streaming for origins without usable Range support."""
+
+    def _manager(self, mock_config):
+        mock_config["stream_retry_delay"] = 0
+        mgr = _make_manager(mock_config)
+        mgr.chunk_size = 1024
+        mgr.session_manager.get_chunk_state.return_value = None
+        return mgr
+
+    async def _download(self, mgr, url, temp_dir):
+        output = os.path.join(temp_dir, "out.bin")
+        async with mgr:
+            assert await asyncio.wait_for(mgr.download(url, output), timeout=10) == output
+        with open(output, "rb") as f:
+            return f.read()
+
+    async def test_probe_body_is_the_first_range(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(4 * 1024)
+        requests = []
+        url = await range_server(_make_range_app(payload, requests=requests))
+        mock_config["adaptive_chunk_sizing"] = False
+        mgr = self._manager(mock_config)
+
+        assert await self._download(mgr, url, temp_dir) == payload
+        assert sorted(requests) == [0, 1024, 2048, 3072]
+        assert mgr.get_transfer_stats(url)["mode"] == "segmented"
+
+    async def test_origin_ignoring_range_is_streamed(self, mock_config, temp_dir, range_server):
+        import hashlib
+        payload = os.urandom(100 * 1024)
+        seen = []
+        url = await range_server(_make_stream_app(payload, seen=seen))
+        mgr = self._manager(mock_config)
+
+        assert await self._download(mgr, url, temp_dir) == payload
+        # The probe's 200 body was the download: no second request
+        assert seen == ["bytes=0-1023"]
+        stats = mgr.get_transfer_stats(url)
+        assert stats["mode"] == "stream"
+        assert stats["sha256"] == hashlib.sha256(payload).hexdigest()
+
+    async def test_chunked_response_without_length(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(70 * 1024 + 5)
+        url = await range_server(_make_stream_app(payload, chunked=True))
+        mgr = self._manager(mock_config)
+
+        assert await self._download(mgr, url, temp_dir) == payload
+        assert not os.path.exists(os.path.join(temp_dir, "out.bin.part"))
+
+    async def test_dropped_stream_resumes_with_open_range(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(200 * 1024)
+        seen = []
+        url = await range_server(_make_stream_app(payload, ranges=True, drop_once_at=64 * 1024, seen=seen))
+        mgr = self._manager(mock_config)
+
+        assert await self._download(mgr, url, temp_dir) == payload
+        # Probe (unknown total), full GET cut off mid-body, then the tail only
+        assert seen[:2] == ["bytes=0-1023", None]
+        assert len(seen) == 3 and seen[2] != "bytes=0-"
+        assert int(seen[2].replace("bytes=", "").rstrip("-")) > 0
+
+    async def test_dropped_stream_restarts_without_range_support(self, mock_config, temp_dir, range_server):
+        payload = os.urandom(200 * 1024)
+        seen = []
+        url = await range_server(_make_stream_app(payload, drop_once_at=64 * 1024, seen=seen))
+        mgr = self._manager(mock_config)
+
+        assert await self._download(mgr, url, temp_dir) == payload
+        assert seen == ["bytes=0-1023", None]
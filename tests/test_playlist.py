@@ -0,0 +1,171 @@
+"""Tests for pipelined playlist expansion."""
+import time
+
+import pytest
+
+from snatch.playlist import PlaylistExpander, iter_entries
+from snatch.ydl_pool import YoutubeDLPool
+
+
+class _FakeYDL:
+    """Extractor stand-in: ``pl`` is a lazy playlist, ``v*`` are videos"""
+
+    pulled = []
+    resolved = []
+    delay = 0.0
+
+    def __init__(self, params):
+        self.params = params
+
+    def add_progress_hook(self, hook):
+        pass
+
+    def save_cookies(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _entries(self, prefix, count):
+        for i in range(count):
+            self.pulled.append(i)
+            yield {"_type": "url", "url": f"{prefix}{i}", "ie_key": "Fake"}
+
+    def extract_info(self, url, ie_key=None, download=True, process=True):
+        assert not download and not process
+        if url == "pl":
+            return {"_type": "playlist", "id": "pl", "title": "List", "entries": self._entries("v", 20)}
+        if url == "channel":
+            return {"_type": "playlist", "id": "ch", "title": "Channel",
+                    "entries": iter([{"_type": "url", "url": "pl"}, {"_type": "url", "url": "vsolo"}])}
+        if url == "vbad":
+            raise RuntimeError("private video")
+        time.sleep(self.delay)
+        return {"id": url, "title": url, "webpage_url": f"https://example.com/{url}"}
+
+    def process_ie_result(self, result, download=True, extra_info=None):
+        self.resolved.append(result["id"])
+        return dict(result, **(extra_info or {}), _processed=True)
+
+
+@pytest.fixture
+def expander():
+    _FakeYDL.pulled = []
+    _FakeYDL.resolved = []
+    _FakeYDL.delay = 0.0
+    instance = PlaylistExpander(YoutubeDLPool(factory=_FakeYDL), {}, lookahead=3)
+    yield instance
+    instance.close()
+
+
+class TestPlaylistExpander:
+    async def test_playlist_entries_are_resolved_in_order(self, expander):
+        entries = [e async for e in expander.expand(["pl"])]
+
+        assert [e.info["id"] for e in entries] == [f"v{i}" for i in range(20)]
+        assert all(e.info["_processed"] and e.playlist == "List" for e in entries)
+        assert [e.playlist_index for e in entries] == list(range(1, 21))
+        assert entries[0].url == "https://example.com/v0"
+
+    async def test_entries_are_pulled_lazily(self, expander):
+        stream = expander.expand(["pl"])
+        await stream.__anext__()
+        # The consumer holds one entry; only the lookahead window was listed
+        assert len(_FakeYDL.pulled) <= 1 + expander.lookahead
+        await stream.aclose()
+
+    async def test_extraction_runs_ahead_of_the_consumer(self, expander):
+        _FakeYDL.delay = 0.1
+        stream = expander.expand(["pl"])
+        started = time.monotonic()
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.__anext__()
+        # Three 100ms extractions overlapped instead of running back to back
+        assert time.monotonic() - started < 0.25
+        await stream.aclose()
+
+    async def test_failed_entries_are_yielded_with_error(self, expander):
+        entries = [e async for e in expander.expand(["v1", "vbad", "v2"])]
+
+        assert [e.error is None for e in entries] == [True, False, True]
+        assert entries[1].url == "vbad" and "private" in str(entries[1].error)
+
+    async def test_nested_playlists_are_expanded(self, expander):
+        entries = [e async for e in expander.expand(["channel"])]
+
+        assert sorted(e.info["id"] for e in entries) == sorted([f"v{i}" for i in range(20)] + ["vsolo"])
+
+    async def test_lookup_skips_extraction(self):
+        _FakeYDL.resolved = []
+        cached = {"id": "v1", "title": "cached"}
+        instance = PlaylistExpander(YoutubeDLPool(factory=_FakeYDL), {},
+                                    lookup=lambda ydl, url: dict(cached) if url == "v1" else None)
+        try:
+            entries = [e async for e in instance.expand(["v1"])]
+        finally:
+            instance.close()
+        assert entries[0].info["title"] == "cached"
+        assert _FakeYDL.resolved == []
+
+    async def test_extraction_pool_resolves_videos_but_not_playlists(self):
+        class _Pool:
+            calls = []
+
+            def extract_sync(self, url, opts):
+                self.calls.append(url)
+                return {"_type": "playlist"} if url == "pl" else {"id": url, "from_pool": True}
+
+        _FakeYDL.resolved = []
+        instance = PlaylistExpander(YoutubeDLPool(factory=_FakeYDL), {}, extraction_pool=_Pool())
+        try:
+            entries = [e async for e in instance.expand(["pl"])]
+        finally:
+            instance.close()
+
+        assert all(e.info["from_pool"] for e in entries) and len(entries) == 20
+        assert entries[0].info["playlist"] == "List"
+        # The playlist itself was listed in-process, nothing was resolved here
+        assert _FakeYDL.resolved == []
+
+    async def test_skipped_entries_are_never_extracted(self):
+        _FakeYDL.resolved = []
+        instance = PlaylistExpander(YoutubeDLPool(factory=_FakeYDL), {},
+                                    skip=lambda entry: entry["url"] != "v3")
+        try:
+            entries = [e async for e in instance.expand(["pl"])]
+        finally:
+            instance.close()
+
+        assert [e.info["id"] for e in entries] == ["v3"]
+        assert instance.skipped == 19 and _FakeYDL.resolved == ["v3"]
+
+    async def test_playlist_instance_returns_to_pool(self, expander):
+        [e async for e in expander.expand(["pl"])]
+        assert expander.ydl_pool.snapshot()["idle"] >= 1
+
+
+class _Paged:
+    _pagesize = 4
+
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+
+    def getslice(self, start, end):
+        self.calls.append(start)
+        return list(range(start, min(end, self.count)))
+
+
+def test_iter_entries_pages_lazily():
+    paged = _Paged(10)
+    it = iter_entries(paged)
+    assert [next(it) for _ in range(3)] == [0, 1, 2]
+    assert paged.calls == [0]
+    assert list(it) == list(range(3, 10))
+    assert paged.calls == [0, 4, 8]
+
+
+def test_iter_entries_accepts_lists_and_none():
+    assert list(iter_entries([1, 2])) == [1, 2]
+    assert list(iter_entries(None)) == []
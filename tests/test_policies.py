@@ -0,0 +1,117 @@
+"""Tests for the scheduler's ordering policies."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from snatch.advanced_scheduler import AdvancedScheduler, Priority, ScheduledDownload
+from snatch.policies import create_policy
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def _download(name, priority=Priority.NORMAL, size=None, done=0, deadline=None):
+    return ScheduledDownload(id=name, url=name, options={}, priority=priority, estimated_size=size,
+                             downloaded_size=done, deadline=deadline)
+
+
+def _order(policy, downloads, submitted=None):
+    submitted = submitted or {}
+    return [d.id for d in sorted(downloads, key=lambda d: policy.rank(d, submitted.get(d.id, NOW)))]
+
+
+class TestPolicies:
+    def test_sjf_orders_by_remaining_bytes_with_unknown_last(self):
+        downloads = [_download("stream", size=5_000_000_000), _download("unknown"),
+                     _download("clip", size=20_000_000), _download("resumed", size=900_000_000, done=890_000_000)]
+        assert _order(create_policy("sjf"), downloads) == ["resumed", "clip", "stream", "unknown"]
+
+    def test_sjf_stays_within_priority_levels(self):
+        downloads = [_download("small-low", Priority.LOW, size=1), _download("big-high", Priority.HIGH, size=10**9)]
+        assert _order(create_policy("sjf"), downloads) == ["big-high", "small-low"]
+
+    def test_edf_orders_by_deadline_with_none_last(self):
+        downloads = [_download("later", deadline=NOW + timedelta(hours=2)), _download("whenever"),
+                     _download("soon", deadline=NOW + timedelta(minutes=5))]
+        assert _order(create_policy("edf"), downloads) == ["soon", "later", "whenever"]
+
+    def test_aging_lets_old_low_priority_work_overtake(self):
+        policy = create_policy("priority", aging_seconds=60)
+        old = _download("old-background", Priority.BACKGROUND)
+        new = _download("new-normal", Priority.NORMAL)
+        # Three minutes of waiting are worth three levels
+        submitted = {"old-background": NOW - timedelta(minutes=3), "new-normal": NOW}
+        assert _order(policy, [new, old], submitted) == ["old-background", "new-normal"]
+        assert _order(create_policy("priority"), [new, old], submitted) == ["new-normal", "old-background"]
+
+    def test_aging_keeps_policy_order_within_a_period(self):
+        # The large/late download is submitted first; a millisecond later should not outrank it
+        submitted = {"big": NOW, "small": NOW + timedelta(milliseconds=1),
+                     "late": NOW, "soon": NOW + timedelta(milliseconds=1)}
+        sjf = create_policy("sjf", aging_seconds=600)
+        assert _order(sjf, [_download("big", size=10**9), _download("small", size=10**6)],
+                      submitted) == ["small", "big"]
+        edf = create_policy("edf", aging_seconds=600)
+        assert _order(edf, [_download("late", deadline=NOW + timedelta(hours=2)),
+                            _download("soon", deadline=NOW + timedelta(minutes=5))],
+                      submitted) == ["soon", "late"]
+
+    def test_unknown_policy_is_rejected(self):
+        with pytest.raises(ValueError, match="sjf"):
+            create_policy("lottery")
+
+
+class TestSchedulerPolicies:
+    async def test_sjf_runs_short_downloads_first(self):
+        started = []
+
+        async def executor(download):
+            started.append(download.url)
+            return download.url
+
+        config = {"max_concurrent_downloads": 1, "per_host_concurrency": 0, "scheduling_policy": "sjf"}
+        scheduler = AdvancedScheduler(config, executor)
+        await scheduler.schedule_downloads(["stream", "clip", "unknown", "short"], {},
+                                           sizes={"stream": 10**10, "clip": 10**7, "short": 10**5})
+        while scheduler.queue_size or scheduler.active_downloads:
+            await scheduler._process_queue()
+            for task in list(scheduler.active_downloads.values()):
+                await task
+
+        assert started == ["short", "clip", "stream", "unknown"]
+        assert (await scheduler.get_queue_status())["policy"] == "sjf"
+
+    async def test_deadline_survives_the_durable_queue(self, tmp_path):
+        path = tmp_path / "queue.db"
+        deadline = NOW + timedelta(days=1)
+        scheduler = AdvancedScheduler({"scheduler_queue_path": str(path), "scheduling_policy": "edf"})
+        download_id = await scheduler.schedule_download("a", {}, deadline=deadline)
+        scheduler.store.close()
+
+        recovered = AdvancedScheduler({"scheduler_queue_path": str(path), "scheduling_policy": "edf"})
+        assert recovered.downloads[download_id].deadline == deadline
+        assert recovered.downloads[download_id].submitted_at == scheduler.downloads[download_id].submitted_at
+        recovered.store.close()
+
+    async def test_retry_keeps_its_original_submit_time(self):
+        calls = []
+
+        async def executor(download):
+            calls.append(download.url)
+            return None if len(calls) == 1 else download.url
+
+        config = {"retry_delay_base": 0, "priority_aging_seconds": 60}
+        scheduler = AdvancedScheduler(config, executor)
+        download_id = await scheduler.schedule_download("a", {})
+        submitted = scheduler.downloads[download_id].submitted_at
+        await scheduler._process_queue()
+        await asyncio.gather(*list(scheduler.active_downloads.values()))
+
+        download = scheduler.downloads[download_id]
+        assert download.retry_count == 1 and download.scheduled_time > submitted
+        assert download.submitted_at == submitted
+        _, queued_at, *_ = scheduler.hosts.hosts[download.host].ready[0]
+        assert queued_at == submitted.timestamp()
+
+    def test_invalid_policy_falls_back_to_priority(self):
+        assert AdvancedScheduler({"scheduling_policy": "lottery"}).policy.name == "priority"
@@ -0,0 +1,205 @@
+"""Tests for per-host politeness and fairness."""
+import asyncio
+from email.utils import formatdate
+
+import pytest
+
+from snatch.advanced_scheduler import AdvancedScheduler
+from snatch.politeness import HostGate, HostQueues, host_of, parse_retry_after
+
+
+class _Download:
+    def __init__(self, url, extractor=None):
+        self.url = url
+        self.extractor = extractor
+
+
+def _fill(queues, host, count, priority=3, extractor=None):
+    for i in range(count):
+        queues.push(host, (priority, 0.0, len(queues), _Download(f"{host}/{i}", extractor)))
+
+
+def _pop_hosts(queues, now=0.0):
+    hosts = []
+    while (entry := queues.pop(lambda e: True, now)) is not None:
+        hosts.append(entry[3].url.split("/")[0])
+    return hosts
+
+
+def test_host_of_normalizes():
+    assert host_of("https://WWW.Example.com:8080/watch?v=1") == "example.com"
+    assert host_of("not a url") == ""
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(formatdate(1000.0 + 30, usegmt=True), now=1000.0) == 30.0
+    assert parse_retry_after("soon") is None and parse_retry_after(None) is None
+
+
+class TestHostQueues:
+    def test_hosts_take_turns(self):
+        queues = HostQueues(per_host=0)
+        _fill(queues, "big", 6)
+        _fill(queues, "small", 2)
+        assert _pop_hosts(queues) == ["big", "small", "big", "small", "big", "big", "big", "big"]
+
+    def test_priority_comes_before_turns(self):
+        queues = HostQueues(per_host=0)
+        _fill(queues, "a", 2, priority=3)
+        _fill(queues, "b", 1, priority=1)
+        assert _pop_hosts(queues) == ["b", "a", "a"]
+
+    def test_host_and_extractor_caps(self):
+        queues = HostQueues(per_host=1, extractor_limits={"Youtube": 1})
+        _fill(queues, "a", 2)
+        _fill(queues, "b", 1, extractor="youtube")
+        _fill(queues, "c", 1, extractor="youtube")
+        queues.started("a", None)
+        queues.started("b", "youtube")
+        # a is at its cap; c shares b's extractor, which is at its cap
+        assert queues.pop(lambda e: True) is None
+
+        queues.finished("a", None)
+        assert queues.pop(lambda e: True)[3].url == "a/0"
+
+    def test_new_head_is_rekeyed(self):
+        queues = HostQueues(per_host=0, extractor_limits={"youtube": 1})
+        _fill(queues, "a", 1, priority=3)
+        _fill(queues, "b", 1, priority=2, extractor="youtube")
+        queues.started("x", "youtube")
+        assert queues.pop(lambda e: True)[3].url == "a/0"  # b waits for its extractor
+        # A better entry on another extractor takes b's place at once
+        queues.push("b", (1, 0.0, 9, _Download("b/late")))
+        _fill(queues, "a", 1, priority=2)
+        assert _pop_hosts(queues) == ["b", "a"]
+        queues.finished("x", "youtube")
+        assert queues.pop(lambda e: True)[3].url == "b/0"
+
+    def test_spacing_sets_wakeup(self):
+        queues = HostQueues(per_host=0, min_interval=2.0)
+        _fill(queues, "a", 2)
+        queues.started("a", None, now=100.0)
+        assert queues.pop(lambda e: True, now=101.0) is None
+        assert queues.next_wakeup == 102.0
+        assert queues.pop(lambda e: True, now=102.0) is not None
+
+    def test_idle_host_keeps_its_spacing_until_it_runs_out(self):
+        queues = HostQueues(min_interval=2.0)
+        queues.started("a", None, now=100.0)
+        queues.finished("a", None, now=100.5)
+        _fill(queues, "a", 1)
+        assert queues.pop(lambda e: True, now=101.0) is None
+        assert queues.pop(lambda e: True, now=102.0) is not None
+
+        queues.started("a", None, now=102.0)
+        queues.finished("a", None, now=102.5)
+        assert "a" in queues.hosts
+        queues.pop(lambda e: True, now=104.0)
+        assert "a" not in queues.hosts
+
+    def test_throttled_host_is_forgotten_once_its_backoff_runs_out(self):
+        queues = HostQueues(backoff_base=10)
+        _fill(queues, "a", 1)
+        assert queues.pop(lambda e: True, now=100.0) is not None
+        queues.started("a", None, now=100.0)
+        queues.throttled("a", now=101.0)
+        queues.finished("a", None, now=102.0)
+        queues.throttled("b", now=102.0)  # idle host throttled after its last download
+        queues.pop(lambda e: True, now=110.0)
+        assert set(queues.hosts) == {"a", "b"}
+        queues.pop(lambda e: True, now=112.0)
+        assert queues.hosts == {}
+
+    def test_throttle_backoff_doubles_and_resets(self):
+        queues = HostQueues(backoff_base=10, backoff_max=25)
+        assert [queues.throttled("a", now=0) for _ in range(3)] == [10, 20, 25]
+        assert queues.throttled("a", retry_after=5, now=0) == 5
+        queues.succeeded("a")
+        assert queues.throttled("a", now=0) == 10
+
+    def test_dead_entries_are_dropped(self):
+        queues = HostQueues(per_host=0)
+        _fill(queues, "a", 3)
+        entry = queues.pop(lambda e: e[3].url == "a/2")
+        assert entry[3].url == "a/2"
+        assert len(queues) == 0
+
+
+class TestHostGate:
+    async def test_slot_waits_for_the_host_cap(self):
+        gate = HostGate(HostQueues(per_host=1))
+        order = []
+
+        async def download(name, url):
+            async with gate.slot(url):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} end")
+
+        await asyncio.gather(download("first", "https://a.example/1"), download("second", "https://a.example/2"),
+                             download("other", "https://b.example/1"))
+        assert order.index("first end") < order.index("second start")
+        assert order.index("other start") < order.index("first end")
+
+    async def test_slot_waits_out_a_backoff(self):
+        queues = HostQueues()
+        gate = HostGate(queues)
+        queues.throttled("a.example", retry_after=0.05)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with gate.slot("https://a.example/1") as host:
+            assert host == "a.example"
+            assert loop.time() - started >= 0.04
+            assert queues.hosts["a.example"].active == 1
+        assert "a.example" not in queues.hosts  # idle and past its backoff
+
+
+class TestSchedulerPoliteness:
+    async def test_one_crawl_cannot_take_every_slot(self):
+        started = []
+        release = asyncio.Event()
+
+        async def executor(download):
+            started.append(host_of(download.url))
+            await release.wait()
+            return download.url
+
+        scheduler = AdvancedScheduler({"max_concurrent_downloads": 3, "per_host_concurrency": 2}, executor)
+        await scheduler.schedule_downloads([f"https://channel.example/{i}" for i in range(10)], {})
+        await scheduler.schedule_download("https://other.example/clip", {})
+        await scheduler._process_queue()
+        await asyncio.sleep(0)
+
+        assert sorted(started) == ["channel.example", "channel.example", "other.example"]
+        release.set()
+        await asyncio.gather(*list(scheduler.active_downloads.values()))
+
+    async def test_hosts_are_uncapped_by_default(self):
+        release = asyncio.Event()
+
+        async def executor(download):
+            await release.wait()
+            return download.url
+
+        scheduler = AdvancedScheduler({"max_concurrent": 3}, executor)
+        await scheduler.schedule_downloads([f"https://channel.example/{i}" for i in range(5)], {})
+        await scheduler._process_queue()
+
+        assert len(scheduler.active_downloads) == 3
+        release.set()
+        await asyncio.gather(*list(scheduler.active_downloads.values()))
+
+    async def test_throttled_host_waits_out_its_backoff(self):
+        async def executor(download):
+            return download.url
+
+        scheduler = AdvancedScheduler({"per_host_concurrency": 0}, executor)
+        await scheduler.schedule_download("https://busy.example/1", {})
+        assert scheduler.report_throttled("https://busy.example/0", retry_after=60) == 60
+
+        await scheduler._process_queue()
+        assert not scheduler.active_downloads
+        assert 59 < scheduler._next_timer_delay() <= 60
+        status = await scheduler.get_queue_status()
+        assert status["hosts"]["busy.example"]["backoff_remaining"] > 59
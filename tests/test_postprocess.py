@@ -0,0 +1,71 @@
+"""Tests for the post-processing worker pool."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from snatch.postprocess import PostProcessPool
+
+
+@pytest.fixture
+def pool():
+    instance = PostProcessPool(workers=2, max_queued=1)
+    yield instance
+    instance.close()
+
+
+class TestPostProcessPool:
+    async def test_jobs_run_on_their_own_loop_and_thread(self, pool):
+        main_loop = asyncio.get_running_loop()
+
+        async def job():
+            return threading.current_thread().name, asyncio.get_running_loop() is main_loop
+
+        name, same_loop = await pool.run(job)
+        assert name.startswith("snatch-postprocess") and not same_loop
+
+    async def test_workers_bound_concurrency(self, pool):
+        running = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        async def job():
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+
+        futures = []
+        for _ in range(6):
+            futures.append(await pool.submit(job))
+        await asyncio.gather(*futures)
+        assert running["peak"] == 2
+        assert pool.snapshot()["completed"] == 6
+
+    async def test_submit_waits_when_queue_is_full(self, pool):
+        release = threading.Event()
+
+        async def blocked():
+            release.wait(5)
+
+        # Two running plus one queued fill the pool
+        futures = [await pool.submit(blocked) for _ in range(3)]
+        extra = asyncio.ensure_future(pool.submit(blocked))
+        await asyncio.sleep(0.05)
+        assert not extra.done()
+
+        release.set()
+        futures.append(await asyncio.wait_for(extra, timeout=5))
+        await asyncio.gather(*futures)
+        assert pool.snapshot()["backpressure_waits"] == 1
+
+    async def test_failed_jobs_surface_on_their_future(self, pool):
+        async def broken():
+            raise ValueError("bad codec")
+
+        with pytest.raises(ValueError):
+            await pool.run(broken)
+        assert pool.snapshot()["failed"] == 1
+        assert pool.pending == 0
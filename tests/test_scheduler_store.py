@@ -0,0 +1,91 @@
+"""Tests for the durable scheduler queue."""
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from snatch.advanced_scheduler import AdvancedScheduler, DownloadStatus, Priority
+from snatch.scheduler_store import SchedulerStore
+
+
+@pytest.fixture
+def config(temp_dir):
+    return {"scheduler_queue_path": os.path.join(temp_dir, "queue.db"), "retry_delay_base": 0}
+
+
+class TestSchedulerStore:
+    def test_database_uses_wal(self, config):
+        store = SchedulerStore(config["scheduler_queue_path"])
+        try:
+            assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        finally:
+            store.close()
+
+    async def test_batch_enqueue_is_persisted(self, config):
+        scheduler = AdvancedScheduler(config)
+        ids = await scheduler.schedule_downloads([f"https://example.com/{i}" for i in range(2000)],
+                                                 {"format": "best"}, Priority.HIGH)
+
+        assert scheduler.store.count("pending") == 2000
+        record = scheduler.store.load(ids[0])
+        assert record["options"] == {"format": "best"} and record["priority"] == Priority.HIGH.value
+
+    async def test_restart_requeues_unfinished_and_keeps_retry_state(self, config):
+        async def executor(download):
+            return None if download.url == "flaky" else f"/tmp/{download.url}"
+
+        first = AdvancedScheduler(config, executor)
+        done_id = await first.schedule_download("done", {})
+        flaky_id = await first.schedule_download("flaky", {})
+        paused_id = await first.schedule_download("paused", {})
+        await first.pause_download(paused_id)
+        await first._process_queue()
+        await asyncio.gather(*list(first.active_downloads.values()))
+        # "flaky" failed once and is queued for its retry; "done" finished
+        first.flush()
+        first.store.close()
+
+        second = AdvancedScheduler(config, executor)
+        assert second.queue_size == 1
+        flaky = second.downloads[flaky_id]
+        assert flaky.status == DownloadStatus.PENDING and flaky.retry_count == 1
+        assert second.downloads[paused_id].status == DownloadStatus.PAUSED
+        info = await second.get_download_info(done_id)
+        assert info["status"] == "completed" and info["result"] == "/tmp/done"
+
+    async def test_in_flight_downloads_are_queued_again(self, config):
+        async def executor(download):
+            await asyncio.sleep(10)
+
+        first = AdvancedScheduler(config, executor)
+        download_id = await first.schedule_download("a", {})
+        await first._process_queue()
+        first.flush()
+        # Simulated crash: the process dies with the download running
+        for task in first.active_downloads.values():
+            task.cancel()
+        first.store.close()
+
+        second = AdvancedScheduler(config, executor)
+        assert second.downloads[download_id].status == DownloadStatus.PENDING
+        assert second.queue_size == 1
+
+    async def test_options_keep_their_types_across_a_restart(self, config):
+        options = {"deadline": datetime(2026, 1, 1, 12, 30), "output": Path("/media/clips"),
+                   "nested": {"since": datetime(2025, 6, 1)}}
+        first = AdvancedScheduler(config)
+        download_id = await first.schedule_download("a", options)
+        first.store.close()
+
+        second = AdvancedScheduler(config)
+        assert second.downloads[download_id].options == options
+        second.store.close()
+
+    async def test_unstorable_options_are_rejected_when_scheduled(self, config):
+        scheduler = AdvancedScheduler(config)
+        with pytest.raises(ValueError, match="set"):
+            await scheduler.schedule_downloads(["a"], {"formats": {"mp4"}})
+        assert scheduler.queue_size == 0
+        scheduler.store.close()
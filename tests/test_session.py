@@ -43,3 +43,21 @@ class TestAsyncSessionManager:
         from snatch.session import AsyncSessionManager
         asm = AsyncSessionManager(session_file)
         assert asm is not None
+
+    def test_chunk_state_survives_reload(self, temp_dir):
+        import asyncio
+        session_file = os.path.join(temp_dir, "sessions.json")
+        from snatch.session import AsyncSessionManager
+        asm = AsyncSessionManager(session_file)
+
+        url = "https://example.com/big.bin"
+        state = {"bitmap": {"total_size": 10, "block_size": 4, "bits": "BQ=="}, "chunk_hashes": {"0-3": "ab"}}
+        asm.update_chunk_state(url, state, 8, total_size=10, file_path="/tmp/big.bin")
+        asyncio.run(asm.flush())
+
+        reloaded = AsyncSessionManager(session_file)
+        assert reloaded.get_chunk_state(url) == state
+        assert reloaded.get_session(url).downloaded_bytes == 8
+
+        reloaded.clear_chunk_state(url)
+        assert reloaded.get_chunk_state(url) is None
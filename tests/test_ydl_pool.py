@@ -0,0 +1,76 @@
+"""Tests for the pooled YoutubeDL instances."""
+import pytest
+
+from snatch.ydl_pool import YoutubeDLPool, options_fingerprint
+
+
+class _FakeYDL:
+    def __init__(self, params):
+        self.params = params
+        self._progress_hooks = []
+        self._postprocessor_hooks = []
+        self._pps = {}
+        self._num_downloads = 0
+        self.closed = False
+
+    def add_progress_hook(self, hook):
+        self._progress_hooks.append(hook)
+
+    def add_postprocessor_hook(self, hook):
+        self._postprocessor_hooks.append(hook)
+
+    def save_cookies(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    return YoutubeDLPool(factory=_FakeYDL, **kwargs)
+
+
+class TestYoutubeDLPool:
+    def test_fingerprint_ignores_per_use_hooks(self):
+        base = {"format": "best", "outtmpl": "%(title)s.%(ext)s"}
+        assert options_fingerprint({**base, "progress_hooks": [print]}) == options_fingerprint(base)
+        assert options_fingerprint({**base, "format": "worst"}) != options_fingerprint(base)
+
+    def test_instance_reused_with_fresh_hooks(self):
+        pool = _pool()
+        first_hook, second_hook = object(), object()
+        with pool.checkout({"format": "best", "progress_hooks": [first_hook]}) as ydl:
+            ydl._num_downloads = 3
+            assert ydl._progress_hooks == [first_hook]
+            assert "progress_hooks" not in ydl.params
+        with pool.checkout({"format": "best", "progress_hooks": [second_hook]}) as again:
+            assert again is ydl
+            assert again._progress_hooks == [second_hook]
+            assert again._num_downloads == 0
+        assert pool.snapshot() == {"created": 1, "reused": 1, "idle": 1, "keys": 1}
+
+    def test_concurrent_checkouts_get_separate_instances(self):
+        pool = _pool(max_idle=1)
+        with pool.checkout({"format": "best"}) as a, pool.checkout({"format": "best"}) as b:
+            assert a is not b
+        # Only one is kept idle; the other is closed
+        assert pool.snapshot()["idle"] == 1
+        assert a.closed != b.closed
+
+    def test_unexpected_error_discards_instance(self):
+        pool = _pool()
+        with pytest.raises(RuntimeError):
+            with pool.checkout({"format": "best"}) as ydl:
+                raise RuntimeError("boom")
+        assert ydl.closed
+        assert pool.snapshot()["idle"] == 0
+
+    def test_least_recently_used_options_are_evicted(self):
+        pool = _pool(max_keys=2)
+        instances = []
+        for fmt in ("a", "b", "c"):
+            with pool.checkout({"format": fmt}) as ydl:
+                instances.append(ydl)
+        assert [ydl.closed for ydl in instances] == [True, False, False]
+        pool.close()
+        assert all(ydl.closed for ydl in instances)